@@ -239,3 +239,130 @@ insert into dbo.PD values ('0001','0001',1),
                       ('0020','0021',1),
                       ('0007','0018',2),
                       ('0020','0018',3);
+
+--ǾۼϾȷ/ǰ׺/Χѯʹãÿβѯȫɨ
+create nonclustered index ix_doctor_dpno on doctor(dpno);
+create nonclustered index ix_doctor_dname on doctor(dname);
+create nonclustered index ix_room_dpno on room(dpno);
+create nonclustered index ix_patient_dno on patient(dno);
+create nonclustered index ix_patient_rno on patient(rno);
+create nonclustered index ix_patient_pname on patient(pname);
+create nonclustered index ix_patient_startdate on patient(startdate);
+create nonclustered index ix_patient_predictenddate on patient(predictenddate);
+create nonclustered index ix_drug_dgname on drug(dgname);
+create nonclustered index ix_drug_dgprice on drug(dgprice);
+create nonclustered index ix_PD_pno on PD(pno);
+
+go
+--ͳõͼ/ҽ/Ժ/ҩƷԤȻܣ
+--ɾĻߡҩҩƷʱSQL ServerԶάͳƴֱӶܽÿɨȫ
+create view dbo.v_room_load with schemabinding as
+select rno, count_big(*) as cnt from dbo.patient where rno is not null group by rno;
+go
+create unique clustered index ix_v_room_load on dbo.v_room_load(rno);
+go
+create view dbo.v_doctor_load with schemabinding as
+select dno, count_big(*) as cnt from dbo.patient where dno is not null group by dno;
+go
+create unique clustered index ix_v_doctor_load on dbo.v_doctor_load(dno);
+go
+create view dbo.v_daily_adm with schemabinding as
+select startdate, count_big(*) as cnt from dbo.patient where startdate is not null group by startdate;
+go
+create unique clustered index ix_v_daily_adm on dbo.v_daily_adm(startdate);
+go
+create view dbo.v_drug_usage with schemabinding as
+select pd.dgno, sum(isnull(pd.num, 0) * isnull(g.dgprice, 0)) as amount, count_big(*) as cnt
+from dbo.PD pd join dbo.drug g on g.dgno = pd.dgno group by pd.dgno;
+go
+create unique clustered index ix_v_drug_usage on dbo.v_drug_usage(dgno);
+go
+--ձҡҽҩƷrowversionУÿβ޸ʱSQL ServerԶ£
+--ͻ˵Ĳձգsnapshot.pyֻͬб仯
+alter table department add rv rowversion;
+alter table doctor add rv rowversion;
+alter table room add rv rowversion;
+alter table drug add rv rowversion;
+create nonclustered index ix_department_rv on department(rv);
+create nonclustered index ix_doctor_rv on doctor(rv);
+create nonclustered index ix_room_rv on room(rv);
+create nonclustered index ix_drug_rv on drug(rv);
+go
+--ֱ޸ġһ𱣴ʱrowversionûиĹͬһУֹ۲ձѾӹrvУ߱ͻҩ
+alter table patient add rv rowversion;
+alter table PD add rv rowversion;
+go
+--סԺý㣨billing.pyÿһУҩ=ҩҩƷ֮ͣλ=סԺÿ촲λѣdb.iniã
+--pd_cnt½ʱҩֱɾҩ¼bill_runÿνһУmarkǽʱrowversion´֮ʼ
+create table bill
+(
+  pno char(20) primary key,
+  dpno char(2),
+  drug_fee int,
+  pd_cnt int,
+  days int,
+  bed_fee int,
+  total int,
+  settle_date date
+);
+create table bill_run
+(
+  run_at char(26) primary key,
+  settle_date date,
+  full_run int,
+  mark bigint,
+  patients int,
+  ms int
+);
+create nonclustered index ix_bill_dpno on bill(dpno);
+go
+--㰴rvϴν֮ĹĻߺҩ¼
+create nonclustered index ix_patient_rv on patient(rv);
+create nonclustered index ix_PD_rv on PD(rv);
+go
+--ҩdispense.pydrugĿ棬drugrvһֱڱ䣬㲻ٰжҩûб䣻
+--bill_priceϴνõҩۣdrugȽҳĹ۸ҩ
+create table bill_price
+(
+  dgno char(4) primary key,
+  dgprice int
+);
+go
+--֪ͨchange_feed.pyÿűĴɾĹеǵchange_logʱ¾ǣ
+--ŵıֻЩزĹļУöʱزҳͻ˰rvȡlogged_atһǰļ¼
+create table change_log
+(
+  seq bigint identity(1,1) primary key,
+  tname varchar(20) not null,
+  k1 char(20) not null,
+  k2 char(20),
+  logged_at datetime not null default getdate(),
+  rv rowversion
+);
+create nonclustered index ix_change_log_rv on change_log(rv);
+create nonclustered index ix_change_log_logged_at on change_log(logged_at);
+go
+create trigger trg_department_log on department after insert, update, delete as
+set nocount on;
+insert into change_log (tname, k1) select 'department', dpno from inserted union select 'department', dpno from deleted;
+go
+create trigger trg_doctor_log on doctor after insert, update, delete as
+set nocount on;
+insert into change_log (tname, k1) select 'doctor', dno from inserted union select 'doctor', dno from deleted;
+go
+create trigger trg_patient_log on patient after insert, update, delete as
+set nocount on;
+insert into change_log (tname, k1) select 'patient', pno from inserted union select 'patient', pno from deleted;
+go
+create trigger trg_drug_log on drug after insert, update, delete as
+set nocount on;
+insert into change_log (tname, k1) select 'drug', dgno from inserted union select 'drug', dgno from deleted;
+go
+create trigger trg_room_log on room after insert, update, delete as
+set nocount on;
+insert into change_log (tname, k1) select 'room', rno from inserted union select 'room', rno from deleted;
+go
+create trigger trg_PD_log on PD after insert, update, delete as
+set nocount on;
+insert into change_log (tname, k1, k2) select 'pd', dgno, pno from inserted union select 'pd', dgno, pno from deleted;
+go
@@ -0,0 +1,96 @@
+import os
+import configparser
+
+# 数据库后端选择：SQL Server（默认）、SQLite或DuckDB，在db.ini里配置
+# 原来连接串写死成ODBC Driver 17 + .\MYSQL，没装SQL Server的机器根本打不开程序；
+# 现在没有SQL Server也能用嵌入式数据库运行（建表和数据来自项目里的sql文件，见embedded_db.py），
+# 查房终端可以配置成只读，打开一份定期从服务器导出的数据库文件离线查看
+# 没有db.ini时按原来的方式连接SQL Server
+
+config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db.ini")
+
+
+class Backend:
+    name = ""
+    label = ""  # 界面上显示的名称
+
+    def __init__(self, read_only=False):
+        self.read_only = read_only  # 只读模式：界面禁用新增/修改/删除/导入，数据库也按只读打开
+
+    # 新建一个连接，给连接池用
+    def connect(self):
+        raise NotImplementedError
+
+    # 窗口标题上显示的说明
+    def describe(self):
+        return self.label + ("（只读）" if self.read_only else "")
+
+
+class SqlServerBackend(Backend):
+    name = "sqlserver"
+    label = "SQL Server"
+
+    def __init__(self, conn_str=None, read_only=False):
+        super().__init__(read_only)
+        from db_pool import conn_str as default_str
+        self.conn_str = conn_str or default_str
+        # 只读时声明只读意图，有可读辅助副本的可用性组会把连接转到副本上
+        if read_only and "applicationintent" not in self.conn_str.lower():
+            self.conn_str = self.conn_str.rstrip(";") + ";ApplicationIntent=ReadOnly;"
+
+    def connect(self):
+        import pyodbc
+        return pyodbc.connect(self.conn_str)
+
+
+# SQLite和DuckDB：path是数据库文件，不存在时按sql文件新建（只读模式下必须已经存在）
+class EmbeddedBackend(Backend):
+    def __init__(self, path, read_only=False):
+        super().__init__(read_only)
+        self.path = path
+        if read_only and not os.path.exists(path):
+            raise FileNotFoundError(f"只读模式下数据库文件必须已经存在：{path}")
+
+    def describe(self):
+        return f"{super().describe()} {os.path.basename(self.path)}"
+
+
+class SqliteBackend(EmbeddedBackend):
+    name = "sqlite"
+    label = "SQLite"
+
+    def connect(self):
+        from embedded_db import connect_sqlite
+        return connect_sqlite(self.path, read_only=self.read_only)
+
+
+class DuckdbBackend(EmbeddedBackend):
+    name = "duckdb"
+    label = "DuckDB"
+
+    def __init__(self, path, read_only=False):
+        try:
+            import duckdb  # noqa: F401
+        except ImportError:
+            raise ImportError("使用DuckDB需要先执行pip install duckdb")
+        super().__init__(path, read_only)
+
+    def connect(self):
+        from embedded_db import connect_duckdb
+        return connect_duckdb(self.path, read_only=self.read_only)
+
+
+# 读db.ini生成后端，配置里的相对路径相对于db.ini所在目录
+def load_backend(path=config_path):
+    cfg = configparser.ConfigParser(interpolation=None)
+    cfg.read(path, encoding="utf-8")
+    kind = cfg.get("database", "backend", fallback="sqlserver").strip().lower()
+    read_only = cfg.getboolean("database", "read_only", fallback=False)
+    base = os.path.dirname(os.path.abspath(path))
+    if kind == "sqlserver":
+        return SqlServerBackend(cfg.get("sqlserver", "conn_str", fallback=None), read_only)
+    if kind in ("sqlite", "duckdb"):
+        db_path = os.path.join(base, cfg.get(kind, "path", fallback=f"hospital.{'db' if kind == 'sqlite' else 'duckdb'}"))
+        cls = SqliteBackend if kind == "sqlite" else DuckdbBackend
+        return cls(db_path, read_only)
+    raise ValueError(f"db.ini里backend只能是sqlserver、sqlite或duckdb，不能是{kind}")
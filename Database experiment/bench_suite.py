@@ -0,0 +1,375 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import platform
+import statistics
+
+# 性能测试套件：造一份规模可调的医院数据，测打开表、按各字段查询、关联查询、增删改、表格显示的耗时，
+# 结果写成JSON，和上一次的结果对比就知道改动是变快还是变慢
+# 默认用SQLite（见embedded_db.py），不需要SQL Server，界面用offscreen平台，不弹出窗口：
+#   python bench_suite.py --patients 100000 --out bench.json
+#   python bench_suite.py --patients 100000 --compare bench.json      和之前的结果对比
+#   python bench_suite.py --engine duckdb                             用DuckDB测
+#   python bench_suite.py --odbc                                      测db.ini里配置的数据库（不造数据）
+# 同样的--patients和--seed造出的数据完全一样，数据库文件会保留，下次同规模直接复用
+
+batch_rows = 5000  # 造数据时每批插入多少行
+
+surnames = "王李张刘陈杨赵黄周吴徐孙胡朱高林何郭马罗"
+given = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华"
+duties = ["主任医师", "副主任医师", "主治医师", "住院医师", "初级医师"]
+illnesses = ["感冒", "肺炎", "高血压", "糖尿病", "骨折", "阑尾炎", "胃炎", "冠心病", "哮喘", "肾结石"]
+makers = ["华北制药", "同仁堂", "云南白药", "扬子江药业", "恒瑞医药", "白云山"]
+
+
+# 各表行数：患者数决定其他表的规模，编号长度受字段定义限制（科室2位、医生3位、药品4位）
+def sizes(patients):
+    return {
+        "department": min(99, max(5, patients // 1000)),
+        "doctor": min(999, max(10, patients // 50)),
+        "room": max(10, patients // 20),
+        "drug": min(9999, max(50, patients // 100)),
+        "patient": patients,
+    }
+
+
+def name(rnd):
+    return rnd.choice(surnames) + "".join(rnd.choice(given) for _ in range(rnd.randint(1, 2)))
+
+
+# 按表生成数据行，外键都指向已经生成的行；用生成器，一千万患者也不用一次放进内存
+def gen_rows(patients, seed=1):
+    rnd = random.Random(seed)
+    n = sizes(patients)
+    yield "department", ((f"科室{i}", f"{i:02d}", f"{i % 9 + 1}号楼{i}层", f"010-{60000000 + i}")
+                         for i in range(1, n["department"] + 1))
+    yield "doctor", ((f"{i:03d}", name(rnd), rnd.choice(duties), rnd.randint(0, 1), rnd.randint(28, 65),
+                      f"{rnd.randint(1, n['department']):02d}") for i in range(1, n["doctor"] + 1))
+    yield "room", ((f"R{i:07d}", f"{i % 9 + 1}号楼{i}", f"{rnd.randint(1, n['department']):02d}")
+                   for i in range(1, n["room"] + 1))
+    yield "drug", ((f"{i:04d}", f"药品{i}", rnd.choice(makers), rnd.randint(0, 5000), rnd.randint(1, 500))
+                   for i in range(1, n["drug"] + 1))
+    day0 = datetime.date(2020, 1, 1)
+
+    def patient(i):
+        start = day0 + datetime.timedelta(days=rnd.randint(0, 365 * 5))
+        end = start + datetime.timedelta(days=rnd.randint(3, 30))
+        return (f"P{i:09d}", name(rnd), rnd.randint(0, 1), rnd.randint(0, 99),
+                f"{rnd.randint(1, n['doctor']):03d}", f"R{rnd.randint(1, n['room']):07d}",
+                rnd.choice(illnesses), start.isoformat(), end.isoformat())
+    yield "patient", (patient(i) for i in range(1, patients + 1))
+
+    # 每个患者用0到3种不同的药
+    def pd_rows():
+        for i in range(1, patients + 1):
+            for g in rnd.sample(range(1, n["drug"] + 1), rnd.randint(0, 3)):
+                yield f"{g:04d}", f"P{i:09d}", rnd.randint(1, 20)
+    yield "PD", pd_rows()
+
+
+# 把生成的数据分批插入空库，返回各表行数
+def load_data(conn, patients, seed=1):
+    from table_registry import by_tname
+    cur = conn.cursor()
+    counts = {}
+    for tname, rows in gen_rows(patients, seed):
+        sql = by_tname[tname.lower()].insert_stmt.sql
+        counts[tname] = 0
+        batch = []
+        for r in rows:
+            batch.append(r)
+            if len(batch) >= batch_rows:
+                cur.executemany(sql, batch)
+                counts[tname] += len(batch)
+                batch = []
+        if batch:
+            cur.executemany(sql, batch)
+            counts[tname] += len(batch)
+        conn.commit()
+    cur.close()
+    return counts
+
+
+# 准备嵌入式测试库：文件名带上规模和种子，已经造过就直接用
+def prepare_db(engine, patients, seed, db_dir):
+    import embedded_db
+    connect = embedded_db.connect_duckdb if engine == "duckdb" else embedded_db.connect_sqlite
+    path = os.path.join(db_dir, f"bench_{patients}_{seed}.{'duckdb' if engine == 'duckdb' else 'db'}")
+    if os.path.exists(path):
+        return path, None
+    t0 = time.perf_counter()
+    conn = connect(path + ".tmp", data=False)
+    counts = load_data(conn, patients, seed)
+    conn.close()
+    os.replace(path + ".tmp", path)
+    return path, {"rows": counts, "seconds": round(time.perf_counter() - t0, 2)}
+
+
+def summarize(name, table, times, **extra):
+    res = {"name": name, "table": table, "n": len(times), "min_ms": round(min(times), 2),
+           "median_ms": round(statistics.median(times), 2), "max_ms": round(max(times), 2)}
+    res.update(extra)
+    return res
+
+
+class Suite:
+    def __init__(self, connect, repeat=3):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5.QtWidgets import QApplication, QMessageBox
+        from db_pool import ConnPool
+        from query_exec import QueryExecutor
+        from perf_log import Recorder
+        self.app = QApplication.instance() or QApplication(sys.argv[:1])
+        # 测试时不能弹出模态对话框，提示信息记下来，出错时写进结果
+        self.msgs = []
+        for fn in ("information", "warning", "critical"):
+            setattr(QMessageBox, fn, staticmethod(lambda *a, **k: self.msgs.append(a[1:3]) or QMessageBox.Ok))
+        QMessageBox.question = staticmethod(lambda *a, **k: QMessageBox.Yes)
+        self.repeat = repeat
+        self.pool = ConnPool(connect, min_size=1, max_size=4).start()
+        self.rec = Recorder(keep=100000, slow_path=None)
+        self.exe = QueryExecutor(self.pool, recorder=self.rec)
+        self.results = []
+
+    def wait(self, timeout=600):
+        t = time.perf_counter()
+        while self.exe.busy() and time.perf_counter() - t < timeout:
+            self.app.processEvents()
+            time.sleep(0.0005)
+        self.app.processEvents()
+
+    # 执行fn()并等后台任务全部结束，返回毫秒
+    def timed(self, fn):
+        t0 = time.perf_counter()
+        fn()
+        self.wait()
+        return (time.perf_counter() - t0) * 1000
+
+    # 最近一次某个操作的表格显示耗时
+    def last_render(self, op):
+        for r in reversed(self.rec.records()):
+            if r["kind"] == "render" and r["op"] == op:
+                return r["render_ms"]
+        return None
+
+    def open_win(self, cn):
+        from hospital_gui import TableWin
+        w = TableWin(cn, self.exe)  # 不给缓存，每次都查数据库
+        w.show()
+        self.wait()
+        return w
+
+    # 打开表（第一页）和表格显示
+    def bench_load(self, w):
+        times, renders = [], []
+        for _ in range(self.repeat):
+            times.append(self.timed(w.load_all))
+            renders.append(self.last_render(f"{w.t_name}:show_page") or 0.0)
+        self.results.append(summarize("load_all", w.t_name, times, rows=w.res_model.rowCount()))
+        self.results.append(summarize("render", w.t_name, renders, rows=w.res_model.rowCount()))
+
+    # 每个字段用表里的一个值查询：文本字段测精确和包含，其他字段测精确
+    # 关联查询的结果里不一定有全部字段（比如患者表没显示入院日期），样本值直接从本表取
+    def bench_query(self, w):
+        from result_model import norm
+        info = w.info
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT {', '.join(info.db_flds)} FROM {info.name} ORDER BY {', '.join(info.pk)}")
+            rows = cur.fetchmany(201)
+            cur.close()
+        if not rows:
+            return
+        row = rows[len(rows) // 2]
+        for c, v in zip(info.cols, row):
+            if c.kind == "sex":
+                v = "男" if v else "女"
+            v = norm(v).strip()
+            if not v:
+                continue
+            for mode in (["精确", "包含"] if c.kind == "text" else ["精确"]):
+                w.fld_combo.setCurrentText(c.cn)
+                w.mode_combo.setCurrentText(mode)
+                w.val_txt.setText(v)
+                w.search_timer.stop()  # 不让边输入边查询的定时器多发一次查询
+                times = [self.timed(w.query_data) for _ in range(self.repeat)]
+                self.results.append(summarize(f"query:{c.name}:{mode}", w.t_name, times,
+                                              rows=w.res_model.rowCount()))
+        w.val_txt.clear()
+
+    # 建了本地全文索引的表（见ngram_index.py）：测建索引的耗时，再取一个样本值测“包含”查询走索引的耗时，
+    # 整个值和它的第一个字各测一次（一个字没有二元组，要扫一遍文本），和上面查数据库的“包含”对比
+    def bench_search(self, cn):
+        from hospital_gui import TableWin
+        from ngram_index import TextSearch
+        from result_model import norm
+        from table_registry import tables
+        info = tables[cn]
+        search = TextSearch()
+        search.ttl = float("inf")  # 测试时没有变更通知来确认索引是新的，不让它过期
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            t0 = time.perf_counter()
+            n = search.build(cur, info.name.lower())
+            build_ms = (time.perf_counter() - t0) * 1000
+            cur.execute(f"SELECT {', '.join(info.search)} FROM {info.name} ORDER BY {', '.join(info.pk)}")
+            rows = cur.fetchmany(201)
+            cur.close()
+        self.results.append(summarize("index_build", cn, [build_ms], rows=n))
+        if not rows:
+            return
+        w = TableWin(cn, self.exe, search=search)
+        w.show()
+        self.wait()
+        for f, v in zip(info.search, rows[len(rows) // 2]):
+            v = norm(v).strip()
+            for val in dict.fromkeys([v, v[:1]]):
+                if not val:
+                    continue
+                w.fld_combo.setCurrentText(info.rev_map[f])
+                w.mode_combo.setCurrentText("包含")
+                w.val_txt.setText(val)
+                w.search_timer.stop()
+                times = [self.timed(w.query_data) for _ in range(self.repeat)]
+                self.results.append(summarize(f"query:{f}:包含{len(val)}字:index", cn, times,
+                                              rows=w.pager.total))
+        w.val_txt.clear()
+        w.close()
+
+    # 统计窗口的关联汇总查询（基本表上的GROUP BY和索引视图两种写法）
+    def bench_joins(self):
+        from stats_win import charts
+        for title, view_sql, base_sql, limit in charts:
+            for kind, sql in (("view", view_sql), ("base", base_sql)):
+                times = []
+                try:
+                    for _ in range(self.repeat):
+                        with self.pool.connection() as conn:
+                            cur = conn.cursor()
+                            t0 = time.perf_counter()
+                            cur.execute(sql)
+                            cur.fetchmany(limit)
+                            times.append((time.perf_counter() - t0) * 1000)
+                            cur.close()
+                except Exception as e:
+                    self.results.append({"name": f"join:{kind}", "table": title, "error": str(e)})
+                    continue
+                self.results.append(summarize(f"join:{kind}", title, times))
+
+    # 在患者表上新增、修改、删除测试患者，每轮一个新编号，测完都删掉
+    def bench_crud(self, w):
+        self.msgs.clear()
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT dno FROM doctor")
+            dno = cur.fetchone()[0].strip()
+            cur.execute("SELECT rno FROM room")
+            rno = cur.fetchone()[0].strip()
+            cur.close()
+        adds, upds, dels = [], [], []
+        for i in range(self.repeat):
+            w.clear_inputs()
+            pno = f"BENCH{os.getpid()}_{i}"
+            for f, v in (("pno", pno), ("pname", "测试"), ("dno", dno), ("rno", rno), ("illness", "感冒")):
+                w.wid_dict[f].setText(v)
+            adds.append(self.timed(w.add_data))
+            w.clear_inputs()
+            w.wid_dict["pno"].setText(pno)
+            w.wid_dict["illness"].setText("肺炎")
+            upds.append(self.timed(w.upd_data))
+            w.clear_inputs()
+            w.wid_dict["pno"].setText(pno)
+            dels.append(self.timed(w.del_data))
+        errs = [m for m in self.msgs if m and m[0] != "成功"]
+        for name, times in (("add", adds), ("update", upds), ("delete", dels)):
+            self.results.append(summarize(name, w.t_name, times))
+        if errs:
+            self.results.append({"name": "crud_messages", "table": w.t_name, "messages": [list(m) for m in errs]})
+
+    def run(self, table_names):
+        for cn in table_names:
+            w = self.open_win(cn)
+            self.bench_load(w)
+            self.bench_query(w)
+            if cn == "患者表":
+                self.bench_crud(w)
+            w.close()
+            if w.info.search:
+                self.bench_search(cn)
+        self.bench_joins()
+        return self.results
+
+    def close(self):
+        self.exe.close()
+        self.pool.close()
+
+
+# 和之前的结果对比，按(名称, 表)配对，列出中位数的变化
+def compare(old, new):
+    before = {(r["name"], r["table"]): r for r in old["results"] if "median_ms" in r}
+    lines = []
+    for r in new["results"]:
+        o = before.get((r["name"], r["table"]))
+        if o is None or "median_ms" not in r:
+            continue
+        ratio = r["median_ms"] / o["median_ms"] if o["median_ms"] else float("inf")
+        flag = "  变慢" if ratio > 1.2 else ("  变快" if ratio < 0.8 else "")
+        lines.append(f"{r['table']:<14}{r['name']:<28}{o['median_ms']:>10.2f}{r['median_ms']:>10.2f}{ratio:>8.2f}x{flag}")
+    return lines
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="医院管理系统性能测试")
+    ap.add_argument("--patients", type=int, default=1000, help="患者数，1000到10000000")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--repeat", type=int, default=3, help="每项测几次")
+    ap.add_argument("--tables", default="科室表,医生表,患者表,药品表,病房表,患者用药表")
+    ap.add_argument("--db-dir", default=".", help="SQLite测试库放在哪个目录")
+    ap.add_argument("--engine", default="sqlite", choices=["sqlite", "duckdb"], help="造数据用的嵌入式数据库")
+    ap.add_argument("--odbc", action="store_true", help="测db.ini里配置的数据库")
+    ap.add_argument("--out", default="bench.json")
+    ap.add_argument("--compare", help="之前的结果文件")
+    args = ap.parse_args(argv)
+
+    meta = {"time": datetime.datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+            "platform": platform.platform(), "repeat": args.repeat}
+    if args.odbc:
+        from backend import load_backend
+        backend = load_backend()
+        connect = backend.connect
+        meta["backend"] = backend.name
+    else:
+        from backend import SqliteBackend, DuckdbBackend
+        path, gen = prepare_db(args.engine, args.patients, args.seed, args.db_dir)
+        connect = (DuckdbBackend if args.engine == "duckdb" else SqliteBackend)(path).connect
+        meta.update(backend=args.engine, patients=args.patients, seed=args.seed, db=path)
+        if gen:
+            meta["generate"] = gen
+    suite = Suite(connect, args.repeat)
+    try:
+        results = suite.run([t for t in args.tables.split(",") if t])
+    finally:
+        suite.close()
+    out = {"meta": meta, "results": results}
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(out, f, ensure_ascii=False, indent=1)
+    for r in results:
+        if "median_ms" in r:
+            print(f"{r['table']:<14}{r['name']:<28}{r['median_ms']:>10.2f} ms")
+        else:
+            print(f"{r['table']:<14}{r['name']:<28}{r.get('error') or r.get('messages')}")
+    print(f"结果已写入{args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        print(f"{'表':<13}{'项目':<26}{'之前(ms)':>10}{'现在(ms)':>10}{'比值':>8}")
+        for line in compare(old, out):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
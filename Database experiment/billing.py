@@ -0,0 +1,209 @@
+import sys
+import time
+import datetime
+import argparse
+import configparser
+from concurrent.futures import ThreadPoolExecutor
+from backend import config_path
+
+# 住院费用结算：药费 = 患者用药表的数量 × 药品单价，床位费 = 住院天数 × 每天床位费，结果写进bill表（每个患者一行）
+# 费用全部在数据库里算：一条INSERT…SELECT把患者、用药、药品连起来按患者GROUP BY，算好直接写入bill，
+# 不把用药记录读到程序里逐行累加
+# 批量结算按科室分区（患者 -> 主治医师 -> 科室），每个科室一个任务放进线程池，各借一个连接、各自提交；
+# 计算都在数据库里进行，线程只是等结果，所以用线程池就够了，不需要多进程
+# 增量：连SQL Server时按rowversion找出上次结算之后有变化的患者，只重算这些：
+#   患者行改过（入院/出院日期、主治医师等）、用药行新增或改过、用到的药品改过价格
+#   （发药会改库存，drug的rowversion一直在变，所以药价是和bill_price里记下的上次结算用的价格比较）、
+#   用药行被删（rowversion看不到删除，比较bill里记下的用药条数）、还没有结算记录、换了科室；
+#   没填预计出院日期的患者住院天数每天都在变，每次都重算
+# 嵌入式数据库没有rowversion，每次全部重算
+# 每次结算在bill_run里记一行，下次增量从这次记下的版本号之后开始；某个科室失败时不记，下次照样从上次的版本号开始
+# 命令行（可以加到Windows计划任务里每晚执行）：
+#   python billing.py settle [--full] [--workers 4]     结算db.ini里配置的数据库
+#   python billing.py bench --patients 700000           用SQLite造约100万条用药记录，测结算耗时
+
+default_bed_fee = 80  # 每天床位费（元），db.ini的[billing]里可以改
+
+# 版本号按bigint保存，和binary(8)的rowversion比较，见snapshot.py
+mark_sql = "CAST(CAST(? AS bigint) AS binary(8))"
+top_sql = "SELECT CAST(MIN_ACTIVE_ROWVERSION() AS bigint) - 1"
+last_sql = "SELECT TOP 1 mark FROM bill_run ORDER BY run_at DESC"
+
+# 住院天数：入院日到预计出院日，没填预计出院日的算到结算日，不满1天按1天，没填入院日期的不收床位费
+days_sql = ("CASE WHEN p.startdate IS NULL THEN 0 "
+            "WHEN DATEDIFF(day, p.startdate, COALESCE(p.predictenddate, ?)) < 1 THEN 1 "
+            "ELSE DATEDIFF(day, p.startdate, COALESCE(p.predictenddate, ?)) END")
+
+# 价格和上次结算时不一样的药（包括新药）
+price_sql = ("SELECT g.dgno, g.dgprice FROM drug g LEFT JOIN bill_price bp ON bp.dgno = g.dgno "
+             "WHERE bp.dgno IS NULL OR COALESCE(bp.dgprice, -1) <> COALESCE(g.dgprice, -1)")
+max_price_changes = 500  # 改价的药太多时直接全部重算
+
+# 上次结算之后有变化的患者（{b}为bill上的科室条件，{drugs}为改过价格的药的条件）
+changed_sql = (f"(p.predictenddate IS NULL OR p.rv > {mark_sql} "
+               f"OR EXISTS (SELECT 1 FROM PD x WHERE x.pno = p.pno AND (x.rv > {mark_sql}{{drugs}})) "
+               "OR NOT EXISTS (SELECT 1 FROM bill b WHERE b.pno = p.pno AND {b} "
+               "AND b.pd_cnt = (SELECT COUNT(*) FROM PD x WHERE x.pno = p.pno)))")
+
+
+# 每天床位费，db.ini里[billing] bed_fee配置
+def load_bed_fee(path=config_path):
+    cfg = configparser.ConfigParser(interpolation=None)
+    cfg.read(path, encoding="utf-8")
+    return cfg.getint("billing", "bed_fee", fallback=default_bed_fee)
+
+
+# 一个科室的结算语句：先删掉要重算的患者原来的结算行，再一条INSERT…SELECT算好写入
+# dpno为None的分区是没有主治医师（或医生没有科室）的患者；mark为None时整个科室全部重算；drugs为改过价格的药
+def part_stmts(dpno, mark, asof, fee, drugs=()):
+    if dpno is None:
+        where, b_cond, ps, b_ps = "d.dpno IS NULL", "b.dpno IS NULL", [], []
+    else:
+        where, b_cond, ps, b_ps = "d.dpno = ?", "b.dpno = ?", [dpno], [dpno]
+    if mark is not None:
+        in_drugs = f" OR x.dgno IN ({', '.join(['?'] * len(drugs))})" if drugs else ""
+        where += " AND " + changed_sql.format(b=b_cond, drugs=in_drugs)
+        ps += [mark, mark] + list(drugs) + b_ps
+    scope = f"FROM patient p LEFT JOIN doctor d ON d.dno = p.dno WHERE {where}"
+    delete = (f"DELETE FROM bill WHERE pno IN (SELECT p.pno {scope})", ps)
+    insert = ("INSERT INTO bill (pno, dpno, drug_fee, pd_cnt, days, bed_fee, total, settle_date) "
+              "SELECT t.pno, t.dpno, t.drug_fee, t.pd_cnt, t.days, t.days * ?, t.drug_fee + t.days * ?, ? "
+              f"FROM (SELECT p.pno, d.dpno, {days_sql} AS days, "
+              "COALESCE(SUM(pd.num * g.dgprice), 0) AS drug_fee, COUNT(pd.pno) AS pd_cnt "
+              f"FROM patient p LEFT JOIN doctor d ON d.dno = p.dno "
+              "LEFT JOIN PD pd ON pd.pno = p.pno LEFT JOIN drug g ON g.dgno = pd.dgno "
+              f"WHERE {where} GROUP BY p.pno, d.dpno, p.startdate, p.predictenddate) t",
+              [fee, fee, asof, asof, asof] + ps)
+    return delete, insert
+
+
+# 在线程池的线程里结算一个科室：借一个连接，两条语句一个事务，返回重算的患者数
+def settle_part(pool, dpno, mark, asof, fee, drugs):
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        try:
+            (d_sql, d_ps), (i_sql, i_ps) = part_stmts(dpno, mark, asof, fee, drugs)
+            cur.execute(d_sql, d_ps)
+            cur.execute(i_sql, i_ps)
+            n = cur.rowcount
+            conn.commit()
+        finally:
+            cur.close()
+    return n
+
+
+# 结算：cur做准备和收尾（取版本号和改过价格的药、清理已删除患者的结算行、记录本次结算和用的药价），各科室在线程池里用连接池的连接执行
+# full=True时全部重算；asof为结算日（yyyy-MM-dd），默认今天；返回本次结算的情况
+def settle(cur, pool, full=False, workers=4, asof=None, fee=None):
+    from unit_of_work import versioned_tables
+    t0 = time.perf_counter()
+    asof = asof or datetime.date.today().isoformat()
+    fee = load_bed_fee() if fee is None else fee
+    versioned = {"patient", "pd", "drug"} <= versioned_tables(cur)
+    top = mark = None
+    if versioned:
+        cur.execute(top_sql)
+        top = cur.fetchone()[0]
+        if not full:
+            cur.execute(last_sql)
+            row = cur.fetchone()
+            mark = row[0] if row and row[0] is not None else None
+    cur.execute(price_sql)
+    prices = [tuple(r) for r in cur.fetchall()]  # 结算完记进bill_price，结算期间又改价的药下次还会被发现
+    if len(prices) > max_price_changes:
+        mark = None
+    full = mark is None
+    drugs = [d for d, _ in prices] if not full else []
+    cur.execute("DELETE FROM bill WHERE pno NOT IN (SELECT pno FROM patient)")
+    cur.execute("SELECT dpno FROM department")
+    parts = [r[0] for r in cur.fetchall()] + [None]
+    cur.connection.commit()  # 嵌入式数据库写的时候锁整个库，先提交，别挡住各科室的任务
+    if getattr(cur.connection, "serial_writes", False):  # SQLite一次只能一个写事务，并行只会互相等锁
+        workers = 1
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as tp:
+        counts = list(tp.map(lambda dp: settle_part(pool, dp, mark, asof, fee, drugs), parts))
+
+    ms = int((time.perf_counter() - t0) * 1000)
+    n = sum(c for c in counts if c and c > 0)
+    run_at = datetime.datetime.now().isoformat(sep=" ", timespec="microseconds")
+    cur.execute("INSERT INTO bill_run (run_at, settle_date, full_run, mark, patients, ms) VALUES (?, ?, ?, ?, ?, ?)",
+                [run_at, asof, 1 if full else 0, top, n, ms])
+    if prices:
+        cur.executemany("DELETE FROM bill_price WHERE dgno = ?", [(d,) for d, _ in prices])
+        cur.executemany("INSERT INTO bill_price (dgno, dgprice) VALUES (?, ?)", prices)
+    cur.execute("SELECT COUNT(*), SUM(total) FROM bill")
+    billed, amount = cur.fetchone()
+    cur.connection.commit()
+    return {"full": full, "parts": len(parts), "patients": n, "billed": billed, "amount": amount or 0, "ms": ms}
+
+
+def describe(res):
+    return (f"{'全部重算' if res['full'] else '增量结算'}：{res['parts']}个分区，重算{res['patients']}名患者，"
+            f"已结算{res['billed']}名患者，费用合计{res['amount']}元，用时{res['ms']}毫秒")
+
+
+# 命令行结算db.ini里配置的数据库
+def run_settle(args):
+    from backend import load_backend
+    from db_pool import ConnPool
+    backend = load_backend()
+    pool = ConnPool(backend.connect, min_size=1, max_size=args.workers + 1).start()
+    try:
+        with pool.connection() as conn:
+            cur = conn.cursor()
+            res = settle(cur, pool, full=args.full, workers=args.workers, asof=args.asof)
+            cur.close()
+    finally:
+        pool.close()
+    print(describe(res))
+
+
+# 结算耗时测试：用bench_suite造的SQLite测试库（每个患者0到3条用药记录，70万患者约100万条），
+# 分别用1个线程和--workers个线程全部重算一次，再增量结算一次
+# （SQLite一次只能一个写事务，各科室总是依次结算；DuckDB可以并行；两者都没有rowversion，增量也是全部重算）
+def run_bench(args):
+    from bench_suite import prepare_db
+    from backend import SqliteBackend, DuckdbBackend
+    from db_pool import ConnPool
+    path, gen = prepare_db(args.engine, args.patients, args.seed, args.db_dir)
+    if gen:
+        print(f"造数据用时{gen['seconds']}秒：{gen['rows']}")
+    backend = (DuckdbBackend if args.engine == "duckdb" else SqliteBackend)(path)
+    pool = ConnPool(backend.connect, min_size=1, max_size=args.workers + 1).start()
+    try:
+        with pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT COUNT(*) FROM PD")
+            print(f"{args.engine}，{args.patients}名患者，{cur.fetchone()[0]}条用药记录")
+            for name, full, workers in (("全部重算 1线程", True, 1), (f"全部重算 {args.workers}线程", True, args.workers),
+                                        (f"增量结算 {args.workers}线程", False, args.workers)):
+                res = settle(cur, pool, full=full, workers=workers)
+                print(f"{name:<16}{res['ms']:>10} ms  {describe(res)}")
+            cur.close()
+    finally:
+        pool.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="住院费用结算")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("settle", help="结算db.ini里配置的数据库")
+    p.add_argument("--full", action="store_true", help="全部重算，不做增量")
+    p.add_argument("--workers", type=int, default=4, help="同时结算几个科室")
+    p.add_argument("--asof", help="结算日yyyy-MM-dd，默认今天")
+    p = sub.add_parser("bench", help="在造出的测试库上测结算耗时")
+    p.add_argument("--patients", type=int, default=700000, help="患者数，每个患者平均1.5条用药记录")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--db-dir", default=".", help="测试库放在哪个目录")
+    p.add_argument("--engine", default="sqlite", choices=["sqlite", "duckdb"])
+    args = ap.parse_args(argv)
+    if args.cmd == "settle":
+        run_settle(args)
+    else:
+        run_bench(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
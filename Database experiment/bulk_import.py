@@ -0,0 +1,245 @@
+import csv
+import os
+import sys
+import time
+import datetime
+from table_registry import fks_of
+
+# 批量导入，从CSV/Excel文件流式读取数据，成批插入数据库
+# 原来只能在表单里一条一条新增，每条都要先查一次外键是否存在、再插入、再提交，
+# 导入几千条入院记录要几千次往返；这里：
+#   1. 外键（比如患者的主治医师、病房）和已有主键先一次性查出来放到集合里，逐行校验只查内存
+#   2. 通过校验的行攒够batch_size条，用executemany一次发给数据库（pyodbc开启fast_executemany），
+#      每批一个事务提交；某一批出错就回滚，改成逐行插入找出出错的行
+#   3. 没通过的行连同原因写到拒绝报告里（原文件名.rejects.csv），不影响其他行导入
+
+# 导入无法进行（比如读Excel缺少openpyxl）时抛出
+class ImportFail(Exception):
+    pass
+
+
+# 逐行读取CSV，第一行是表头，返回(行号, {表头: 值})
+def read_csv(path):
+    for enc in ("utf-8-sig", "gbk"):  # Excel另存的CSV常见是GBK编码
+        try:
+            with open(path, newline="", encoding=enc) as f:
+                f.read(4096)
+            break
+        except UnicodeDecodeError:
+            continue
+    with open(path, newline="", encoding=enc) as f:
+        for i, row in enumerate(csv.DictReader(f), start=2):
+            yield i, row
+
+
+# 逐行读取Excel的第一个工作表，只读模式不会把整个文件载入内存，需要安装openpyxl
+def read_xlsx(path):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportFail("导入Excel文件需要先安装openpyxl：pip install openpyxl")
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        heads = [str(h).strip() if h is not None else "" for h in next(rows, [])]
+        for i, vals in enumerate(rows, start=2):
+            yield i, dict(zip(heads, vals))
+    finally:
+        wb.close()
+
+
+def read_rows(path):
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        return read_xlsx(path)
+    return read_csv(path)
+
+
+# SQL Server的char(n)会补尾部空格，比较主键时统一去掉
+def key_of(val):
+    return "" if val is None else str(val).strip()
+
+
+class BulkImporter:
+    # tname：英文表名；fld_map：中文字段名->数据库字段；kinds：数据库字段->类型(text/int/date/sex)
+    # key_cols：主键字段；before_insert(cur, 值列表的列表)在每批插入前、同一个事务里调用，抛出异常时这一批不插入
+    # （导入用药记录时用它扣药品库存）
+    def __init__(self, tname, fld_map, kinds, key_cols, batch_size=1000, before_insert=None):
+        self.tname = tname
+        self.fld_map = fld_map
+        self.db_flds = list(fld_map.values())
+        self.kinds = kinds
+        self.key_cols = list(key_cols)
+        self.batch_size = batch_size
+        self.before_insert = before_insert
+        # 表头既可以是中文字段名也可以是数据库字段名
+        self.head_map = {cn: f for cn, f in fld_map.items()}
+        self.head_map.update({f: f for f in self.db_flds})
+        ph = ", ".join(["?"] * len(self.db_flds))
+        self.sql = f"INSERT INTO {tname} ({', '.join(self.db_flds)}) VALUES ({ph})"
+
+    # 一次性查出外键和本表已有主键，逐行校验时只查内存
+    def prefetch(self, cur):
+        self.fk_sets = {}
+        for col, ref_t, ref_col in fks_of(self.tname):
+            cur.execute(f"SELECT {ref_col} FROM {ref_t}")
+            self.fk_sets[col] = {key_of(r[0]) for r in cur.fetchall()}
+        cur.execute(f"SELECT {', '.join(self.key_cols)} FROM {self.tname}")
+        self.keys = {tuple(key_of(v) for v in r) for r in cur.fetchall()}
+
+    # 按字段类型转换一个值，不合法抛ValueError
+    def conv(self, f, val):
+        if val is None or (isinstance(val, str) and not val.strip()):
+            return None
+        kind = self.kinds.get(f, "text")
+        if kind == "sex":
+            s = str(val).strip()
+            if s in ("男", "1"):
+                return 1
+            if s in ("女", "0"):
+                return 0
+            raise ValueError(f"性别只能是男/女：{s}")
+        if kind == "int":
+            return int(float(val))
+        if kind == "date":
+            if isinstance(val, (datetime.datetime, datetime.date)):
+                return val.strftime("%Y-%m-%d")
+            s = str(val).strip().replace("/", "-")
+            return datetime.datetime.strptime(s, "%Y-%m-%d").strftime("%Y-%m-%d")
+        return str(val).strip()
+
+    # 校验并转换一行，返回(插入用的值列表, 拒绝原因)
+    def check(self, rec):
+        vals = {}
+        for head, val in rec.items():
+            f = self.head_map.get(str(head).strip()) if head is not None else None
+            if f:
+                try:
+                    vals[f] = self.conv(f, val)
+                except (TypeError, ValueError) as e:
+                    return None, f"字段{f}格式错误：{e}"
+        key = tuple(key_of(vals.get(k)) for k in self.key_cols)
+        if not all(key):
+            return None, "主键不能为空"
+        if key in self.keys:
+            return None, "主键已存在"
+        for col, ref_set in self.fk_sets.items():
+            v = vals.get(col)
+            if v is not None and key_of(v) not in ref_set:
+                return None, f"外键{col}={v}在被参照表中不存在"
+        self.keys.add(key)  # 同一文件里重复的主键也要拒绝
+        return [vals.get(f) for f in self.db_flds], None
+
+    # 执行导入，cur是数据库游标；progress(已处理行数)用来显示进度，返回True时中止导入
+    def run(self, cur, path, report_path=None, progress=None):
+        t0 = time.perf_counter()
+        conn = cur.connection
+        if hasattr(cur, "fast_executemany"):
+            cur.fast_executemany = True  # pyodbc一次把整批参数发给服务器，不再逐行往返
+        self.prefetch(cur)
+        report_path = report_path or os.path.splitext(path)[0] + ".rejects.csv"
+        stats = {"total": 0, "inserted": 0, "rejected": 0, "report": report_path}
+        batch = []  # [(行号, 值列表)]
+        with open(report_path, "w", newline="", encoding="utf-8-sig") as rf:
+            rep = csv.writer(rf)
+            rep.writerow(["行号", "原因"] + self.db_flds)
+            for line, rec in read_rows(path):
+                stats["total"] += 1
+                vals, err = self.check(rec)
+                if err:
+                    stats["rejected"] += 1
+                    rep.writerow([line, err] + [rec.get(cn, rec.get(f)) for cn, f in self.fld_map.items()])
+                else:
+                    batch.append((line, vals))
+                if len(batch) >= self.batch_size:
+                    self.flush(cur, conn, batch, stats, rep)
+                    batch = []
+                if progress and stats["total"] % self.batch_size == 0 and progress(stats["total"]):
+                    break
+            if batch:
+                self.flush(cur, conn, batch, stats, rep)
+        stats["seconds"] = time.perf_counter() - t0
+        stats["rows_per_sec"] = stats["inserted"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+    # 插入一批，一个事务；整批失败时回滚，逐行重试找出出错的行写进报告
+    def flush(self, cur, conn, batch, stats, rep):
+        try:
+            if self.before_insert:
+                self.before_insert(cur, [v for _, v in batch])
+            cur.executemany(self.sql, [v for _, v in batch])
+            conn.commit()
+            stats["inserted"] += len(batch)
+            return
+        except Exception:
+            conn.rollback()
+        for line, vals in batch:
+            try:
+                if self.before_insert:
+                    self.before_insert(cur, [vals])
+                cur.execute(self.sql, vals)
+                conn.commit()
+                stats["inserted"] += 1
+            except Exception as e:
+                conn.rollback()
+                stats["rejected"] += 1
+                rep.writerow([line, f"数据库拒绝：{e}"] + vals)
+
+
+# 对比逐行新增（和add_data一样：先查主治医师是否存在，再插入、提交）和批量导入的速度
+# 往patient表插入n条测试数据，测完删除；connect为建立连接的函数
+def bench(connect, n=2000, batch_size=1000):
+    import tempfile
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("SELECT dno FROM doctor")
+    dnos = [key_of(r[0]) for r in cur.fetchall()]
+    cur.execute("SELECT rno FROM room")
+    rnos = [key_of(r[0]) for r in cur.fetchall()]
+    if not dnos or not rnos:
+        raise ImportFail("测试需要doctor和room表里至少有一条数据")
+    flds = ["pno", "pname", "psex", "page", "dno", "rno", "illness", "startdate", "predictenddate"]
+    rows = [[f"BENCH{i:07d}", f"测试{i}", i % 2, i % 90, dnos[i % len(dnos)], rnos[i % len(rnos)],
+             "测试", "2024-01-01", "2024-01-10"] for i in range(n)]
+    res = {}
+    try:
+        # 逐行：每行一次外键查询、一次插入、一次提交
+        t0 = time.perf_counter()
+        for r in rows:
+            cur.execute("SELECT COUNT(*) FROM doctor WHERE dno = ?", (r[4],))
+            cur.fetchone()
+            cur.execute(f"INSERT INTO patient ({', '.join(flds)}) VALUES ({', '.join('?' * len(flds))})", r)
+            conn.commit()
+        res["per_row"] = n / (time.perf_counter() - t0)
+        cur.execute("DELETE FROM patient WHERE pno LIKE 'BENCH%'")
+        conn.commit()
+
+        # 批量：把同样的数据写成CSV再走导入流程
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        os.close(fd)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(flds)
+            w.writerows(rows)
+        fld_map = {f: f for f in flds}
+        kinds = {"psex": "sex", "page": "int", "startdate": "date", "predictenddate": "date"}
+        st = BulkImporter("patient", fld_map, kinds, ["pno"], batch_size).run(cur, path)
+        res["bulk"] = st["rows_per_sec"]
+        res["bulk_rejected"] = st["rejected"]
+        os.remove(path)
+        os.remove(st["report"])
+    finally:
+        cur.execute("DELETE FROM patient WHERE pno LIKE 'BENCH%'")
+        conn.commit()
+        conn.close()
+    res["speedup"] = res["bulk"] / res["per_row"] if res.get("per_row") else None
+    return res
+
+
+if __name__ == "__main__":
+    # python bulk_import.py [行数]  对db.ini里配置的数据库跑一次导入速度对比
+    from backend import load_backend
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    r = bench(load_backend().connect, n)
+    print(f"逐行新增：{r['per_row']:.0f} 行/秒")
+    print(f"批量导入：{r['bulk']:.0f} 行/秒（拒绝{r['bulk_rejected']}行）")
+    print(f"提升：{r['speedup']:.1f} 倍")
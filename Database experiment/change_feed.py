@@ -0,0 +1,110 @@
+import time
+import threading
+from table_registry import table_list
+from snapshot import key_of
+
+# 变更通知：别的终端增删改了数据，开着的表窗口自己更新改过的那几行，不用点刷新
+# 原来窗口里是打开（或翻页）那一刻的数据，别人改了要手动刷新才看得到；
+# 想自动更新只能每个窗口定时重查整页，开几个窗口就查几倍
+# 现在每张表上有触发器，把增删改过的行的主键记到change_log表（sql文件最后的语句建的），
+# 整个程序只有主窗口一个定时任务每隔几秒取一次新的记录，按表合并主键后交给各表窗口，
+# 窗口只按这些主键重查几行放进表格（见TableWin.apply_changes）
+# SQL Server上按rv（rowversion）取增量，上限是MIN_ACTIVE_ROWVERSION()-1，还没提交的事务不会被跳过（和snapshot.py一样）；
+# SQLite同一时间只有一个写事务，按自增的seq取不会漏，日志表和触发器第一次轮询时建好（建表脚本跳过了T-SQL的写法）；
+# DuckDB不支持触发器，查不到change_log，不启用
+
+
+# SQLite上的日志表和触发器：每张表的增、删、改各一个，改的时候新旧主键都记下（改了主键的话两个都要更新）
+def sqlite_ddl():
+    out = ["CREATE TABLE IF NOT EXISTS change_log (seq INTEGER PRIMARY KEY AUTOINCREMENT, tname TEXT NOT NULL, "
+           "k1 TEXT NOT NULL, k2 TEXT, logged_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"]
+    for info in table_list:
+        t = info.name.lower()
+        for ev, recs in (("insert", ("NEW",)), ("update", ("NEW", "OLD")), ("delete", ("OLD",))):
+            sel = " UNION ".join(
+                f"SELECT '{t}', {', '.join(f'{r}.{k}' for k in info.pk)}{', NULL' if len(info.pk) == 1 else ''}"
+                for r in recs)
+            out.append(f"CREATE TRIGGER IF NOT EXISTS trg_{t}_log_{ev} AFTER {ev.upper()} ON {info.name} "
+                       f"BEGIN INSERT INTO change_log (tname, k1, k2) {sel}; END")
+    return out
+
+
+class ChangeFeed:
+    # 取增量：rv在(上次版本, 本次上限]之间的记录，版本号按bigint处理
+    delta_sql = ("SELECT tname, k1, k2, CAST(rv AS bigint) FROM change_log "
+                 "WHERE rv > CAST(CAST(? AS bigint) AS binary(8)) AND rv <= CAST(CAST(? AS bigint) AS binary(8))")
+    top_sql = "SELECT CAST(MIN_ACTIVE_ROWVERSION() AS bigint) - 1"
+    seq_sql = "SELECT tname, k1, k2, seq FROM change_log WHERE seq > ?"
+    # 一天前的记录删掉，日志表不会越来越大；每个终端隔一段时间清理一次，只读模式不清理
+    prune_sql = {
+        False: "DELETE FROM change_log WHERE logged_at < DATEADD(day, -1, GETDATE())",
+        True: "DELETE FROM change_log WHERE logged_at < datetime('now', '-1 day')",
+    }
+    max_keys = 200  # 一张表一次改了更多行时不再逐行更新，窗口直接重新加载当前页
+    prune_every = 3600  # 多少秒清理一次
+
+    def __init__(self, read_only=False):
+        self.read_only = read_only
+        self.mark = None  # 已经取到的版本号（SQLite上是seq），None表示还没开始
+        self.serial = False  # 数据库同一时间只有一个写事务（SQLite），按seq取增量
+        self.ok = True  # 数据库里没有change_log（没执行sql文件最后的语句、DuckDB）时为False，主窗口停止轮询
+        self.pruned_at = time.monotonic()
+        self.lock = threading.Lock()  # 同一时间只有一个轮询任务
+
+    # 第一次轮询：SQLite上建好日志表和触发器，记下当前的版本号，之前的改动不用通知
+    def start(self, cur):
+        self.serial = bool(getattr(cur.connection, "serial_writes", False))
+        try:
+            if self.serial:
+                if not self.read_only:
+                    for sql in sqlite_ddl():
+                        cur.execute(sql)
+                    cur.connection.commit()
+                cur.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log")
+            else:
+                cur.execute("SELECT COUNT(*) FROM change_log WHERE 1 = 0")
+                cur.fetchall()
+                cur.execute(self.top_sql)
+            self.mark = cur.fetchone()[0]
+        except Exception:
+            self.ok = False
+        cur.connection.rollback()
+
+    # 取一次新的改动（在工作线程里执行），返回{表名(小写): 改过的主键集合}，改得太多的表为None
+    # 主键是去掉尾部空格的元组，顺序和TableInfo.pk一致
+    def poll(self, cur):
+        with self.lock:
+            if self.mark is None:
+                self.start(cur)
+                return {}
+            if not self.ok:
+                return {}
+            if self.serial:
+                cur.execute(self.seq_sql, [self.mark])
+                top = self.mark
+            else:
+                cur.execute(self.top_sql)
+                top = cur.fetchone()[0]
+                if top <= self.mark:
+                    cur.connection.rollback()
+                    return {}
+                cur.execute(self.delta_sql, [self.mark, top])
+            rows = cur.fetchall()
+            cur.connection.rollback()  # 只读，结束事务
+            changes = {}
+            for t, k1, k2, v in rows:
+                top = max(top, v)
+                keys = changes.setdefault(t, set())
+                if keys is not None:
+                    keys.add((key_of(k1),) if k2 is None else (key_of(k1), key_of(k2)))
+                    if len(keys) > self.max_keys:
+                        changes[t] = None
+            self.mark = top
+            if not self.read_only and time.monotonic() - self.pruned_at > self.prune_every:
+                self.pruned_at = time.monotonic()
+                try:
+                    cur.execute(self.prune_sql[self.serial])
+                    cur.connection.commit()
+                except Exception:
+                    cur.connection.rollback()  # 清理失败不影响通知，下次再清理
+            return changes
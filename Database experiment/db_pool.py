@@ -0,0 +1,176 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# 数据库连接池，替换原来整个程序只用一个get_db()连接的做法
+# 原做法：主窗口建一个连接，所有子窗口共用，一个窗口在查数据其他窗口只能排队，
+# 网络一断这个连接就废了，必须重启程序
+# 现做法：池里维护若干连接，子窗口和后台线程用的时候借一个、用完还回来；
+# 借出前先执行一次SELECT 1检查连接是否还活着，坏了就关掉重新连接；
+# 空闲太久的连接会被关掉，但至少保留min_size个
+# 连接函数可以换成sqlite3.connect之类的函数，方便在本地没有SQL Server时测试
+
+# 数据库连接信息，按本地SQL Server配置修改
+conn_str = (
+    r'DRIVER={ODBC Driver 17 for SQL Server};'
+    r'SERVER=.\MYSQL;'
+    r'DATABASE=hospital;'
+    r'Trusted_Connection=yes;'
+    r'MARS_Connection=yes;'  # 允许一个连接上同时有多个未读完的结果集
+)
+
+
+#新建一个SQL Server连接，失败直接抛异常
+#pyodbc用到时才导入，只用SQLite替身（比如跑性能测试）的机器上不装pyodbc也能运行
+def connect_db():
+    import pyodbc
+    return pyodbc.connect(conn_str)#发起连接
+
+
+# 连接池借不到连接（都被占用且等待超时）时抛出
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnPool:
+    def __init__(self, connect=connect_db, min_size=1, max_size=8,
+                 idle_timeout=300, borrow_timeout=30, check_sql="SELECT 1"):
+        self.connect = connect  # 建立新连接的函数
+        self.min_size = min_size  # 至少保留的连接数
+        self.max_size = max_size  # 最多同时存在的连接数
+        self.idle_timeout = idle_timeout  # 空闲超过多少秒就关闭
+        self.borrow_timeout = borrow_timeout  # 连接全被占用时最多等多少秒
+        self.check_sql = check_sql  # 借出前检查连接是否可用的语句
+        self.idle = []  # 空闲连接列表，元素为(连接, 归还时间)，后还的在末尾
+        self.size = 0  # 当前连接总数（空闲+借出）
+        self.closed = False
+        self.cond = threading.Condition()
+
+    # 启动时先建好min_size个连接，连不上直接抛异常，主窗口据此提示连接失败
+    def start(self):
+        for _ in range(self.min_size - self.size):
+            conn = self.connect()
+            with self.cond:
+                self.size += 1
+                self.idle.append((conn, time.monotonic()))
+        return self
+
+    # 借一个连接：优先用最近归还的空闲连接，检查失败就重连；没有空闲且没到上限就新建
+    def borrow(self):
+        deadline = time.monotonic() + self.borrow_timeout
+        while True:
+            with self.cond:
+                if self.closed:
+                    raise PoolTimeout("连接池已关闭")
+                self.evict_idle_locked()
+                if self.idle:
+                    conn, _ = self.idle.pop()
+                elif self.size < self.max_size:
+                    conn = None
+                    self.size += 1  # 先占位，建连接时不持有锁
+                else:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        raise PoolTimeout(f"{self.borrow_timeout}秒内没有可用的数据库连接")
+                    self.cond.wait(left)
+                    continue
+            if conn is not None:
+                if self.alive(conn):
+                    return conn
+                self.discard(conn)  # 连接已断开，关掉后重新借
+                continue
+            try:
+                return self.connect()
+            except Exception:
+                with self.cond:
+                    self.size -= 1
+                    self.cond.notify()
+                raise
+
+    # 归还连接，broken=True表示使用中出错了，先检查是否还能用，不能用就丢弃
+    def release(self, conn, broken=False):
+        if conn is None:
+            return
+        try:
+            conn.rollback()  # 清掉没提交的事务，下一个使用者拿到的是干净的连接
+        except Exception:
+            broken = True
+        if broken and not self.alive(conn):
+            self.discard(conn)
+            return
+        with self.cond:
+            if self.closed:
+                self.size -= 1
+                self.close_conn(conn)
+                return
+            self.idle.append((conn, time.monotonic()))
+            self.cond.notify()
+
+    # with pool.connection() as conn: 用完自动归还，出异常时按坏连接处理
+    @contextmanager
+    def connection(self):
+        conn = self.borrow()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, broken=True)
+            raise
+        else:
+            self.release(conn)
+
+    # 检查连接是否可用
+    def alive(self, conn):
+        try:
+            cur = conn.cursor()
+            cur.execute(self.check_sql)
+            cur.fetchall()
+            cur.close()
+            return True
+        except Exception:
+            return False
+
+    # 丢弃一个坏连接，让出名额
+    def discard(self, conn):
+        self.close_conn(conn)
+        with self.cond:
+            self.size -= 1
+            self.cond.notify()
+
+    # 关闭空闲太久的连接，至少保留min_size个，可以由定时器定期调用
+    def evict_idle(self):
+        with self.cond:
+            self.evict_idle_locked()
+
+    def evict_idle_locked(self):
+        now = time.monotonic()
+        keep = []
+        # 最早归还的在前面，先淘汰它们
+        for conn, t in self.idle:
+            if now - t > self.idle_timeout and self.size > self.min_size:
+                self.size -= 1
+                self.close_conn(conn)
+            else:
+                keep.append((conn, t))
+        self.idle = keep
+
+    # 连接池状态，调试用
+    def stats(self):
+        with self.cond:
+            return {"size": self.size, "idle": len(self.idle), "busy": self.size - len(self.idle)}
+
+    # 关闭所有空闲连接，借出的连接归还时再关闭
+    def close(self):
+        with self.cond:
+            self.closed = True
+            for conn, _ in self.idle:
+                self.size -= 1
+                self.close_conn(conn)
+            self.idle = []
+            self.cond.notify_all()
+
+    @staticmethod
+    def close_conn(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
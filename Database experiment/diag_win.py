@@ -0,0 +1,126 @@
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import (
+    QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QSpinBox, QCheckBox,
+    QTableWidget, QTableWidgetItem, QHeaderView, QTabWidget, QFileDialog, QMessageBox
+)
+
+# 运行诊断窗口：显示perf_log记录的每条SQL、每次表格显示的耗时、启动和打开窗口的等待时间，以及按语句汇总的结果
+# 慢查询（超过阈值的）标红，阈值可以在窗口里调整；记录可以导出成JSON lines文件
+# 记录只有几千条，直接用QTableWidget显示，每两秒刷新一次
+
+rec_heads = ["时间", "操作", "类型", "SQL指纹", "参数", "执行(ms)", "取数(ms)", "显示(ms)", "合计(ms)", "行数", "错误"]
+sum_heads = ["操作", "类型", "SQL指纹", "次数", "总耗时(ms)", "平均(ms)", "最大(ms)", "总行数"]
+kind_names = {"execute": "查询", "executemany": "批量", "render": "显示", "startup": "启动"}
+
+
+class DiagWin(QMainWindow):
+    def __init__(self, recorder):
+        super().__init__()
+        self.rec = recorder
+        self.shown = None  # 上次显示时的记录条数，没变就不重画
+        self.setWindowTitle("运行诊断")
+        self.resize(1400, 800)
+
+        cen_wid = QWidget()
+        self.setCentralWidget(cen_wid)
+        main_layout = QVBoxLayout(cen_wid)
+
+        top_layout = QHBoxLayout()
+        top_layout.addWidget(QLabel("慢查询阈值(毫秒)："))
+        self.slow_spin = QSpinBox()
+        self.slow_spin.setRange(1, 600000)
+        self.slow_spin.setValue(int(self.rec.slow_ms))
+        self.slow_spin.valueChanged.connect(self.set_slow)
+        top_layout.addWidget(self.slow_spin)
+        self.slow_only = QCheckBox("只看慢查询")
+        self.slow_only.toggled.connect(lambda: self.refresh(force=True))
+        top_layout.addWidget(self.slow_only)
+        self.info_label = QLabel("")
+        top_layout.addWidget(self.info_label)
+        top_layout.addStretch()
+        self.clear_btn = QPushButton("清空")
+        self.exp_btn = QPushButton("导出JSONL")
+        self.clear_btn.clicked.connect(self.clear)
+        self.exp_btn.clicked.connect(self.export)
+        top_layout.addWidget(self.clear_btn)
+        top_layout.addWidget(self.exp_btn)
+        main_layout.addLayout(top_layout)
+
+        self.tabs = QTabWidget()
+        self.rec_table = self.make_table(rec_heads)
+        self.sum_table = self.make_table(sum_heads)
+        self.tabs.addTab(self.rec_table, "最近记录")
+        self.tabs.addTab(self.sum_table, "按语句汇总")
+        main_layout.addWidget(self.tabs)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(2000)
+        self.refresh()
+
+    @staticmethod
+    def make_table(heads):
+        t = QTableWidget(0, len(heads))
+        t.setHorizontalHeaderLabels(heads)
+        t.setEditTriggers(QTableWidget.NoEditTriggers)
+        t.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        t.horizontalHeader().setSectionResizeMode(heads.index("SQL指纹"), QHeaderView.Stretch)
+        return t
+
+    # 修改阈值只影响之后的记录
+    def set_slow(self, v):
+        self.rec.slow_ms = v
+
+    def refresh(self, force=False):
+        recs = self.rec.records()
+        if not force and self.shown == (len(recs), recs[-1]["time"] if recs else None):
+            return
+        self.shown = (len(recs), recs[-1]["time"] if recs else None)
+        self.info_label.setText(f"  共{len(recs)}条记录，慢查询{self.rec.slow_count}条"
+                                + (f"（已写入{self.rec.slow_path}）" if self.rec.slow_path else ""))
+        if self.slow_only.isChecked():
+            recs = [r for r in recs if r["slow"]]
+        recs.reverse()  # 最新的在最上面
+        self.fill(self.rec_table, [
+            [r["time"][11:], r["op"], kind_names.get(r["kind"], r["kind"]), r["sql"], ", ".join(r["params"]),
+             r.get("exec_ms", ""), r.get("fetch_ms", ""), r.get("render_ms", ""), r["total_ms"], r["rows"],
+             r.get("error", "")]
+            for r in recs], [r["slow"] or "error" in r for r in recs])
+        groups = self.rec.summary()
+        self.fill(self.sum_table, [
+            [op, kind_names.get(kind, kind), sql, n, round(total, 2), round(avg, 2), round(mx, 2), rows]
+            for op, kind, sql, n, total, avg, mx, rows in groups],
+            [g[5] >= self.rec.slow_ms for g in groups])
+
+    @staticmethod
+    def fill(table, rows, marks):
+        table.setUpdatesEnabled(False)
+        table.setRowCount(len(rows))
+        for i, (row, mark) in enumerate(zip(rows, marks)):
+            for j, v in enumerate(row):
+                item = QTableWidgetItem(str(v))
+                if isinstance(v, (int, float)):
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                if mark:
+                    item.setForeground(Qt.red)
+                table.setItem(i, j, item)
+        table.setUpdatesEnabled(True)
+
+    def clear(self):
+        self.rec.clear()
+        self.refresh(force=True)
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "导出运行记录", "perf_log.jsonl", "JSON lines (*.jsonl)")
+        if not path:
+            return
+        try:
+            n = self.rec.export(path)
+        except OSError as e:
+            QMessageBox.warning(self, "导出失败", f"错误：{str(e)}")
+            return
+        QMessageBox.information(self, "成功", f"已导出{n}条记录到{path}")
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        event.accept()
@@ -0,0 +1,249 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+from table_registry import by_tname
+from stmt import make_stmt, execute, executemany
+
+# 发药：患者用药表记下用药数量的同时扣减药品库存
+# 原来新增用药记录只写PD.num，不动drug.dgnum；要在程序里扣库存只能先读出库存再写回去，
+# 两个终端同时给同一种药发药时，后写回的会把先扣的覆盖掉（丢失更新）
+# 现在扣库存用带条件的UPDATE：SET dgnum = dgnum - 数量 WHERE dgno = 药品 AND dgnum >= 数量，
+# 读和写在数据库里一步完成，库存不够的药不会被改；
+# 一批发药单（可以是很多患者的）在一个事务里执行：
+#   1. 按药品合计数量，一条UPDATE扣掉这批用到的全部药品的库存（每种药一个CASE分支），
+#      改到的行数少于药品种数说明有药库存不够或者不存在，整批回滚，再查一次库存提示哪些药不够
+#   2. 已有的用药记录用executemany加上数量，没有的用executemany插入（有没有在语句里判断，不先查）
+#   3. 提交
+# 扣库存的语句按药品种数凑到固定的几档，不足的重复最后一种药补齐，同一档的语句文本一样，SQL Server只编译一份计划
+# 每个事务都先按药品编号顺序改drug，再按(药品, 患者)顺序改PD，加锁顺序一致，多个终端同时发药不会互相死锁
+# 改用药数量、删除用药记录、表格里保存、批量导入用药记录也走同一条扣库存的语句（数量为负时是退回库存），
+# 和改PD在同一个事务里，哪条路径写PD库存都跟着变，库存不会扣成负数
+# 压力测试：python dispense.py stress --workers 16   多个线程同时发药（SQLite），核对库存有没有丢失更新
+
+buckets = (1, 4, 16, 64, 256)  # 一条语句最多256种药，5×256个参数，不超过SQL Server的2100个
+
+dg = by_tname["drug"].by_name
+pd = by_tname["pd"].by_name
+take_stmts = {}  # 药品种数（档） -> 扣库存语句
+# 已有的用药记录加上数量
+add_stmt = make_stmt("UPDATE PD SET num = COALESCE(num, 0) + ? WHERE dgno = ? AND pno = ?",
+                     [pd["num"], pd["dgno"], pd["pno"]])
+# 没有的插入；UPDLOCK, HOLDLOCK锁住这个主键范围，两个终端同时给同一患者发同一种新药时后一个等前一个提交
+new_stmt = make_stmt("INSERT INTO PD (dgno, pno, num) SELECT ?, ?, ? WHERE NOT EXISTS "
+                     "(SELECT 1 FROM PD WITH (UPDLOCK, HOLDLOCK) WHERE dgno = ? AND pno = ?)",
+                     [pd["dgno"], pd["pno"], pd["num"], pd["dgno"], pd["pno"]])
+
+# 按原来的数量改/删一条用药记录，读出数量之后被别人改过的话改不到
+num_stmt = make_stmt("SELECT COALESCE(num, 0) FROM PD WHERE dgno = ? AND pno = ?", [pd["dgno"], pd["pno"]])
+set_stmt = make_stmt("UPDATE PD SET num = ? WHERE dgno = ? AND pno = ? AND COALESCE(num, 0) = ?",
+                     [pd["num"], pd["dgno"], pd["pno"], pd["num"]])
+drop_stmt = make_stmt("DELETE FROM PD WHERE dgno = ? AND pno = ? AND COALESCE(num, 0) = ?",
+                      [pd["dgno"], pd["pno"], pd["num"]])
+
+
+# 数量不对、库存不够、药品不存在时抛出，整批都没有执行
+class DispenseError(Exception):
+    pass
+
+
+# n种药的扣库存语句：参数为(药品, 数量)×n、药品×n、(药品, 数量)×n
+def take_stmt(n):
+    st = take_stmts.get(n)
+    if st is None:
+        case = "CASE dgno " + " ".join(["WHEN ? THEN ?"] * n) + " END"
+        st = make_stmt(f"UPDATE drug SET dgnum = dgnum - {case} "
+                       f"WHERE dgno IN ({', '.join(['?'] * n)}) AND dgnum >= {case}",
+                       [dg["dgno"], dg["dgnum"]] * n + [dg["dgno"]] * n + [dg["dgno"], dg["dgnum"]] * n)
+        take_stmts[n] = st
+    return st
+
+
+# 扣库存失败后（已回滚）查出是哪些药不够
+def shortage(cur, need):
+    drugs = list(need)
+    cur.execute(f"SELECT dgno, dgnum FROM drug WHERE dgno IN ({', '.join(['?'] * len(drugs))})", drugs)
+    stock = {r[0].rstrip(): r[1] for r in cur.fetchall()}
+    cur.connection.rollback()
+    msgs = []
+    for d in drugs:
+        if d not in stock:
+            msgs.append(f"药品{d}不存在")
+        elif stock[d] is None or stock[d] < need[d]:
+            msgs.append(f"药品{d}库存不足：需要{need[d]}，现有{stock[d] if stock[d] is not None else 0}")
+    return msgs or ["库存已被其他人改动，请重试"]
+
+
+# 发一批药（工作线程里执行）：orders为[(患者编号, 药品编号, 数量)]，在cur上一个事务里执行并提交，
+# 同一患者同一种药出现多次时数量合并；返回(用药记录条数, 药品种数, 总数量)
+def dispense(cur, orders):
+    lines = {}  # (药品, 患者) -> 数量
+    msgs = []
+    for pno, dgno, num in orders:
+        pno, dgno = str(pno).strip(), str(dgno).strip()
+        try:
+            n = int(num)
+        except (TypeError, ValueError):
+            n = 0
+        if n <= 0:
+            msgs.append(f"患者{pno}的药品{dgno}：用药数量必须大于0")
+            continue
+        lines[(dgno, pno)] = lines.get((dgno, pno), 0) + n
+    if msgs:
+        raise DispenseError("\n".join(msgs))
+    if not lines:
+        return 0, 0, 0
+    need = {}  # 药品 -> 合计数量
+    for (dgno, _), n in lines.items():
+        need[dgno] = need.get(dgno, 0) + n
+    keys = sorted(lines)
+    try:
+        take(cur, need)
+        executemany(cur, add_stmt, [(lines[k], k[0], k[1]) for k in keys])
+        executemany(cur, new_stmt, [(k[0], k[1], lines[k], k[0], k[1]) for k in keys])
+        cur.connection.commit()
+    except Exception:
+        cur.connection.rollback()
+        raise
+    return len(lines), len(need), sum(need.values())
+
+
+# 按药品改库存（工作线程里执行，不提交）：need为{药品: 数量}，正数扣库存、负数退回库存，数量为0的跳过
+# 按药品编号顺序、按档凑好的语句执行；有药库存不够或者不存在时回滚，抛出DispenseError说明是哪些药
+def take(cur, need):
+    drugs = sorted(d for d, n in need.items() if n)
+    for i in range(0, len(drugs), buckets[-1]):
+        part = drugs[i:i + buckets[-1]]
+        size = next(b for b in buckets if b >= len(part))
+        padded = part + [part[-1]] * (size - len(part))
+        arms = [v for d in padded for v in (d, need[d])]
+        execute(cur, take_stmt(size), arms + padded + arms)
+        if cur.rowcount != len(part):
+            cur.connection.rollback()
+            raise DispenseError("\n".join(shortage(cur, {d: need[d] for d in part})))
+
+
+# 把一条用药记录的数量改成num（工作线程里执行，不提交）：先读出原来的数量，多出来的扣库存、少了的退回库存，
+# 再带着原来的数量作为条件改PD；返回改到的行数，记录不存在时是0
+# 读完之后被别人改过的话回滚（连同库存），抛出DispenseError
+def set_num(cur, dgno, pno, num):
+    execute(cur, num_stmt, [dgno, pno])
+    row = cur.fetchone()
+    if row is None:
+        return 0
+    old = row[0]
+    take(cur, {dgno: (num or 0) - old})
+    execute(cur, set_stmt, [num, dgno, pno, old])
+    if cur.rowcount == 0:
+        cur.connection.rollback()
+        raise DispenseError("这条用药记录刚被其他人改过，请刷新后重试")
+    return cur.rowcount
+
+
+# 删除一条用药记录（工作线程里执行，不提交），用药数量退回库存；返回删掉的行数，规则同set_num
+def drop(cur, dgno, pno):
+    execute(cur, num_stmt, [dgno, pno])
+    row = cur.fetchone()
+    if row is None:
+        return 0
+    take(cur, {dgno: -row[0]})
+    execute(cur, drop_stmt, [dgno, pno, row[0]])
+    if cur.rowcount == 0:
+        cur.connection.rollback()
+        raise DispenseError("这条用药记录刚被其他人改过，请刷新后重试")
+    return cur.rowcount
+
+
+# 压力测试：在SQL文件建出的本地库上，workers个线程各用一个连接同时发药，每批随机batch个患者、每人1到3种药；
+# 0001号药的库存故意设得很少，会有批次因为库存不够整批失败
+# 结束后核对每种药：原库存 - 现库存 == 各线程发成功的数量之和 == 用药表里增加的数量，库存不能是负数
+def run_stress(args):
+    from backend import SqliteBackend
+    from db_pool import ConnPool
+    backend = SqliteBackend(os.path.join(tempfile.mkdtemp(), "dispense.db"))
+    pool = ConnPool(backend.connect, min_size=1, max_size=args.workers + 1).start()
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE drug SET dgnum = CASE WHEN dgno = '0001' THEN 500 ELSE 1000000 END")
+        conn.commit()
+        cur.execute("SELECT dgno, dgnum FROM drug")
+        stock0 = {r[0].rstrip(): r[1] for r in cur.fetchall()}
+        cur.execute("SELECT dgno, SUM(num) FROM PD GROUP BY dgno")
+        used0 = {r[0].rstrip(): r[1] or 0 for r in cur.fetchall()}
+        cur.execute("SELECT pno FROM patient")
+        patients = [r[0].rstrip() for r in cur.fetchall()]
+        cur.close()
+    drugs = sorted(stock0)
+    done = {}  # 药品 -> 发成功的数量
+    stats = {"batches": 0, "orders": 0, "rejected": 0}
+    lock = threading.Lock()
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        mine = {}
+        st = {"batches": 0, "orders": 0, "rejected": 0}
+        with pool.connection() as conn:
+            cur = conn.cursor()
+            for _ in range(args.rounds):
+                orders = [(p, d, rnd.randint(1, 5)) for p in rnd.sample(patients, min(args.batch, len(patients)))
+                          for d in rnd.sample(drugs, rnd.randint(1, 3))]
+                try:
+                    dispense(cur, orders)
+                except DispenseError:
+                    st["rejected"] += 1
+                else:
+                    st["batches"] += 1
+                    st["orders"] += len(orders)
+                    for _, d, n in orders:
+                        mine[d] = mine.get(d, 0) + n
+            cur.close()
+        with lock:
+            for d, n in mine.items():
+                done[d] = done.get(d, 0) + n
+            for k, v in st.items():
+                stats[k] += v
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    secs = time.perf_counter() - t0
+
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT dgno, dgnum FROM drug")
+        stock1 = {r[0].rstrip(): r[1] for r in cur.fetchall()}
+        cur.execute("SELECT dgno, SUM(num) FROM PD GROUP BY dgno")
+        used1 = {r[0].rstrip(): r[1] or 0 for r in cur.fetchall()}
+        cur.close()
+    pool.close()
+    bad = [d for d in drugs if not (stock0[d] - stock1[d] == done.get(d, 0) == used1.get(d, 0) - used0.get(d, 0))
+           or stock1[d] < 0]
+    print(f"SQLite，{args.workers}个线程，每批{args.batch}个患者，每个线程{args.rounds}批，用时{secs:.2f}秒")
+    print(f"成功{stats['batches']}批（{stats['orders']}条发药单，{stats['orders'] / secs:.0f}条/秒，"
+          f"{stats['batches'] / secs:.0f}批/秒），库存不足整批退回{stats['rejected']}批")
+    if bad:
+        print(f"库存对不上的药品：{bad}")
+        return 1
+    print(f"{len(drugs)}种药品的库存扣减与用药记录全部一致，没有丢失更新")
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="发药（扣减库存）")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("stress", help="多线程同时发药的压力测试")
+    p.add_argument("--workers", type=int, default=16, help="同时发药的线程数")
+    p.add_argument("--rounds", type=int, default=200, help="每个线程发几批")
+    p.add_argument("--batch", type=int, default=10, help="每批几个患者")
+    args = ap.parse_args(argv)
+    return run_stress(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
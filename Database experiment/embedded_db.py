@@ -0,0 +1,210 @@
+import os
+import re
+import sqlite3
+import datetime
+
+# 嵌入式数据库：没有SQL Server时（离线查房终端、测性能、在Linux上跑）用SQLite或DuckDB代替
+# 建表用项目里的sql文件，把T-SQL特有的写法换成对应数据库能执行的；
+# 程序运行时发出的SQL也先经过translate再执行，翻页的OFFSET…FETCH、WITH (NOEXPAND)之类的表提示等都在这里转换
+# 连接和游标外面各包一层，接口和pyodbc一样（手动提交事务、rowcount是影响行数），连接池、执行器不用区分是哪种数据库
+
+schema_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Insert table and data.sql")
+
+go_re = re.compile(r"(?im)^\s*go\s*$")
+comment_re = re.compile(r"--[^\n]*")
+insert_re = re.compile(r"(?is)\binsert\s+into\b.*?;")
+offset_re = re.compile(r"(?i)\bOFFSET\s+(\?|\d+)\s+ROWS\s+FETCH\s+NEXT\s+(\?|\d+)\s+ROWS\s+ONLY")
+top_re = re.compile(r"(?i)^\s*SELECT\s+TOP\s+(\d+)\s+(.*)$", re.S)
+hint_re = re.compile(r"(?i)\s+WITH\s*\(\s*(?:NOEXPAND|UPDLOCK|ROWLOCK|HOLDLOCK)(?:\s*,\s*(?:NOEXPAND|UPDLOCK|ROWLOCK|HOLDLOCK))*\s*\)")
+write_re = re.compile(r"(?i)^\s*(INSERT|UPDATE|DELETE)\b")
+datediff_re = re.compile(r"(?i)\bDATEDIFF\(\s*day\s*,")
+
+
+# sql文件里的建表语句转成SQLite/DuckDB能执行的脚本：去掉dbo.、nonclustered，视图去掉schemabinding，
+# 索引视图上的聚集索引这两个库都不支持，直接跳过（视图本身保留，统计查询照样能用）；
+# rowversion列（和rv列上的索引）只给SQL Server上的参照表快照、冲突检查和增量结算用，也跳过；
+# 变更通知的日志表和触发器是T-SQL写法，也跳过，SQLite上由change_feed.py自己建
+# DuckDB的bit是位串类型，性别列改成tinyint
+# data=False时不执行文件里的INSERT，只建空表，造测试数据时用
+def schema_script(path=schema_path, data=True, dialect="sqlite"):
+    with open(path, encoding="gbk") as f:
+        sql = comment_re.sub("", f.read())
+    out = []
+    for batch in go_re.split(sql):
+        if re.search(r"(?i)\bclustered\s+index\b", batch) and "nonclustered" not in batch.lower():
+            continue
+        if re.search(r"(?i)\browversion\b|\(rv\)|\bchange_log\b", batch):
+            continue
+        if not data:  # 先判断要不要跳过再去掉INSERT，触发器里的INSERT去掉后就认不出来了
+            batch = insert_re.sub("", batch)
+        batch = re.sub(r"(?i)\bdbo\.", "", batch)
+        batch = re.sub(r"(?i)\bnonclustered\s+", "", batch)
+        batch = re.sub(r"(?i)\s+with\s+schemabinding", "", batch)
+        batch = re.sub(r"(?i)\bcount_big\(", "count(", batch)
+        batch = re.sub(r"(?i)\bisnull\(", "ifnull(", batch)
+        if dialect == "duckdb":
+            batch = re.sub(r"(?i)\bbit\b", "tinyint", batch)
+        out.append(batch)
+    return "\n".join(out)
+
+
+# 运行时的T-SQL转成SQLite/DuckDB：分页、TOP、NOEXPAND/UPDLOCK等表提示（这两个库写事务本来就是整库加锁）；翻页参数顺序是(跳过行数, 取的行数)，LIMIT要反过来
+# DATEDIFF(day, a, b)改成DATEDIFF('day', a, b)：DuckDB本来就有这个函数，SQLite用下面注册的同名函数
+def translate(sql, params=()):
+    m = offset_re.search(sql)
+    if m:
+        skip, take = m.group(1), m.group(2)
+        params = list(params)
+        if skip == "?" and take == "?":
+            i = sql[:m.start()].count("?")
+            params[i], params[i + 1] = params[i + 1], params[i]
+        sql = sql[:m.start()] + f"LIMIT {take} OFFSET {skip}" + sql[m.end():]
+    m = top_re.match(sql)
+    if m:
+        sql = f"SELECT {m.group(2)} LIMIT {m.group(1)}"
+    sql = hint_re.sub("", sql)
+    sql = datediff_re.sub("DATEDIFF('day',", sql)
+    return sql, params
+
+
+class EmbeddedCursor:
+    def __init__(self, conn, cur, owns=True):
+        self.connection = conn
+        self.cur = cur
+        self.owns = owns  # 关闭游标时是否关闭cur，DuckDB的cur就是连接本身，不能关
+        self.count = None  # DuckDB的增删改把影响行数当成结果返回，取出来放这里
+
+    def execute(self, sql, *params):
+        ps = params[0] if len(params) == 1 and isinstance(params[0], (list, tuple)) else list(params)
+        sql, ps = translate(sql, ps)
+        self.connection.begin()
+        self.cur.execute(sql, ps)
+        self.count = None
+        if self.connection.dml_count and write_re.match(sql):
+            row = self.cur.fetchone()
+            self.count = row[0] if row else 0
+        return self
+
+    def executemany(self, sql, seq):
+        sql, _ = translate(sql)
+        self.connection.begin()
+        self.cur.executemany(sql, seq)
+        self.count = None
+
+    def fetchone(self):
+        return self.cur.fetchone()
+
+    def fetchmany(self, n=1):
+        return self.cur.fetchmany(n)
+
+    def fetchall(self):
+        return self.cur.fetchall()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    @property
+    def rowcount(self):
+        return self.count if self.count is not None else self.cur.rowcount
+
+    @property
+    def description(self):
+        return self.cur.description
+
+    def close(self):
+        if self.owns:
+            self.cur.close()
+
+
+# SQLite连接：Python的sqlite3本来就是写操作时自动开事务、commit提交
+class SqliteConn:
+    dml_count = False
+    serial_writes = True  # 同一时间只能有一个写事务，多个线程同时写只会互相等锁（见billing.settle）
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def cursor(self):
+        return EmbeddedCursor(self, self.conn.cursor())
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+
+# DuckDB连接：默认每条语句自动提交，这里第一条语句执行前开事务，commit/rollback时结束，和pyodbc一致
+# DuckDB的conn.cursor()其实是另开一个连接，事务不共享，所以游标直接用连接本身执行
+class DuckConn:
+    dml_count = True
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.in_tx = False
+
+    def cursor(self):
+        return EmbeddedCursor(self, self.conn, owns=False)
+
+    def begin(self):
+        if not self.in_tx:
+            self.conn.execute("BEGIN TRANSACTION")
+            self.in_tx = True
+
+    def commit(self):
+        if self.in_tx:
+            self.in_tx = False
+            self.conn.execute("COMMIT")
+
+    def rollback(self):
+        if self.in_tx:
+            self.in_tx = False
+            self.conn.execute("ROLLBACK")
+
+    def close(self):
+        self.conn.close()
+
+
+# SQLite没有DATEDIFF，注册一个按天计算的同名函数，日期在SQLite里存成yyyy-MM-dd文本
+def datediff(part, a, b):
+    if a is None or b is None:
+        return None
+    return (datetime.date.fromisoformat(str(b)[:10]) - datetime.date.fromisoformat(str(a)[:10])).days
+
+
+# 打开（不存在就新建）一个SQLite数据库文件，新建时按sql文件建表，read_only时文件必须已经存在
+# 连接池里的连接会被不同的工作线程轮流使用，所以关掉同线程检查；外键约束要手动打开
+def connect_sqlite(path, data=True, read_only=False):
+    if read_only:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False, timeout=30)
+        conn.create_function("DATEDIFF", 3, datediff, deterministic=True)
+        return SqliteConn(conn)
+    new = not os.path.exists(path)
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.create_function("DATEDIFF", 3, datediff, deterministic=True)
+    if new:
+        conn.executescript(schema_script(data=data))
+        conn.commit()
+    return SqliteConn(conn)
+
+
+# DuckDB同上，需要先pip install duckdb
+def connect_duckdb(path, data=True, read_only=False):
+    import duckdb
+    if read_only:
+        return DuckConn(duckdb.connect(path, read_only=True))
+    new = not os.path.exists(path)
+    conn = duckdb.connect(path)
+    if new:
+        # DuckDB一次执行一条语句，按分号拆开
+        for stmt in schema_script(data=data, dialect="duckdb").split(";"):
+            if stmt.strip():
+                conn.execute(stmt)
+    return DuckConn(conn)
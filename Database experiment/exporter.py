@@ -0,0 +1,103 @@
+import csv
+
+# 导出查询结果，边从游标取数据边写文件，不会把整个结果集读进内存
+# 每次fetchmany取chunk行写出去，内存里最多只有这一批数据，导出几十万行也不会占满内存
+# 支持CSV和Parquet，Parquet需要安装pyarrow，按批写成Arrow的RecordBatch
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# 导出被用户取消时抛出
+class ExportCancelled(Exception):
+    pass
+
+
+# 和表格显示一样处理：char(n)补的尾部空格去掉，性别列1/0转成男/女
+def fmt_rows(rows, sex_cols):
+    out = []
+    for r in rows:
+        r = [v.rstrip() if isinstance(v, str) else v for v in r]
+        for i in sex_cols:
+            if r[i] is not None:
+                r[i] = "男" if r[i] == 1 else "女"
+        out.append(tuple(r))
+    return out
+
+
+class CsvSink:
+    def __init__(self, path, heads):
+        self.f = open(path, "w", newline="", encoding="utf-8-sig")  # 带BOM，Excel打开中文不乱码
+        self.w = csv.writer(self.f)
+        self.w.writerow(heads)
+
+    def write(self, rows):
+        self.w.writerows(rows)
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetSink:
+    def __init__(self, path, heads):
+        if pa is None:
+            raise RuntimeError("导出Parquet需要先安装pyarrow：pip install pyarrow")
+        self.path = path
+        self.heads = heads
+        self.schema = None
+        self.writer = None
+
+    # 按列组装成RecordBatch写出，第一批数据决定每列的类型
+    def write(self, rows):
+        cols = list(zip(*rows)) if rows else [[] for _ in self.heads]
+        if self.schema is None:
+            arrays = []
+            for c in cols:
+                arr = pa.array(list(c))
+                if pa.types.is_null(arr.type):  # 第一批全是空值，类型推断不出来，按字符串处理
+                    arr = pa.array(list(c), type=pa.string())
+                arrays.append(arr)
+            self.schema = pa.schema([pa.field(h, a.type) for h, a in zip(self.heads, arrays)])
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        else:
+            arrays = [pa.array(list(c), type=f.type) for c, f in zip(cols, self.schema)]
+        self.writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        if self.writer is None:  # 一行数据都没有，也写一个只有表头的空文件
+            self.schema = pa.schema([pa.field(h, pa.string()) for h in self.heads])
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        self.writer.close()
+
+
+# 按文件后缀选择导出格式
+def open_sink(path, heads):
+    if path.lower().endswith(".parquet"):
+        return ParquetSink(path, heads)
+    return CsvSink(path, heads)
+
+
+# 执行sql并把结果流式写到path，返回导出的行数
+# progress(已导出行数)每写完一批调用一次；cancelled()返回True时中止，已写的文件保留
+def export_query(cur, sql, params, heads, path, chunk=5000, progress=None, cancelled=None):
+    sex_cols = [i for i, h in enumerate(heads) if "性别" in h]
+    cur.execute(sql, params)
+    sink = open_sink(path, heads)
+    n = 0
+    try:
+        while True:
+            if cancelled and cancelled():
+                raise ExportCancelled(f"导出已取消，已导出{n}行")
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            sink.write(fmt_rows(rows, sex_cols))
+            n += len(rows)
+            if progress:
+                progress(n)
+    finally:
+        sink.close()
+    return n
@@ -1,725 +1,1677 @@
-import sys
-import pyodbc
-from PyQt5.QtCore import QDate, Qt
-from PyQt5.QtGui import QPixmap, QPalette, QBrush
-from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QLabel, QLineEdit, QFormLayout,
-    QGroupBox, QMessageBox, QSpinBox, QDateEdit, QTableWidget,
-    QTableWidgetItem, QHeaderView, QComboBox, QDesktopWidget
-)
-#PyQt5 库自带的界面开发组件，包含许多封装好的类
-#QtWidgets 是做按钮、表格这些界面元素的，
-#QtCore 是控制日期、对齐这些属性的，
-#QtGui 是做字体、背景图这些美化的，直接调用这些组件能快速做界面，不用自己从零写。
-#还有设置按钮，标签，设置背景图片等其他功能封装。
-
-# 数据库连接
-#用pyodbc库连接SQL Server，配置了驱动、服务器、数据库名，用Windows身份验证
-#主窗口初始化时调用self.db = get_db()，如果连接失败会弹窗提示，且所有表操作按钮会禁用。
-def get_db():
-    try:
-        conn_str = (
-            r'DRIVER={ODBC Driver 17 for SQL Server};'
-            r'SERVER=.\MYSQL;'
-            r'DATABASE=hospital;'
-            r'Trusted_Connection=yes;'
-        )
-        conn = pyodbc.connect(conn_str)#发起连接
-        return conn
-    except Exception as e:
-        QMessageBox.critical(None, "数据库连接失败", f"错误：{str(e)}")
-        return None
-
-# 子窗口类展示单表功能显示+多表关联查询处理+增删改查
-class TableWin(QMainWindow):
-    # 窗口界面与控件设置
-    def __init__(self, table_name, db_conn):
-        super().__init__()#super调用父类，让子窗口拥有QMainWindow的所有基础功能
-        self.t_name = table_name  #把打开子窗口时传入的 表名存为实例变量
-        self.db = db_conn  #数据库连接
-        self.cur = self.db.cursor() if self.db else None  #游标,类似数据库通道
-        #多表关联配置
-        #在TableWin类的join_config字典里配置了关联SQL和表头，
-        #加载数据时load_all()判断表名是否在join_config里，是的话就执行关联查询。
-        #关联查询模板
-        self.join_config = {
-            "医生表": (# 查doctor表+department表，通过部门编号dpno关联
-                "SELECT d.dno, d.dname, d.duty, d.dsex, d.dage, d.dpno, de.dpname, de.dpadr FROM doctor d INNER JOIN department de ON d.dpno = de.dpno",
-                ["医生工号", "医生姓名", "职务", "性别", "年龄", "部门编号", "所属科室", "科室地址"]  # 新增“部门编号”列
-            ),
-            "患者表": (# 查patient表+doctor表+department表+room表，多表关联
-                "SELECT p.pno, p.pname, p.psex, p.page, p.dno, d.dname, d.dpno, de.dpname, p.rno, r.radr, p.illness FROM patient p INNER JOIN doctor d ON p.dno = d.dno INNER JOIN department de ON d.dpno = de.dpno LEFT JOIN room r ON p.rno = r.rno",
-                ["患者编号", "患者姓名", "性别", "年龄", "主治医师编号", "主治医师", "部门编号", "所属科室",
-                 "所属病房号", "房间地址", "疾病种类"]
-            )
-        }
-
-        #子窗口设置包括标题，大小，几何信息，获取电脑中心并将窗口居中
-        self.setWindowTitle(f"{self.t_name} - 操作界面")
-        self.resize(1600, 900)  # 宽度1600，避免列挤压
-        win_geo = self.frameGeometry()
-        scr_center = QDesktopWidget().availableGeometry().center()
-        win_geo.moveCenter(scr_center)
-        self.move(win_geo.topLeft())
-
-        #UI美化，结合AI设计
-        #QMainWindow, QWidget {background-color: #f5f7fa;}给子窗口的背景设为浅灰蓝色
-        #QGroupBox 分组框标题字体18号加粗深灰色，分组框上边距内部填充，浅灰色设圆角，框背景90%透明度白色
-        #QPushButton按钮默认是蓝色，边角圆8像素
-        #QPushButton:hover鼠标移到按钮上时背景色变深，按钮轻微放大
-        #QLabel {font-size: 16px; color: #34495e;}标签字体16号深灰色
-        #QLineEdit, QSpinBox, QDateEdit, QComboBox 输入框/数字框/日期框/下拉框
-        #QTableWidget {border-radius: 8px;}结果展示表格边角圆角
-        #QHeaderView::section 表格表头背景蓝色、文字白色加粗，内部填充
-        #QTableWidget::item{padding: 8px;}表格单元格内部填充
-        #QTableWidget::item:selected 表格选中的单元格/行，背景浅天蓝色文字深灰色
-        self.setStyleSheet("""
-            QMainWindow, QWidget {background-color: #f5f7fa;}
-            QGroupBox {
-                font-size: 18px; font-weight: bold; color: #2c3e50;
-                margin-top: 20px; padding: 20px; border: 2px solid #e1e8ed;
-                border-radius: 10px; background-color: rgba(255,255,255,0.9);
-            }
-            QPushButton {
-                font-size: 16px; padding: 12px 25px; margin: 0 10px;
-                background-color: #3498db; color: white; border: none; border-radius: 8px;
-            }
-            QPushButton:hover {background-color: #2980b9; transform: scale(1.03);}
-            QLabel {font-size: 16px; color: #34495e;}
-            QLineEdit, QSpinBox, QDateEdit, QComboBox {
-                font-size: 16px; padding: 10px; border: 1px solid #bdc3c7; border-radius: 6px;
-                background-color: white;
-            }
-            QTableWidget {
-                font-size: 16px; border: 1px solid #e1e8ed; border-radius: 8px;
-                background-color: rgba(255,255,255,0.9);
-            }
-            QHeaderView::section {
-                background-color: #3498db; color: white; font-weight: bold;
-                padding: 12px; border-radius: 4px;
-            }
-            QTableWidget::item {padding: 8px;}
-            QTableWidget::item:selected {background-color: #e3f2fd; color: #2c3e50;}
-        """)
-
-        #中心部件是子窗口的 内容容器，所有按钮、表格、输入框都要装到这个容器里，再把容器放到窗口正中间
-        #相当于word里设置页边距，行距等
-        cen_wid = QWidget()
-        self.setCentralWidget(cen_wid)
-        main_layout = QVBoxLayout(cen_wid)
-        main_layout.setSpacing(25)
-        main_layout.setContentsMargins(40, 40, 40, 40)
-
-        #按钮区，添加按钮并命名
-        btn_layout = QHBoxLayout()# 水平布局
-        self.add_btn = QPushButton("新增")
-        self.query_btn = QPushButton("查询")
-        self.upd_btn = QPushButton("修改")
-        self.del_btn = QPushButton("删除")
-        btn_layout.addWidget(self.add_btn)
-        btn_layout.addWidget(self.query_btn)
-        btn_layout.addWidget(self.upd_btn)
-        btn_layout.addWidget(self.del_btn)
-        main_layout.addLayout(btn_layout)
-
-        #查询条件区，添加查询框，设置输入的查询框并内置提示
-        query_layout = QHBoxLayout()
-        self.fld_label = QLabel("查询字段：")
-        self.fld_combo = QComboBox()  # 字段映射下拉框
-        self.val_label = QLabel("查询值：")
-        self.val_txt = QLineEdit()  # 查询值输入框
-        self.val_txt.setPlaceholderText("输入内容，留空查全表")
-        query_layout.addWidget(self.fld_label)
-        query_layout.addWidget(self.fld_combo)
-        query_layout.addWidget(self.val_label)
-        query_layout.addWidget(self.val_txt)
-        main_layout.addLayout(query_layout)
-
-        #表单输入区，创建输入控件的容器并基本布局
-        self.form_group = QGroupBox("数据输入")
-        form_wid = QWidget()
-        self.form_layout = QFormLayout(form_wid)
-        self.form_layout.setSpacing(15)
-        self.form_layout.setContentsMargins(25, 25, 25, 25)
-        self.wid_dict = {}  # 输入控件字典存输入控件，比如把“患者编号”输入框存起来，后续取值用
-        self.fld_map = {}  # 字段映射存“中文字段名→数据库字段名”的映射
-        self.create_wids()
-        #把当前表的字段名填充到查询下拉框里
-        if self.fld_map:
-            self.fld_combo.addItems(list(self.fld_map.keys()))
-        self.form_group.setLayout(QVBoxLayout())
-        self.form_group.layout().addWidget(form_wid)
-        #把整个数据输入分组框加到主布局里
-        main_layout.addWidget(self.form_group)
-
-        # 结果表格，规定结果输出位置
-        self.res_table = QTableWidget()
-        self.res_table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.res_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        main_layout.addWidget(self.res_table)
-
-        # 绑定事件，把按钮点击和功能接口联系起来
-        self.add_btn.clicked.connect(self.add_data)
-        self.query_btn.clicked.connect(self.query_data)
-        self.upd_btn.clicked.connect(self.upd_data)
-        self.del_btn.clicked.connect(self.del_data)
-
-        # 打开时加载全表
-        self.load_all()
-
-    #获取字段映射
-    #提前定义的字段映射，数据库里的英文字段转成能看懂的中文字段显示，
-    #输入的中文内容，也能通过这个映射对应到数据库的英文字段里
-    def get_fld_map(self):
-        fld_map = {
-            "科室表": {"部门名称": "dpname", "部门编号": "dpno", "部门地址": "dpadr", "部门电话": "dptel"},
-            "医生表": {"医生工号": "dno", "医生姓名": "dname", "职务": "duty", "性别": "dsex", "年龄": "dage",
-                       "部门编号": "dpno"},
-            "患者表": {"患者编号": "pno", "患者姓名": "pname", "性别": "psex", "年龄": "page", "主治医师编号": "dno",
-                       "所属病房号": "rno", "疾病种类": "illness", "入院日期": "startdate",
-                       "预计出院日期": "predictenddate"},
-            "药品表": {"药品编号": "dgno", "药品名称": "dgname", "生产厂家": "dgpro", "库存量": "dgnum",
-                       "价格": "dgprice"},
-            "病房表": {"病房编号": "rno", "病房地址": "radr", "所属部门编号": "dpno"},
-            "患者用药表": {"药品编号": "dgno", "患者编号": "pno", "用药数量": "num"}
-        }
-        if self.t_name not in fld_map:#映射没对应
-            QMessageBox.warning(self, "提示", f"未配置{self.t_name}字段！")
-            return None
-        return fld_map[self.t_name]
-
-    #打开不同表的子窗口时，自动创建对应表的输入控件
-    def create_wids(self):
-        #如果重复打开同一个表，先删掉之前的输入控件，避免界面上出现重复的输入框
-        for w in self.wid_dict.values():
-            w.deleteLater()# 删除之前创建的输入控件
-        self.wid_dict.clear()# 清空控件字典
-        self.fld_map = self.get_fld_map()#添加新表映射
-        if not self.fld_map:
-            return
-
-        col_wid = QWidget()#设置左右列的布局
-        col_layout = QHBoxLayout(col_wid)
-        left_layout = QFormLayout()
-        right_layout = QFormLayout()
-        cn_names = list(self.fld_map.keys())#取当前表的所有中文字段
-
-        for i, cn in enumerate(cn_names):#遍历所有中文字段
-            db_fld = self.fld_map[cn]#取对应的数据库字段，按字段名称判断，创建不同类型的输入控件
-            if "性别" in cn:#性别创建特殊的下拉框选择男女
-                w = QComboBox()
-                w.addItems(["男", "女"])
-            elif "日期" in cn: #日期字段用日期选择框，固定年月日格式字段
-                w = QDateEdit(QDate.currentDate())
-                w.setDisplayFormat("yyyy-MM-dd")
-            elif "年龄" in cn or "数量" in cn or "价格" in cn: #数字字段用数字框
-                w = QSpinBox()
-                w.setRange(0, 999)
-            else:
-                w = QLineEdit()
-            self.wid_dict[db_fld] = w #把创建好的控件存到字典里后续取值用
-            #分左右列，偶数左列，奇数右列
-            if i % 2 == 0:
-                left_layout.addRow(QLabel(f"{cn}："), w)
-            else:
-                right_layout.addRow(QLabel(f"{cn}："), w)
-
-        col_layout.addLayout(left_layout)
-        col_layout.addLayout(right_layout)
-        self.form_layout.addRow(col_wid) #把整个左右列布局加到输入区的表单布局里
-
-    #加载全表数据，打开表的子窗口时，自动从数据库查数据并显示到表格里
-    def load_all(self):
-        if not self.cur or not self.fld_map:#前置校验，检查表名与映射
-            return
-        real_tname = self.get_real_tname()
-        #判断当前表是否配置了多表关联
-        if self.t_name in self.join_config:
-            #使用多表关联SQL和表头
-            join_sql, cn_names = self.join_config[self.t_name]
-            sql = join_sql
-        else:
-            #未配置关联，使用原单表逻辑
-            db_flds = list(self.fld_map.values())
-            cn_names = list(self.fld_map.keys())
-            sql = f"SELECT * FROM {real_tname}"
-
-        try:
-            self.cur.execute(sql) #执行SQL语句
-            res = self.cur.fetchall()
-            #清空表格旧数据，设置列数和表头
-            self.res_table.setRowCount(0)
-            self.res_table.setColumnCount(len(cn_names))
-            self.res_table.setHorizontalHeaderLabels(cn_names)
-
-            #逐行逐列填充数据到表格
-            for row_idx, row in enumerate(res):
-                self.res_table.insertRow(row_idx)
-                for col_idx, val in enumerate(row):
-                    #特殊处理性别：数据库存1/0，显示成男/女
-                    if col_idx < len(cn_names) and "性别" in cn_names[col_idx]:
-                        show_val = "男" if val == 1 else "女"
-                    else:
-                        show_val = str(val) if val is not None else ""
-                    #把值放到表格单元格里
-                    self.res_table.setItem(row_idx, col_idx, QTableWidgetItem(show_val))
-        except Exception as e:#异常处理
-            QMessageBox.warning(self, "加载失败", f"错误：{str(e)}")
-
-
-
-    # 此前部分均属于页面设置和界面初始化，从这里开始进入增删改查
-
-    #新增数据，重要功能
-    def add_data(self):
-        if not self.cur or not self.fld_map:# 基础校验，确认连接
-            QMessageBox.warning(self, "提示", "数据库未连接！")
-            return
-        #患者表处理
-        if self.t_name == "患者表":
-            doc_no = self.wid_dict["dno"].text().strip()
-            if doc_no:  # 仅当填写了主治医师编号时校验是否存在
-                self.cur.execute("SELECT COUNT(*) FROM doctor WHERE dno = ?", (doc_no,))
-                count = self.cur.fetchone()[0]
-                if count == 0:
-                    QMessageBox.warning(self, "提示",
-                                        f"主治医师编号【{doc_no}】不存在！请先在医生表新增该医生，再添加患者。")
-                    return
-
-        #患者用药表处理
-        if self.t_name == "患者用药表":
-            dgno = self.wid_dict["dgno"].text().strip()
-            pno = self.wid_dict["pno"].text().strip()
-            if not dgno or not pno: # 联合主键检验，主体完整性约束
-                QMessageBox.warning(self, "提示", "药品编号和患者编号不能为空！")
-                return
-            #查询该组合是否已存在
-            self.cur.execute("SELECT COUNT(*) FROM PD WHERE dgno = ? AND pno = ?", (dgno, pno))
-            count = self.cur.fetchone()[0]
-            if count > 0:
-                QMessageBox.warning(self, "提示",
-                                    f"该患者（{pno}）已使用过该药品（{dgno}），无法重复新增！请修改已有记录的用药数量。")
-                return
-
-        vals = []  # 存最终要插入数据库的值
-        db_flds = list(self.fld_map.values())
-        for f in db_flds:
-            w = self.wid_dict[f]  # 取对应的输入控件，对性别，日期，数字特殊处理
-            if isinstance(w, QComboBox) and "性别" in [k for k, v in self.fld_map.items() if v == f][0]:
-                val = 1 if w.currentText() == "男" else 0
-            elif isinstance(w, QDateEdit):
-                val = w.date().toString("yyyy-MM-dd")
-            elif isinstance(w, QSpinBox):
-                val = w.value()
-            else:
-                val = w.text().strip()
-                #非主键字段允许为空
-                cn = [k for k, v in self.fld_map.items() if v == f][0]
-                #仅主键字段强制非空
-                if not val and (self.t_name != "患者用药表" and f == db_flds[0]):
-                    QMessageBox.warning(self, "提示", f"主键字段【{cn}】不能为空！")
-                    return
-            vals.append(val)
-
-        real_tname = self.get_real_tname()  # 转sql中文表名转英文表名
-        ph = ", ".join(["?"] * len(db_flds))  # 生成占位符，把输入值和SQL语句分离
-        # 执行sql insert命令插入新元组
-        sql = f"INSERT INTO {real_tname} ({', '.join(db_flds)}) VALUES ({ph})"
-        try:
-            self.cur.execute(sql, vals)
-            self.db.commit()  # 提交事务
-            QMessageBox.information(self, "成功", "新增数据成功！")
-            self.clear_inputs()
-            self.load_all()  # 重新调用界面刷新表格，显示新增后的数据
-        except Exception as e:
-            self.db.rollback()  # 触发回滚则失败
-            QMessageBox.warning(self, "失败", f"错误：{str(e)}")
-
-    # 查询数据，重要功能
-    def query_data(self):
-        if not self.cur or not self.fld_map:  # 连接校验
-            QMessageBox.warning(self, "提示", "数据库未连接！")
-            return
-        # 获取选择的字段
-        sel_cn = self.fld_combo.currentText()
-        if not sel_cn:
-            QMessageBox.warning(self, "提示", "请选择查询字段！")
-            return
-        # 转数据库英文字段
-        target_fld = None
-        for cn, db_f in self.fld_map.items():
-            if cn == sel_cn:
-                target_fld = db_f
-                break
-        if not target_fld:
-            QMessageBox.warning(self, "提示", f"字段【{sel_cn}】不存在！")
-            return
-        # 取用户输入的查询值
-        q_val = self.val_txt.text().strip()
-        if not q_val:  # 先判断留空，直接查全表
-            self.load_all()
-            return
-
-        # 性别字段格式转换
-        if sel_cn == "性别":
-            if q_val == "男":
-                q_val = "1"
-            elif q_val == "女":
-                q_val = "0"
-            else:
-                QMessageBox.information(self, "提示", "性别查询请输入“男”或“女”！")
-                return
-
-        # 中文表名转英文
-        real_tname = self.get_real_tname()
-        # 判断是否为关联表，拼接对应查询SQL，多表关联时，字段要加表别名
-        if self.t_name in self.join_config:
-            join_sql, cn_names = self.join_config[self.t_name]
-            if self.t_name == "医生表":
-                sql = f"{join_sql} WHERE d.{target_fld} LIKE ?"
-            elif self.t_name == "患者表":
-                sql = f"{join_sql} WHERE p.{target_fld} LIKE ?"
-            else:
-                sql = f"{join_sql} WHERE {target_fld} LIKE ?"
-        else:  # 单表查询直接拼接
-            cn_names = list(self.fld_map.keys())
-            sql = f"SELECT * FROM {real_tname} WHERE {target_fld} LIKE ?"
-
-        q_param = f"%{q_val}%"  # %模糊查询的通配符
-        try:
-            self.cur.execute(sql, (q_param,))
-            res = self.cur.fetchall()  # 获取查询结果
-            # 逻辑与load_all()相同，只是展示的是部分结果
-            self.res_table.setRowCount(0)
-            self.res_table.setColumnCount(len(cn_names))
-            self.res_table.setHorizontalHeaderLabels(cn_names)
-            for row_idx, row in enumerate(res):
-                self.res_table.insertRow(row_idx)
-                for col_idx, val in enumerate(row):
-                    # 性别转中文
-                    if col_idx < len(cn_names) and "性别" in cn_names[col_idx]:
-                        show_val = "男" if val == 1 else "女"
-                    else:
-                        show_val = str(val) if val is not None else ""
-                    self.res_table.setItem(row_idx, col_idx, QTableWidgetItem(show_val))
-            if not res:
-                QMessageBox.information(self, "提示", f"未找到【{sel_cn}包含{q_val}】的数据！")
-        except Exception as e:
-            QMessageBox.warning(self, "查询失败", f"错误：{str(e)}")
-
-    # 修改数据，重要功能
-    def upd_data(self):
-        if not self.cur or not self.fld_map:  # 连接校验
-            QMessageBox.warning(self, "提示", "数据库未连接！")
-            return
-        # 获取用户选择的查询字段
-        db_flds = list(self.fld_map.values())
-        cn_names = list(self.fld_map.keys())
-
-        # 区分联合主键（PD表）和单主键
-        if self.t_name == "患者用药表":  # 如果是这个表就是联合主键，否则为单主键
-            # PD表：联合主键（dgno + pno）
-            main_flds = ["dgno", "pno"]
-            non_main_flds = [f for f in db_flds if f not in main_flds]
-
-            # 1. 获取并校验联合主键值
-            main_vals = {}
-            for fld in main_flds:
-                wid = self.wid_dict.get(fld)  # 取输入的主键值控件
-                if not wid:
-                    QMessageBox.warning(self, "提示", f"未找到字段【{fld}】的输入控件！")
-                    return
-                val = wid.text().strip() if isinstance(wid, QLineEdit) else str(wid.value())  # 取输入的主键值
-                if not val:
-                    QMessageBox.warning(self, "提示", f"请输入【{[k for k, v in self.fld_map.items() if v == fld][0]}】！")
-                    return
-                main_vals[fld] = val  # 把取到的主键值存到字典里
-
-            # 2. 校验联合主键对应的记录是否存在
-            self.cur.execute("SELECT COUNT(*) FROM PD WHERE dgno = ? AND pno = ?",
-                             (main_vals["dgno"], main_vals["pno"]))
-            if self.cur.fetchone()[0] == 0:
-                QMessageBox.warning(self, "提示", "该药品+患者的组合不存在，无法修改！")
-                return
-        else:
-            # 其他表：单主键逻辑
-            main_fld = db_flds[0]
-            main_cn = cn_names[0]
-            main_wid = self.wid_dict[main_fld]
-
-            # 1. 获取并校验单主键值
-            if isinstance(main_wid, QDateEdit):
-                main_val = main_wid.date().toString("yyyy-MM-dd")
-            elif isinstance(main_wid, QSpinBox):
-                main_val = main_wid.value()
-            elif isinstance(main_wid, QComboBox):
-                main_val = 1 if main_wid.currentText() == "男" else 0
-            else:
-                main_val = main_wid.text().strip()
-                if not main_val:
-                    QMessageBox.warning(self, "提示", f"请输入主键【{main_cn}】！")
-                    return
-
-            # 2. 校验单主键对应的记录是否存在
-            self.cur.execute(f"SELECT COUNT(*) FROM {self.get_real_tname()} WHERE {main_fld} = ?", (main_val,))
-            if self.cur.fetchone()[0] == 0:
-                QMessageBox.warning(self, "提示", "主键对应的记录不存在，无法修改！")
-                return
-
-            non_main_flds = db_flds[1:]  # 筛选非主键字段：除了第一个字段的所有字段
-
-        # 3. 收集非主键字段的修改值
-        upd_list = []  # 存要修改的字段
-        upd_vals = []  # 存要修改的字段值
-        for f in non_main_flds:
-            cn = [k for k, v in self.fld_map.items() if v == f][0]
-            w = self.wid_dict[f]  # 对应的输入控件
-
-            if isinstance(w, QComboBox) and "性别" in cn:
-                val = 1 if w.currentText() == "男" else 0
-            elif isinstance(w, QDateEdit):
-                val = w.date().toString("yyyy-MM-dd")
-            elif isinstance(w, QSpinBox):
-                val = w.value()
-            else:
-                val = w.text().strip()
-                if not val:
-                    continue  # 空值不修改
-
-            upd_list.append(f"{f} = ?")  # 拼接“字段=?”，用户填了哪些字段，就只改哪些字段
-            upd_vals.append(val)  # 收集对应的值
-
-        if not upd_list:
-            QMessageBox.warning(self, "提示", "请输入要修改的字段！")
-            return
-
-        # 4. 构建并执行修改SQL
-        real_tname = self.get_real_tname()
-        if self.t_name == "患者用药表":
-            # 联合主键的UPDATE语句
-            sql = f"UPDATE {real_tname} SET {', '.join(upd_list)} WHERE dgno = ? AND pno = ?"
-            upd_vals.append(main_vals["dgno"])  # 追加联合主键值
-            upd_vals.append(main_vals["pno"])
-        else:
-            # 单主键的UPDATE语句
-            sql = f"UPDATE {real_tname} SET {', '.join(upd_list)} WHERE {main_fld} = ?"
-            upd_vals.append(main_val)  # 追加单主键值
-
-        try:
-            self.cur.execute(sql, upd_vals)
-            self.db.commit()  # 提交修改
-            QMessageBox.information(self, "成功", f"修改成功！影响行数：{self.cur.rowcount}")
-            self.clear_inputs()
-            self.load_all()  # 刷新表格
-        except Exception as e:
-            self.db.rollback()  # 失败回滚
-            QMessageBox.warning(self, "失败", f"错误：{str(e)}")
-
-    # 删除数据，重要功能
-    def del_data(self):
-        if not self.cur or not self.fld_map:   # 连接校验
-            QMessageBox.warning(self, "提示", "数据库未连接！")
-            return
-        db_flds = list(self.fld_map.values())  # 数据库字段列表
-        cn_names = list(self.fld_map.keys())  # 中文字段列表
-
-        # 科室表删除前校验关联数据
-        if self.t_name == "科室表":
-            dept_no = self.wid_dict["dpno"].text().strip()  # 取部门编号
-            if not dept_no:
-                QMessageBox.warning(self, "提示", "请输入部门编号！")
-                return
-            # 查询关联的医生和病房
-            self.cur.execute("SELECT COUNT(*) FROM doctor WHERE dpno = ?", (dept_no,))
-            doc_count = self.cur.fetchone()[0]
-            self.cur.execute("SELECT COUNT(*) FROM room WHERE dpno = ?", (dept_no,))
-            room_count = self.cur.fetchone()[0]
-            if doc_count > 0 or room_count > 0:  # 有关联数据就禁止删除
-                QMessageBox.warning(self, "提示", f"该科室关联了{doc_count}名医生、{room_count}个病房，无法删除！")
-                return
-
-        # 区分联合主键（PD表）和单主键（其他表）
-        if self.t_name == "患者用药表":
-            # PD表：联合主键（dgno+pno）
-            dgno = self.wid_dict["dgno"].text().strip()
-            pno = self.wid_dict["pno"].text().strip()
-            if not dgno or not pno:  # 主键完整性校验
-                QMessageBox.warning(self, "提示", "药品编号和患者编号不能为空！")
-                return
-            # 确认删除提示
-            reply = QMessageBox.question(self, "确认", f"确定删除【药品编号={dgno}，患者编号={pno}】的记录？",
-                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
-            if reply != QMessageBox.Yes:
-                return
-            # 准备删除delete，放入到删除的变量中
-            sql = "DELETE FROM PD WHERE dgno = ? AND pno = ?"
-            params = (dgno, pno)
-        else:
-            # 其他表：单主键逻辑
-            main_fld = db_flds[0]  # 取主键字段，即第一个字段
-            main_cn = cn_names[0]  # 主键中文字段
-            main_wid = self.wid_dict[main_fld]
-
-            # 按控件类型取值，与修改和新增的逻辑一致
-            if isinstance(main_wid, QDateEdit):
-                main_val = main_wid.date().toString("yyyy-MM-dd")
-            elif isinstance(main_wid, QSpinBox):
-                main_val = main_wid.value()
-            elif isinstance(main_wid, QComboBox):
-                main_val = 1 if main_wid.currentText() == "男" else 0
-            else:
-                main_val = main_wid.text().strip()
-                if not main_val:
-                    QMessageBox.warning(self, "提示", f"请输入主键【{main_cn}】！")
-                    return
-
-            # 确认删除
-            reply = QMessageBox.question(self, "确认", f"确定删除【{main_cn}={main_val}】的数据？",
-                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
-            if reply != QMessageBox.Yes:
-                return
-            # 准备删除delete，放入到删除的变量中
-            real_tname = self.get_real_tname()
-            sql = f"DELETE FROM {real_tname} WHERE {main_fld} = ?"
-            params = (main_val,)
-
-        try:
-            self.cur.execute(sql, params)  # 执行删除SQL
-            self.db.commit()  # 提交删除
-            QMessageBox.information(self, "成功", f"删除成功！影响行数：{self.cur.rowcount}")
-            self.clear_inputs()
-            self.load_all()  # 刷新表格
-        except Exception as e:
-            self.db.rollback()  # 事务回滚
-            QMessageBox.warning(self, "失败", f"错误：{str(e)}")
-
-    # 增删改查完成，下面是增删改查用到的通用功能函数
-
-    # 获取真实表名
-    def get_real_tname(self):
-        #  定义中文英文的映射字典
-        name_map = {
-            "科室表": "department",
-            "医生表": "doctor",
-            "患者表": "patient",
-            "药品表": "drug",
-            "病房表": "room",
-            "患者用药表": "PD"
-        }
-        #  按当前表名取对应的英文表名，取不到就返回原表名
-        return name_map.get(self.t_name, self.t_name)
-
-    # 清空输入框函数
-    def clear_inputs(self):
-        for f, w in self.wid_dict.items():  # 遍历所有输入控件
-            if isinstance(w, QLineEdit):  # 按控件类型清空或恢复默认值
-                w.clear()
-            elif isinstance(w, QDateEdit):
-                w.setDate(QDate.currentDate())
-            elif isinstance(w, QSpinBox):
-                w.setValue(0)
-            elif isinstance(w, QComboBox):
-                w.setCurrentIndex(0)
-        self.val_txt.clear()  # 清空查询值输入框
-
-# 主窗口搭建，主窗口和子窗口逻辑上是一样的
-class MainWin(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        # 窗口大小+居中
-        self.setWindowTitle("医院住院信息管理系统")  # 主菜单标题
-        self.resize(1000, 800)  # 大小
-        win_geo = self.frameGeometry()  # 定位屏幕中心
-        scr_center = QDesktopWidget().availableGeometry().center()
-        win_geo.moveCenter(scr_center)  # 定位视窗中心
-        self.move(win_geo.topLeft())    # 让两中心重合，即放到屏幕中间
-
-        # 设置背景图
-        self.set_bg("hospital_bg.jpg")
-
-        # 中心透明部件，设置透明背景与内间距
-        cen_wid = QWidget()
-        cen_wid.setStyleSheet("background-color: transparent;")
-        self.setCentralWidget(cen_wid)
-        main_layout = QVBoxLayout(cen_wid)
-        main_layout.setSpacing(50)
-        main_layout.setContentsMargins(60, 60, 60, 60)
-
-        # 标题
-        title = QLabel("医院住院信息管理系统")
-        title.setObjectName("title")   # 给标签命名，方便精准设置样式
-        title.setStyleSheet("QLabel#title {font-size: 36px; font-weight: bold; color: #333; padding-bottom: 20px;}")
-        main_layout.addWidget(title, alignment=Qt.AlignCenter)  # 居中
-
-        # 表按钮区，左右两列
-        btn_layout = QHBoxLayout()
-        left_btn = QVBoxLayout()
-        right_btn = QVBoxLayout()
-        left_btn.setSpacing(25)
-        right_btn.setSpacing(25)
-        t_list = ["科室表", "医生表", "患者表", "药品表", "病房表", "患者用药表"]
-        for i, t in enumerate(t_list):
-            btn = QPushButton(t)
-            # 按钮样式美化：绿色背景、圆角、hover放大，参考AI
-            btn.setStyleSheet("""
-                QPushButton {
-                    font-size: 18px; padding: 20px 30px; min-width: 200px; min-height: 70px;
-                    background-color: #2ecc71; color: white; border: none; border-radius: 10px;
-                }
-                QPushButton:hover {background-color: #27ae60; transform: scale(1.05);}
-            """)
-            # 绑定点击事件
-            btn.clicked.connect(lambda checked, tn=t: self.open_table(tn))
-            if i < 3:  # 前3个放左边
-                left_btn.addWidget(btn, alignment=Qt.AlignCenter)
-            else:  # 后3个放右边
-                right_btn.addWidget(btn, alignment=Qt.AlignCenter)
-        btn_layout.addLayout(left_btn)
-        btn_layout.addLayout(right_btn)
-        main_layout.addLayout(btn_layout)
-
-        # 数据库连接
-        self.db = get_db()
-        if not self.db:
-            QMessageBox.critical(self, "错误", "数据库连接失败，无法操作！")
-            for btn in cen_wid.findChildren(QPushButton):
-                btn.setEnabled(False)
-
-    # 设置背景图
-    def set_bg(self, img_path):
-        try:
-            #  加载背景图片文件
-            pix = QPixmap(img_path)
-            #  缩放图片适配窗口大小，保持宽高比，放大到覆盖窗口，平滑缩放
-            pix = pix.scaled(self.size(), Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
-            pal = QPalette()
-            pal.setBrush(QPalette.Background, QBrush(pix))  # 创建调色板，把图片设为窗口背景
-            self.setPalette(pal)  # 应用调色板到主窗口
-        except Exception as e:  # 加载失败兜底用浅灰色背景，避免窗口背景空白
-            self.setStyleSheet("background-color: #f0f2f5;")
-            QMessageBox.warning(self, "提示", f"背景图加载失败：{str(e)}")
-
-    # 打开子窗口，主窗口点击按钮时，调用这个函数打开对应的TableWin子窗口
-    def open_table(self, t_name):
-        if not self.db:
-            QMessageBox.warning(self, "提示", "数据库未连接！")
-            return
-        try:  # 创建子窗口实例并显示子窗口
-            self.table_win = TableWin(t_name, self.db)
-            self.table_win.show()
-        except Exception as e:  # 失败保底
-            QMessageBox.warning(self, "错误", f"打开失败：{str(e)}")
-
-    # 关闭时断开连接
-    def closeEvent(self, event):
-        if self.db:  # 若正常打开则正常关闭
-            self.db.close()
-        event.accept()
-
-
-if __name__ == "__main__":
-    app = QApplication(sys.argv)  # 初始化Qt应用程序
-    win = MainWin()  # 创建主窗口实例
-    win.show()  # 显示主窗口
+import sys
+import time
+launch_t = time.perf_counter()  # 程序启动的时间，记录启动到主窗口第一次画出来的耗时
+from PyQt5.QtCore import QDate, Qt, QTimer
+from PyQt5.QtGui import QPixmap, QPalette, QBrush, QImageReader
+from PyQt5.QtWidgets import (
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+    QPushButton, QLabel, QLineEdit, QFormLayout,
+    QGroupBox, QMessageBox, QSpinBox, QDateEdit, QTableView,
+    QHeaderView, QComboBox, QDesktopWidget, QProgressBar, QDialog, QDialogButtonBox,
+    QFileDialog, QProgressDialog
+)
+from result_model import ResultModel, RowBuffer, norm
+from pager import Pager
+from query_exec import QueryExecutor, QueryMsg, JobProgress
+from db_pool import ConnPool
+from backend import load_backend
+from query_cache import QueryCache, tables_of
+from query_builder import Cond, CondError, build_where, modes
+from bulk_import import BulkImporter
+from exporter import export_query, ExportCancelled
+from stats_win import StatsWin
+from validator import Validator
+from table_registry import tables, table_names, by_tname
+from stmt import execute
+from snapshot import Snapshot
+from perf_log import Recorder, job_name
+from diag_win import DiagWin
+from key_picker import KeyPicker, PrefixIndex
+from unit_of_work import UnitOfWork, NewRow, with_version, versioned_tables
+import billing
+from dispense import dispense, take, set_num, drop, DispenseError
+from change_feed import ChangeFeed
+from ngram_index import TextSearch
+#PyQt5 库自带的界面开发组件，包含许多封装好的类
+#QtWidgets 是做按钮、表格这些界面元素的，
+#QtCore 是控制日期、对齐这些属性的，
+#QtGui 是做字体、背景图这些美化的，直接调用这些组件能快速做界面，不用自己从零写。
+#还有设置按钮，标签，设置背景图片等其他功能封装。
+
+# 数据库连接
+#用哪种数据库在db.ini里配置（见backend.py），连接池在db_pool.py里，程序启动时只读配置、建好连接池，
+#第一个连接由主窗口在后台建立，连接时菜单照样显示（见MainWin.connect_job）；
+#子窗口和后台线程需要连接时从池里借，用完归还；如果连接失败会弹窗提示，且所有表操作按钮会禁用。
+def get_pool():
+    try:
+        backend = load_backend()
+        return backend, ConnPool(backend.connect, min_size=1, max_size=8)
+    except Exception as e:
+        QMessageBox.critical(None, "数据库连接失败", f"错误：{str(e)}")
+        return None, None
+
+# 子窗口类展示单表功能显示+多表关联查询处理+增删改查
+class TableWin(QMainWindow):
+    # 窗口界面与控件设置
+    # load=False时先不查数据（主窗口提前建好备用的窗口），第一次调用reuse()时再加载
+    # versioned：表上有rv（rowversion）列，表格里改完保存时按版本号检查冲突
+    # search：本地全文索引（见ngram_index.py），姓名、疾病种类、药品名称的“包含”查询在本机回答
+    def __init__(self, table_name, executor, cache=None, validator=None, read_only=False, snapshot=None,
+                 load=True, versioned=False, search=None):
+        super().__init__()#super调用父类，让子窗口拥有QMainWindow的所有基础功能
+        self.t_name = table_name  #把打开子窗口时传入的 表名存为实例变量
+        #后台查询执行器，所有SQL都交给它在工作线程里执行，每个工作线程有自己的数据库连接
+        self.exe = executor
+        self.cache = cache  #查询结果缓存，所有子窗口共用，增删改后按表作废
+        #增删改前的外键/唯一约束校验，约束信息所有子窗口共用，只读一次
+        self.validator = validator or Validator(table_names)
+        self.busy_count = 0  #本窗口还没执行完的后台任务数
+        #表结构信息：字段描述、正反向映射、关联查询SQL、增删改SQL，都在table_registry里提前生成好
+        self.info = tables.get(table_name)
+        self.read_only = read_only  #只读模式（离线终端），不能增删改和导入
+        #参照表本地快照，准备好了的话医生表/患者表只查本表，科室名、医生姓名等在本地补上
+        self.snapshot = snapshot
+        self.client_join = False
+        self.search = search
+        self.versioned = versioned
+        #表格里显示的列来自哪些表，这些表有别的终端改动时要更新（见apply_changes）
+        self.dep_tables = tables_of(self.info.select_sql) if self.info else set()
+        #表格里直接修改的待保存列表，只读模式下表格不能改
+        self.uow = UnitOfWork(self.info, versioned) if self.info and not read_only else None
+
+        #子窗口设置包括标题，大小，几何信息，获取电脑中心并将窗口居中
+        self.setWindowTitle(f"{self.t_name} - {'只读查看' if read_only else '操作界面'}")
+        self.resize(1600, 900)  # 宽度1600，避免列挤压
+        win_geo = self.frameGeometry()
+        scr_center = QDesktopWidget().availableGeometry().center()
+        win_geo.moveCenter(scr_center)
+        self.move(win_geo.topLeft())
+
+        #UI美化，结合AI设计
+        #QMainWindow, QWidget {background-color: #f5f7fa;}给子窗口的背景设为浅灰蓝色
+        #QGroupBox 分组框标题字体18号加粗深灰色，分组框上边距内部填充，浅灰色设圆角，框背景90%透明度白色
+        #QPushButton按钮默认是蓝色，边角圆8像素
+        #QPushButton:hover鼠标移到按钮上时背景色变深，按钮轻微放大
+        #QLabel {font-size: 16px; color: #34495e;}标签字体16号深灰色
+        #QLineEdit, QSpinBox, QDateEdit, QComboBox 输入框/数字框/日期框/下拉框
+        #QTableView {border-radius: 8px;}结果展示表格边角圆角
+        #QHeaderView::section 表格表头背景蓝色、文字白色加粗，内部填充
+        #QTableView::item{padding: 8px;}表格单元格内部填充
+        #QTableView::item:selected 表格选中的单元格/行，背景浅天蓝色文字深灰色
+        self.setStyleSheet("""
+            QMainWindow, QWidget {background-color: #f5f7fa;}
+            QGroupBox {
+                font-size: 18px; font-weight: bold; color: #2c3e50;
+                margin-top: 20px; padding: 20px; border: 2px solid #e1e8ed;
+                border-radius: 10px; background-color: rgba(255,255,255,0.9);
+            }
+            QPushButton {
+                font-size: 16px; padding: 12px 25px; margin: 0 10px;
+                background-color: #3498db; color: white; border: none; border-radius: 8px;
+            }
+            QPushButton:hover {background-color: #2980b9; transform: scale(1.03);}
+            QLabel {font-size: 16px; color: #34495e;}
+            QLineEdit, QSpinBox, QDateEdit, QComboBox {
+                font-size: 16px; padding: 10px; border: 1px solid #bdc3c7; border-radius: 6px;
+                background-color: white;
+            }
+            QTableView {
+                font-size: 16px; border: 1px solid #e1e8ed; border-radius: 8px;
+                background-color: rgba(255,255,255,0.9);
+            }
+            QHeaderView::section {
+                background-color: #3498db; color: white; font-weight: bold;
+                padding: 12px; border-radius: 4px;
+            }
+            QTableView::item {padding: 8px;}
+            QTableView::item:selected {background-color: #e3f2fd; color: #2c3e50;}
+        """)
+
+        #中心部件是子窗口的 内容容器，所有按钮、表格、输入框都要装到这个容器里，再把容器放到窗口正中间
+        #相当于word里设置页边距，行距等
+        cen_wid = QWidget()
+        self.setCentralWidget(cen_wid)
+        main_layout = QVBoxLayout(cen_wid)
+        main_layout.setSpacing(25)
+        main_layout.setContentsMargins(40, 40, 40, 40)
+
+        #按钮区，添加按钮并命名
+        btn_layout = QHBoxLayout()# 水平布局
+        self.add_btn = QPushButton("新增")
+        self.query_btn = QPushButton("查询")
+        self.upd_btn = QPushButton("修改")
+        self.del_btn = QPushButton("删除")
+        self.imp_btn = QPushButton("批量导入")
+        self.exp_btn = QPushButton("导出")
+        btn_layout.addWidget(self.add_btn)
+        btn_layout.addWidget(self.query_btn)
+        btn_layout.addWidget(self.upd_btn)
+        btn_layout.addWidget(self.del_btn)
+        btn_layout.addWidget(self.imp_btn)
+        btn_layout.addWidget(self.exp_btn)
+        main_layout.addLayout(btn_layout)
+
+        #查询条件区，添加查询框，设置输入的查询框并内置提示
+        query_layout = QHBoxLayout()
+        self.fld_label = QLabel("查询字段：")
+        self.fld_combo = QComboBox()  # 字段映射下拉框
+        self.mode_combo = QComboBox()  # 匹配方式下拉框：包含/精确/前缀/范围
+        self.mode_combo.addItems(modes)
+        self.val_label = QLabel("查询值：")
+        self.val_txt = QLineEdit()  # 查询值输入框
+        self.val_txt.setPlaceholderText("输入内容，留空查全表，范围查询用~分隔，如2018-12-01~2018-12-31")
+        self.comb_btn = QPushButton("组合查询")  # 多字段组合查询
+        query_layout.addWidget(self.fld_label)
+        query_layout.addWidget(self.fld_combo)
+        query_layout.addWidget(self.mode_combo)
+        query_layout.addWidget(self.val_label)
+        query_layout.addWidget(self.val_txt)
+        query_layout.addWidget(self.comb_btn)
+        main_layout.addLayout(query_layout)
+
+        #表单输入区，创建输入控件的容器并基本布局
+        self.form_group = QGroupBox("数据输入")
+        form_wid = QWidget()
+        self.form_layout = QFormLayout(form_wid)
+        self.form_layout.setSpacing(15)
+        self.form_layout.setContentsMargins(25, 25, 25, 25)
+        self.wid_dict = {}  # 输入控件字典存输入控件，比如把“患者编号”输入框存起来，后续取值用
+        self.fld_map = {}  # 字段映射存“中文字段名→数据库字段名”的映射
+        self.create_wids()
+        #把当前表的字段名填充到查询下拉框里
+        if self.fld_map:
+            self.fld_combo.addItems(self.info.cn_names)
+        self.pager = self.make_pager()  # 分页器，根据字段映射和关联配置生成分页SQL
+        self.form_group.setLayout(QVBoxLayout())
+        self.form_group.layout().addWidget(form_wid)
+        #把整个数据输入分组框加到主布局里
+        main_layout.addWidget(self.form_group)
+
+        # 结果表格，规定结果输出位置
+        # 表格只负责显示，数据放在ResultModel里按需分批从游标读取
+        self.res_model = ResultModel(self, max_rows=self.pager.page_size if self.pager else 5000)
+        self.res_table = QTableView()
+        self.res_table.setModel(self.res_model)
+        self.res_table.setEditTriggers(QTableView.NoEditTriggers)
+        self.res_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+
+        # 表格里直接修改：双击单元格改本表的字段，改过的格子标黄、新增的行标绿、标记删除的行标灰，
+        # 点保存修改时一个事务全部提交（见unit_of_work.py）
+        edit_layout = QHBoxLayout()
+        self.new_row_btn = QPushButton("新增一行")
+        self.mark_del_btn = QPushButton("删除选中行")
+        self.save_btn = QPushButton("保存修改")
+        self.undo_btn = QPushButton("撤销修改")
+        self.pending_label = QLabel("")
+        edit_layout.addWidget(QLabel("双击单元格直接修改，改完点“保存修改”一起提交"))
+        edit_layout.addStretch()
+        edit_layout.addWidget(self.pending_label)
+        for btn in (self.new_row_btn, self.mark_del_btn, self.save_btn, self.undo_btn):
+            edit_layout.addWidget(btn)
+        if self.uow:
+            self.res_model.editor = self.uow
+            self.res_table.setEditTriggers(QTableView.DoubleClicked | QTableView.EditKeyPressed)
+            self.res_model.edit_error.connect(lambda msg: QMessageBox.warning(self, "提示", msg))
+            self.res_model.dataChanged.connect(self.upd_pending)
+            main_layout.addLayout(edit_layout)
+        else:
+            for btn in (self.new_row_btn, self.mark_del_btn, self.save_btn, self.undo_btn):
+                btn.hide()
+        main_layout.addWidget(self.res_table)
+
+        # 翻页区，上一页/下一页/跳页，总数只有点击统计时才查询
+        page_layout = QHBoxLayout()
+        self.prev_btn = QPushButton("上一页")
+        self.next_btn = QPushButton("下一页")
+        self.page_label = QLabel("第 1 页")
+        self.jump_box = QSpinBox()
+        self.jump_box.setRange(1, 999999)
+        self.jump_btn = QPushButton("跳转")
+        self.count_btn = QPushButton("统计总数")
+        self.refresh_btn = QPushButton("刷新")
+        self.count_label = QLabel("")
+        page_layout.addWidget(self.prev_btn)
+        page_layout.addWidget(self.page_label)
+        page_layout.addWidget(self.next_btn)
+        page_layout.addStretch()
+        page_layout.addWidget(QLabel("跳至："))
+        page_layout.addWidget(self.jump_box)
+        page_layout.addWidget(self.jump_btn)
+        page_layout.addWidget(self.count_btn)
+        page_layout.addWidget(self.count_label)
+        page_layout.addWidget(self.refresh_btn)
+        main_layout.addLayout(page_layout)
+
+        # 忙碌提示，后台有SQL在执行时在状态栏显示滚动进度条
+        self.busy_bar = QProgressBar()
+        self.busy_bar.setRange(0, 0)  # 范围为0表示不确定进度，显示来回滚动的效果
+        self.busy_bar.setMaximumWidth(200)
+        self.busy_bar.hide()
+        self.statusBar().addPermanentWidget(self.busy_bar)
+
+        # 绑定事件，把按钮点击和功能接口联系起来
+        self.add_btn.clicked.connect(self.add_data)
+        self.query_btn.clicked.connect(lambda: self.query_data())
+
+        # 边输入边查询：停止输入300毫秒后才执行，避免每敲一个字都查一次数据库
+        self.last_search = None  # 上一次查询：(中文字段名, 匹配方式, 查询值, 结果是否已全部加载)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+        self.search_timer.timeout.connect(self.live_search)
+        self.val_txt.textChanged.connect(self.search_timer.start)
+        self.fld_combo.currentTextChanged.connect(self.on_fld_changed)
+        self.mode_combo.currentTextChanged.connect(self.on_fld_changed)
+        self.upd_btn.clicked.connect(self.upd_data)
+        self.del_btn.clicked.connect(self.del_data)
+        self.imp_btn.clicked.connect(self.import_data)
+        for btn in (self.add_btn, self.upd_btn, self.del_btn, self.imp_btn):
+            btn.setEnabled(not self.read_only)
+        self.exp_btn.clicked.connect(self.export_data)
+        self.new_row_btn.clicked.connect(self.add_grid_row)
+        self.mark_del_btn.clicked.connect(self.mark_delete)
+        self.save_btn.clicked.connect(self.save_changes)
+        self.undo_btn.clicked.connect(self.undo_changes)
+        self.upd_pending()
+        self.prev_btn.clicked.connect(lambda: self.show_page(self.pager.page - 1))
+        self.next_btn.clicked.connect(lambda: self.show_page(self.pager.page + 1))
+        self.jump_btn.clicked.connect(lambda: self.show_page(self.jump_box.value()))
+        self.count_btn.clicked.connect(self.count_total)
+        self.comb_btn.clicked.connect(self.comb_query)
+        self.refresh_btn.clicked.connect(self.reload_page)
+
+        # 打开时加载全表
+        self.loaded = False
+        self.open_t0 = None  # 主窗口点按钮的时间，第一次画出来时记下打开窗口用了多久
+        if load:
+            self.first_load()
+
+    #第一次显示时加载第一页，外键输入框的候选列表也在这时加载好（只读模式不用填）
+    def first_load(self):
+        self.loaded = True
+        self.load_all()
+        if self.search and self.search.has(self.info.name) and not self.search.fresh(self.info.name.lower()):
+            self.build_index()
+        if not self.read_only:
+            for w in self.wid_dict.values():
+                if isinstance(w, KeyPicker):
+                    self.load_keys(w)
+
+    #主窗口再次打开这张表时复用这个窗口，输入框、查询条件、当前页都保留
+    #提前建好还没加载过的窗口，这时快照可能已经准备好了，重新生成分页器再加载；
+    #加载过的按缓存刷新当前页，表没被改过就直接用缓存里的行，不用查数据库
+    def reuse(self):
+        if not self.loaded:
+            self.pager = self.make_pager()
+            self.first_load()
+            return
+        if self.pager:
+            self.show_page(self.pager.page)
+        if not self.read_only:
+            for w in self.wid_dict.values():
+                if isinstance(w, KeyPicker):
+                    self.load_keys(w)
+
+    #打开窗口后第一次画出来时记下耗时（从主窗口点按钮算起）
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.open_t0 is not None:
+            rec = self.exe.recorder if self.exe else None
+            if rec is not None:
+                rec.startup(f"{self.t_name}:打开窗口", (time.perf_counter() - self.open_t0) * 1000)
+            self.open_t0 = None
+
+    #获取字段映射
+    #字段映射在table_registry里定义，数据库里的英文字段转成能看懂的中文字段显示，
+    #输入的中文内容，也能通过这个映射对应到数据库的英文字段里
+    def get_fld_map(self):
+        if not self.info:#映射没对应
+            QMessageBox.warning(self, "提示", f"未配置{self.t_name}字段！")
+            return None
+        return self.info.fld_map
+
+    #打开不同表的子窗口时，自动创建对应表的输入控件
+    def create_wids(self):
+        #如果重复打开同一个表，先删掉之前的输入控件，避免界面上出现重复的输入框
+        for w in self.wid_dict.values():
+            w.deleteLater()# 删除之前创建的输入控件
+        self.wid_dict.clear()# 清空控件字典
+        self.fld_map = self.get_fld_map()#添加新表映射
+        if not self.fld_map:
+            return
+
+        col_wid = QWidget()#设置左右列的布局
+        col_layout = QHBoxLayout(col_wid)
+        left_layout = QFormLayout()
+        right_layout = QFormLayout()
+        for i, c in enumerate(self.info.cols):#遍历所有字段，按登记的控件类型创建输入控件
+            cn = c.cn
+            if c.widget == "sex":#性别创建特殊的下拉框选择男女
+                w = QComboBox()
+                w.addItems(["男", "女"])
+            elif c.widget == "date": #日期字段用日期选择框，固定年月日格式字段
+                w = QDateEdit(QDate.currentDate())
+                w.setDisplayFormat("yyyy-MM-dd")
+            elif c.widget == "spin": #数字字段用数字框
+                w = QSpinBox()
+                w.setRange(0, 999)
+            elif c.fk and by_tname[c.fk[0].lower()].label: #外键字段用带候选列表的输入框，输入编号或名称开头就能选
+                w = KeyPicker(c.fk[0], self.load_keys)
+            else:
+                w = QLineEdit()
+            self.wid_dict[c.name] = w #把创建好的控件存到字典里后续取值用
+            #分左右列，偶数左列，奇数右列
+            if i % 2 == 0:
+                left_layout.addRow(QLabel(f"{cn}："), w)
+            else:
+                right_layout.addRow(QLabel(f"{cn}："), w)
+
+        col_layout.addLayout(left_layout)
+        col_layout.addLayout(right_layout)
+        self.form_layout.addRow(col_wid) #把整个左右列布局加到输入区的表单布局里
+
+    #加载（或重新加载）外键输入框的候选列表：(编号, 名称)建成前缀索引
+    #参照表快照准备好了就直接从快照取，快照有新数据时重建；患者表这种不在快照里的，后台查一次，
+    #过期后只补查编号比列表里最大的还大的行（新加的），full=True时（变更通知说改得太多）整个重新查
+    def load_keys(self, picker, full=False):
+        ref = by_tname[picker.ref.lower()]
+        snap = self.snapshot
+        if snap and snap.ready and ref.name in snap.rows:
+            if picker.index is None or picker.gen != snap.gen:
+                i, j = ref.db_flds.index(ref.pk[0]), ref.db_flds.index(ref.label)
+                picker.set_index(PrefixIndex((r[i], r[j]) for r in snap.table(ref.name)), snap.gen)
+            return
+        if not self.exe or not (full or picker.stale()) or picker.loading:
+            return
+        picker.loading = True
+        sql = f"SELECT {ref.pk[0]}, {ref.label} FROM {ref.name}"
+        last = picker.index.last() if picker.index is not None and not full else None
+        params = [] if last is None else [last]
+        if last is not None:
+            sql += f" WHERE {ref.pk[0]} > ?"
+
+        def job(cur):
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+        def done(rows):
+            if last is None:
+                picker.set_index(PrefixIndex(rows))
+            else:
+                picker.apply(rows)
+                picker.loaded_at = time.monotonic()
+
+        def after():
+            picker.loading = False
+
+        self.run_job(job, done, channel=f"keys:{ref.name}", fail_title="加载候选列表失败", after_end=after)
+
+    #按编号重查候选列表里的几项：keys为编号列表，查到的放进列表（新加的、改了名称的），查不到的从列表去掉
+    def refresh_picker(self, picker, keys):
+        ref = by_tname[picker.ref.lower()]
+        keys = list(keys)
+        if not self.exe or picker.index is None or not keys:
+            return
+        sql = f"SELECT {ref.pk[0]}, {ref.label} FROM {ref.name} WHERE {ref.pk[0]} IN ({', '.join(['?'] * len(keys))})"
+
+        def job(cur):
+            cur.execute(sql, keys)
+            rows = cur.fetchall()
+            cur.connection.rollback()  # 只读，结束事务
+            return rows
+
+        def done(rows):
+            found = {norm(r[0]) for r in rows}
+            picker.apply(rows, [k for k in keys if norm(k) not in found])
+
+        self.run_job(job, done, fail_title="更新候选列表失败")
+
+    #变更通知里有被参照表的改动：候选列表只按改过的编号重查这几行，改得太多（None）时整个重新查
+    #从快照建的列表不用管，快照同步完gen变了，下次点进输入框时在load_keys里重建
+    def refresh_pickers(self, changes):
+        for w in self.wid_dict.values():
+            if not isinstance(w, KeyPicker) or w.index is None or w.gen is not None:
+                continue
+            t = w.ref.lower()
+            if t not in changes:
+                continue
+            if changes[t] is None:
+                self.load_keys(w, full=True)
+            else:
+                self.refresh_picker(w, [k[0] for k in changes[t]])
+
+    #新增/修改前看外键输入框里填的编号在不在候选列表里，返回{输入框: 编号}
+    #列表可能还没跟上别的终端刚加的数据，不在列表里的不直接拦下，后台的Validator会到数据库确认（不存在时提示）；
+    #确认存在、保存成功之后调用learn_keys，按这些编号把候选列表补上
+    def unknown_keys(self, flds):
+        out = {}
+        for f in flds:
+            w = self.wid_dict.get(f)
+            if isinstance(w, KeyPicker) and not w.check():
+                out[w] = w.text().strip()
+        return out
+
+    def learn_keys(self, unknown):
+        for w, v in unknown.items():
+            self.refresh_picker(w, [v])
+
+    #生成分页器：查询SQL、表头、主键列在结果中的位置都从表结构登记里取
+    #参照表快照可用时翻页只查本表的列（INNER JOIN照样带上，关联不上的行和导出一样不显示），显示前用快照补齐关联的列
+    def make_pager(self):
+        if not self.fld_map:
+            return None
+        self.res_heads = list(self.info.heads)
+        self.client_join = bool(self.info.local_sql and self.snapshot and self.snapshot.ready)
+        base_sql = self.info.local_sql if self.client_join else self.info.select_sql
+        if self.versioned:  # 每行多带一列rv，表格不显示，保存修改时检查冲突用
+            base_sql = with_version(base_sql, self.info.alias)
+        return Pager(base_sql, self.info.page_keys, self.info.key_idx)
+
+    #加载全表数据，打开表的子窗口时，自动从数据库查数据并显示到表格里
+    #现在只取第一页，翻页时再按主键接着往后取
+    def load_all(self):
+        if not self.exe or not self.fld_map:#前置校验，检查表名与映射
+            return
+        self.pager.set_filter()  # 清空查询条件
+
+        def after():  # 记下全表是否一页就能放下，放得下的话之后输入查询值可以直接在本地筛选
+            self.last_search = (None, None, "", self.page_complete())
+
+        self.show_page(1, after)
+
+    #当前结果是否就是查询条件下的全部数据（第一页且没有下一页）
+    def page_complete(self):
+        return self.pager.page == 1 and not self.has_next()
+
+    #后面还有没有下一页：多取的那一行存在说明还有；按本地索引分页时总数是知道的，按页数判断
+    #（这中间别的终端改了数据，一页可能显示不满，照样能翻到后面的页）
+    def has_next(self):
+        if self.pager.keys is not None:
+            return self.pager.page < self.pager.page_count()
+        return self.res_model.truncated
+
+    #显示第page页，查询在后台执行，加载完成后调用after()
+    #翻页、查询共用一个通道，新的请求会取消还没执行完的旧请求
+    #缓存里有这一页就直接显示，use_cache=False时（点刷新）一定重新查询
+    def show_page(self, page, after=None, use_cache=True):
+        if not self.exe or not self.pager:
+            return
+        page = max(1, page)
+        pages = self.pager.page_count()
+        if pages is not None:
+            page = min(page, pages)
+        sql, params = self.pager.page_sql(page)
+        n = self.pager.page_size + 1
+
+        #后台线程里执行SQL，只取一页（多一行用来判断有没有下一页）
+        def job(cur):
+            cur.execute(sql, params) #执行SQL语句
+            return cur.fetchmany(n)
+
+        #回到界面线程后把这一页交给模型显示
+        #性别1/0转男/女、None转空串都在模型显示单元格时才处理
+        def done(rows, from_cache=False):
+            if self.cache and not from_cache:
+                self.cache.put(sql, params, rows, version)
+            t0 = time.perf_counter()
+            if self.client_join:  # 缓存里存的是本表的行，每次显示时按最新的快照补列
+                full = self.snapshot.expand(self.info, rows)
+                rows = [e + (r[-1],) for e, r in zip(full, rows)] if self.versioned else full
+            if self.uow:  # 还没保存的修改套到新取回的行上
+                rows = self.uow.overlay(rows)
+            self.res_model.reset(self.res_heads, RowBuffer(rows))
+            self.pager.page_loaded(page, self.res_model.rows)
+            if self.uow:
+                self.res_model.append_rows(self.uow.new_rows())
+            self.upd_page_bar()
+            self.log_render("show_page", t0)
+            self.show_cache_stats(from_cache)
+            if after:
+                after()
+
+        rows = self.cache.get(sql, params) if self.cache and use_cache else None
+        if rows is not None:
+            self.exe.cancel((id(self), "page"))  # 之前还没回来的查询结果已经没用了
+            done(rows, True)
+            return
+        version = self.cache.version if self.cache else None  # 查询期间有写操作，结果就不放进缓存
+        self.run_job(job, done, channel="page", fail_title="加载失败")
+
+    #重新加载当前页，点击刷新或者发现表格数据已经过期时调用，不使用缓存
+    def reload_page(self):
+        if self.pager:
+            self.show_page(self.pager.page, use_cache=False)
+
+    #状态栏显示缓存命中情况，方便调整缓存大小和有效期
+    def show_cache_stats(self, from_cache):
+        if not self.cache:
+            self.statusBar().clearMessage()
+            return
+        st = self.cache.stats()
+        src = "缓存" if from_cache else "数据库"
+        self.statusBar().showMessage(
+            f"本页来自{src}  缓存命中{st['hits']}次/未命中{st['misses']}次（命中率{st['hit_rate']:.0%}），共{st['entries']}条")
+
+    #某张表写入成功后调用（在后台线程里），作废所有读过这张表的缓存
+    #改的是参照表时顺便用同一个连接同步本地快照，之后补出来的科室名、医生姓名马上就是新的
+    def tables_changed(self, tname, cur=None):
+        if self.cache:
+            self.cache.invalidate(tname)
+        if self.search:  # 全文索引等变更通知重读改过的行之后才算是新的
+            self.search.touch(tname)
+        if self.snapshot and cur is not None and tname in self.snapshot.rows:
+            try:
+                self.snapshot.sync(cur, [tname])
+            except Exception:
+                cur.connection.rollback()  # 同步失败就等下次定时同步，不影响这次修改
+
+    #别的终端（或者本机其他窗口）改了数据，主窗口的变更通知交过来{表名: 改过的主键集合}，集合为None表示改得太多
+    #只处理开着的窗口，隐藏的窗口再打开时本来就会刷新当前页；外键输入框的候选列表也按改过的编号更新（见refresh_pickers）
+    #本表改过的行按主键重查（带上当前的查询条件），查到的放回表格，当前页范围内的新行插进去，
+    #查不到的（被删了或者不再符合查询条件）从表格去掉；有还没保存的修改的行不动，保存时照样检查冲突
+    #关联进来的其他表（科室名、医生姓名等）改了，或者本表一次改得太多，就重新加载当前页
+    def apply_changes(self, changes):
+        if not self.loaded or not self.isVisible() or not self.pager or not self.exe:
+            return
+        if not self.read_only:
+            self.refresh_pickers(changes)
+        own = self.info.name.lower()
+        if own in changes and changes[own] is None or any(t in changes for t in self.dep_tables if t != own):
+            self.reload_page()
+            return
+        keys = sorted(k for k in changes.get(own) or () if not self.pending(k))
+        if not keys:
+            return
+        sql, params = self.pager.rows_sql(keys)
+
+        def job(cur):
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+        def done(rows):
+            rows = self.expand_rows(rows)
+            idx = self.pager.key_idx
+            found = {tuple(norm(r[i]) for i in idx): tuple(r) for r in rows}
+            n = 0
+            for k in keys:
+                if self.pending(k):  # 查询期间在表格里改了这一行
+                    continue
+                row = found.get(k)
+                if row is None:
+                    n += self.res_model.drop_row(idx, k)
+                else:
+                    n += self.res_model.put_row(idx, row, only_existing=not self.in_page(list(k)))
+            if n:
+                self.statusBar().showMessage(f"其他终端改动了{n}行数据，已更新", 5000)
+
+        self.run_job(job, done, channel="feed", fail_title="更新失败")
+
+    #只查了本表的行按快照补上关联的列（版本列留在最后），不是本地补列时原样返回
+    def expand_rows(self, rows):
+        if not self.client_join:
+            return rows
+        full = self.snapshot.expand(self.info, rows)
+        return [e + (r[-1],) for e, r in zip(full, rows)] if self.versioned else full
+
+    #主键key（去掉尾部空格的值列表）是否落在当前页的范围里：大于上一页最后一行，
+    #后面还有数据（有下一页或者还没取完）时不超过本页最后一行；不在范围里的新行不插进表格
+    def in_page(self, key):
+        lo = self.pager.after.get(self.pager.page)
+        if lo is not None and key <= [norm(v) for v in lo]:
+            return False
+        shown = [r for r in self.res_model.rows if not isinstance(r, NewRow)]
+        more = self.has_next() or self.res_model.src is not None
+        return not (shown and more and key > [norm(shown[-1][i]) for i in self.pager.key_idx])
+
+    #这一行在表格里有还没保存的修改或者标记了删除
+    def pending(self, key):
+        return bool(self.uow) and (key in self.uow.updates or key in self.uow.deletes)
+
+    #记下从t0开始把数据放进表格并画出来的耗时，和同名操作的查询耗时放在一起对比
+    #立即重画一次表格，单元格格式化和绘制的时间也算进去（本来也要画，只是提前到这里）
+    def log_render(self, name, t0):
+        rec = self.exe.recorder if self.exe else None
+        if rec is None:
+            return
+        if self.res_table.isVisible():
+            self.res_table.viewport().repaint()
+        rec.render(f"{self.t_name}:{name}", len(self.res_model.rows), (time.perf_counter() - t0) * 1000)
+
+    #刷新翻页按钮状态和页码显示
+    def upd_page_bar(self):
+        pages = self.pager.page_count()
+        self.page_label.setText(f"第 {self.pager.page} 页" + (f" / 共 {pages} 页" if pages else ""))
+        self.prev_btn.setEnabled(self.pager.page > 1)
+        self.next_btn.setEnabled(self.has_next())
+        self.count_label.setText(f"共 {self.pager.total} 条" if self.pager.total is not None else "")
+
+    #统计当前条件下的总行数，COUNT(*)可能比较慢，所以只在点击时执行
+    def count_total(self):
+        if not self.exe or not self.pager:
+            return
+        sql, params = self.pager.count_sql()
+
+        def job(cur):
+            cur.execute(sql, params)
+            return cur.fetchone()[0]
+
+        def done(total):
+            if self.cache:
+                self.cache.put(sql, params, total, version)
+            self.pager.total = total
+            self.upd_page_bar()
+
+        total = self.cache.get(sql, params) if self.cache else None
+        if total is not None:
+            self.pager.total = total
+            self.upd_page_bar()
+            return
+        version = self.cache.version if self.cache else None
+        self.run_job(job, done, channel="count", fail_title="统计失败")
+
+    #把job(cur)交给后台执行器，同时显示忙碌提示
+    #job里抛出的QueryMsg按普通提示弹窗，其他异常按fail_title弹出错误信息
+    #after_end不管成功失败都会在回调前调用，用来关闭进度框之类
+    #耗时记录里的操作名是“表名:方法名”，比如“患者表:show_page”
+    def run_job(self, job, on_done=None, channel=None, fail_title="失败", after_end=None):
+        self.busy_count += 1
+        self.busy_bar.show()
+
+        def on_fail(e):
+            if isinstance(e, QueryMsg):
+                QMessageBox.warning(self, "提示", str(e))
+            else:
+                QMessageBox.warning(self, fail_title, f"错误：{str(e)}")
+
+        def on_end():
+            self.busy_count -= 1
+            if self.busy_count <= 0:
+                self.busy_bar.hide()
+            if after_end:
+                after_end()
+
+        # 通道加上窗口标识，不同窗口的查询互不取消
+        ch = (id(self), channel) if channel else None
+        return self.exe.submit(job, on_done, on_fail, ch, on_end, op=f"{self.t_name}:{job_name(job)}")
+
+
+
+    # 此前部分均属于页面设置和界面初始化，从这里开始进入增删改查
+
+    #新增数据，重要功能
+    def add_data(self):
+        if not self.exe or not self.fld_map:# 基础校验，确认连接
+            QMessageBox.warning(self, "提示", "数据库未连接！")
+            return
+        #主键（患者用药表是药品编号+患者编号）不能为空，主体完整性约束，其他字段允许为空
+        if self.get_loc() is None:
+            return
+        info = self.info
+        unknown = self.unknown_keys(info.db_flds)
+        vals = [self.wid_val(c) for c in info.cols]  # 存最终要插入数据库的值，性别、日期、数字按控件类型取值
+        real_tname = info.name
+        new_row = dict(zip(info.db_flds, vals))
+        #新行的主键，插入后要按主键把这一行重新查出来（带上关联的科室名等，并确认符合当前查询条件）
+        key_vals = [new_row[k] for k in info.pk]
+
+        #校验和插入在后台线程的同一个连接上执行，出错时执行器会回滚
+        #主键/唯一字段是否重复、外键是否存在，一条查询全部校验完，有问题一起提示
+        def job(cur):
+            if real_tname == "PD":
+                return dispense_job(cur)
+            msgs = self.validator.check_insert(cur, real_tname, new_row, info.rev_map)
+            if msgs:
+                raise QueryMsg("无法新增：\n" + "\n".join(msgs))
+            execute(cur, info.insert_stmt, vals)  # 参数化的INSERT语句，把输入值和SQL语句分离
+            cur.connection.commit()  # 提交事务
+            self.tables_changed(real_tname, cur)
+            return fetch_new(cur)
+
+        #患者用药表的新增就是发药：同时扣减药品库存（见dispense.py），已有这条用药记录时数量累加
+        #患者编号、药品编号是否存在一条查询检查完，库存够不够由扣库存的语句判断
+        def dispense_job(cur):
+            msgs = self.validator.check_fks(cur, real_tname, new_row, info.rev_map)
+            if msgs:
+                raise QueryMsg("无法发药：\n" + "\n".join(msgs))
+            try:
+                dispense(cur, [(new_row["pno"], new_row["dgno"], new_row["num"])])
+            except DispenseError as e:
+                raise QueryMsg(f"无法发药：\n{e}")
+            self.tables_changed(real_tname, cur)
+            self.tables_changed("drug", cur)
+            return fetch_new(cur)  # 累加后的用药数量要重新查
+
+        #按主键把新行查回来，带上当前的查询条件（关联表还要带上科室名等），不符合条件时查不到
+        def fetch_new(cur):
+            sql, params = self.pager.rows_sql([key_vals])
+            cur.execute(sql, params)
+            return cur.fetchone()
+
+        def done(row):
+            QMessageBox.information(self, "成功", "发药成功，已扣减库存！" if real_tname == "PD" else "新增数据成功！")
+            self.clear_inputs()
+            self.learn_keys(unknown)
+            # 只把新增的这一行按主键顺序放进表格，不再重新加载整张表；
+            # 不符合当前查询条件、或者不在当前页范围内的不放，免得筛选结果里混进别的数据、翻页时重复出现
+            if row is None:
+                self.statusBar().showMessage("新增的数据不符合当前查询条件，没有显示在表格里", 5000)
+                return
+            row = self.expand_rows([row])[0]
+            key = [norm(row[i]) for i in self.pager.key_idx]
+            if not self.res_model.put_row(self.pager.key_idx, row, only_existing=not self.in_page(key)):
+                self.statusBar().showMessage("新增的数据不在当前页，翻到对应的页可以看到", 5000)
+
+        self.run_job(job, done)
+
+    # 查询数据，重要功能
+    #quiet=True时是边输入边查询，查不到数据只在状态栏提示，不弹窗
+    def query_data(self, quiet=False):
+        if not self.exe or not self.fld_map:  # 连接校验
+            QMessageBox.warning(self, "提示", "数据库未连接！")
+            return
+        # 获取选择的字段
+        sel_cn = self.fld_combo.currentText()
+        if not sel_cn:
+            QMessageBox.warning(self, "提示", "请选择查询字段！")
+            return
+        # 转数据库英文字段
+        if sel_cn not in self.fld_map:
+            QMessageBox.warning(self, "提示", f"字段【{sel_cn}】不存在！")
+            return
+        # 取用户输入的查询值
+        q_val = self.val_txt.text().strip()
+        if not q_val:  # 先判断留空，直接查全表
+            self.load_all()
+            return
+
+        # 范围查询用~分隔上下限，任一边可以留空
+        mode = self.mode_combo.currentText()
+        lo, _, hi = q_val.partition("~") if mode == "范围" else (q_val, "", "")
+        self.run_conds([self.make_cond(sel_cn, mode, lo, hi)], quiet=quiet, tag=(sel_cn, mode, q_val))
+
+    #查询字段或匹配方式变了，输入框里有值就重新查询
+    def on_fld_changed(self):
+        if self.val_txt.text().strip():
+            self.search_timer.start()
+
+    #边输入边查询，输入停止后由定时器调用
+    #如果新的查询值只是在上次的基础上缩小了范围（比如“包含张”变成“包含张三”），
+    #而上次的结果已经全部加载，那新结果一定在上次结果里面，直接在本地筛选，不用再查数据库；
+    #否则重新查询数据库，还没返回的旧查询会被取消
+    def live_search(self):
+        if not self.exe or not self.fld_map:
+            return
+        cn = self.fld_combo.currentText()
+        mode = self.mode_combo.currentText()
+        q_val = self.val_txt.text().strip()
+        if not cn or (not q_val and not self.pager.cond):  # 清空查询值但当前本来就是全表，不用再查
+            return
+        if self.can_refine(cn, mode, q_val):
+            self.refine(cn, mode, q_val)
+        else:
+            self.query_data(quiet=True)
+
+    #判断能否在上次的结果里直接筛选
+    def can_refine(self, cn, mode, q_val):
+        if not self.last_search or not q_val or mode not in ("包含", "前缀") or self.fld_kind(cn) != "text":
+            return False
+        l_cn, l_mode, l_val, complete = self.last_search
+        if not complete:  # 上次结果没有全部加载，本地数据不全
+            return False
+        if l_cn is None:  # 上次是全表查询，任何条件都是缩小范围
+            return True
+        if l_cn != cn or l_mode != mode:
+            return False
+        if mode == "包含":
+            return l_val.casefold() in q_val.casefold()
+        return q_val.casefold().startswith(l_val.casefold())
+
+    #在已加载的结果里本地筛选，和数据库的LIKE一样不区分大小写，“包含”的多个词都要包含
+    def refine(self, cn, mode, q_val):
+        self.exe.cancel((id(self), "page"))  # 之前还没回来的查询已经没用了
+        idx = self.info.sel_idx[self.fld_map[cn]]
+        key = q_val.casefold()
+        loaded = [r for r in self.res_model.rows if not isinstance(r, NewRow)]  # 新增还没保存的行不参与筛选
+        if mode == "包含":
+            terms = key.split()
+            rows = [r for r in loaded if all(t in norm(r[idx]).casefold() for t in terms)]
+        else:
+            rows = [r for r in loaded if norm(r[idx]).casefold().startswith(key)]
+        # 分页器的条件也要同步，之后翻页、刷新时查的就是新条件
+        where, params = build_where([self.make_cond(cn, mode, q_val)])
+        self.pager.set_filter(where, params)
+        t0 = time.perf_counter()
+        self.res_model.reset(self.res_heads, RowBuffer(rows))
+        self.pager.page_loaded(1, self.res_model.rows)
+        if self.uow:
+            self.res_model.append_rows(self.uow.new_rows())
+        self.upd_page_bar()
+        self.log_render("refine", t0)
+        self.last_search = (cn, mode, q_val, True)
+        self.statusBar().showMessage(f"本地筛选出 {len(rows)} 条数据")
+
+    # 组合查询，弹出对话框设置多个字段的条件，用AND/OR组合
+    def comb_query(self):
+        if not self.exe or not self.fld_map:  # 连接校验
+            QMessageBox.warning(self, "提示", "数据库未连接！")
+            return
+        dlg = CondDlg(list(self.info.cn_names), self)
+        if dlg.exec_() != QDialog.Accepted:
+            return
+        conds = [self.make_cond(cn, mode, v1, v2) for cn, mode, v1, v2 in dlg.get_conds()]
+        self.run_conds(conds, dlg.join_combo.currentText())
+
+    # 按中文字段名生成查询条件，关联表的字段要加表别名，单表查询直接用字段名
+    def make_cond(self, cn, mode, val, val2=""):
+        db_f = self.fld_map[cn]
+        col = f"{self.info.alias}.{db_f}" if self.info.alias else db_f
+        return Cond(col, cn, self.fld_kind(cn), mode, val, val2)
+
+    # 字段类型，决定查询值怎么转换，在table_registry里登记
+    def fld_kind(self, cn):
+        return self.info.by_cn[cn].kind
+
+    # 执行查询条件，逻辑与load_all()相同，只是带上查询条件，同样只取第一页
+    #tag是单字段查询的(中文字段名, 匹配方式, 查询值)，记下来供边输入边查询判断能否本地筛选
+    def run_conds(self, conds, join="AND", quiet=False, tag=None):
+        try:
+            where, params = build_where(conds, join)
+        except CondError as e:
+            if quiet:
+                self.statusBar().showMessage(str(e))
+            else:
+                QMessageBox.information(self, "提示", str(e))
+            return
+        if not where:  # 没有有效条件，查全表
+            self.load_all()
+            return
+        self.pager.set_filter(where, params)
+        t0 = time.perf_counter()
+        keys = self.index_keys(conds, join)
+        if keys is not None:  # 本地索引查出了全部主键，翻页只按主键取
+            self.pager.set_keys(keys)
+            ms = (time.perf_counter() - t0) * 1000
+        desc = f"，{'并且' if join == 'AND' else '或者'}".join(c.desc() for c in conds if c.val or c.val2)
+
+        def after():
+            self.last_search = tag + (self.page_complete(),) if tag else None
+            if keys is not None and keys:
+                self.statusBar().showMessage(f"本地索引找到 {len(keys)} 条（{ms:.1f}毫秒）")
+            if self.res_model.rowCount() == 0:
+                if quiet:
+                    self.statusBar().showMessage(f"未找到【{desc}】的数据")
+                else:
+                    QMessageBox.information(self, "提示", f"未找到【{desc}】的数据！")
+
+        self.show_page(1, after)
+
+    #条件能不能用本地全文索引回答：每个条件都是建了索引的文本字段上的“包含”，索引建好了而且没过期，
+    #返回排好序的主键列表；不能用时返回None照常查数据库，索引没建好或者过期了顺便在后台重建
+    def index_keys(self, conds, join):
+        if not self.search or not self.search.has(self.info.name):
+            return None
+        terms = []
+        for c in conds:
+            if not c.val and not c.val2:
+                continue
+            f = c.col.split(".")[-1]
+            if c.mode != "包含" or c.kind != "text" or f not in self.info.search:
+                return None
+            terms.append((f, c.val.split()))
+        if not terms:
+            return None
+        keys = self.search.match(self.info.name.lower(), terms, join)
+        if keys is None:
+            self.build_index()
+        return keys
+
+    #后台建本表的全文索引，已经在建就不重复提交；建不成（比如连接断了）就一直查数据库
+    def build_index(self):
+        t = self.info.name.lower()
+        ch = f"search:{t}"
+        if self.exe.latest.get(ch) in self.exe.running:
+            return
+        self.exe.submit(lambda cur: self.search.build(cur, t), channel=ch, op=f"{self.t_name}:build_index")
+
+    # 修改数据，重要功能
+    def upd_data(self):
+        if not self.exe or not self.fld_map:  # 连接校验
+            QMessageBox.warning(self, "提示", "数据库未连接！")
+            return
+        info = self.info
+        # 1. 获取并校验定位记录用的主键值（患者用药表是药品编号+患者编号的联合主键）
+        key = self.get_loc()
+        if key is None:
+            return
+
+        # 2. 收集非主键字段的修改值，用户填了哪些字段，就只改哪些字段
+        upd_flds = []  # 存要修改的字段
+        upd_vals = []  # 存要修改的字段值
+        changes = {}  # 结果表格里要跟着改的列：{列下标: 新值}
+        for c in info.cols:
+            if c.name in key:
+                continue
+            val = self.wid_val(c)
+            if val == "":
+                continue  # 空值不修改
+            upd_flds.append(c.name)
+            upd_vals.append(val)
+            if c.name in info.sel_idx:
+                changes[info.sel_idx[c.name]] = val
+
+        if not upd_flds:
+            QMessageBox.warning(self, "提示", "请输入要修改的字段！")
+            return
+        unknown = self.unknown_keys(upd_flds)
+
+        # 3. 构建并执行修改SQL，记录是否存在、外键和唯一约束在后台和修改一起校验
+        real_tname = info.name
+        st = info.update_stmt(upd_flds)
+        loc_vals = list(key.values())
+        params = upd_vals + loc_vals  # 修改值在前，定位用的主键值在后
+        new_vals = dict(zip(upd_flds, upd_vals))
+        loc_idx = [info.sel_idx[f] for f in key]  # 被修改的行在结果表格中的定位列
+        #关联表改完要重新查这一行，比如医生换了部门，关联出来的科室名也要跟着变
+        is_join = bool(info.alias)
+
+        def job(cur):
+            msgs = self.validator.check_update(cur, real_tname, key, new_vals, info.rev_map)
+            if msgs:
+                raise QueryMsg("无法修改：\n" + "\n".join(msgs))
+            if real_tname == "PD":  # 改用药数量时按差额扣减或退回药品库存（见dispense.py），和修改在同一个事务里
+                try:
+                    cnt = set_num(cur, key["dgno"], key["pno"], new_vals["num"])
+                except DispenseError as e:
+                    raise QueryMsg(f"无法修改：\n{e}")
+            else:
+                execute(cur, st, params)
+                cnt = cur.rowcount
+            rv = None
+            if self.versioned and cnt:  # 改完版本号变了，提交前（这一行还锁着）取出新的版本号
+                cur.execute(f"SELECT rv FROM {real_tname} WHERE {info.loc_where}", loc_vals)
+                rv = cur.fetchone()[0]
+            cur.connection.commit()  # 提交修改，失败时执行器会回滚
+            self.tables_changed(real_tname, cur)
+            if real_tname == "PD":
+                self.tables_changed("drug", cur)
+            row = None
+            if is_join:
+                execute(cur, info.row_stmt, loc_vals)
+                row = cur.fetchone()
+            return cnt, row, rv
+
+        #表格里的这一行要换上新的版本号，否则之后在表格里改这一行保存时会误报被别人改过
+        def done(res):
+            cnt, row, rv = res
+            QMessageBox.information(self, "成功", f"修改成功！影响行数：{cnt}")
+            self.clear_inputs()
+            self.learn_keys(unknown)
+            # 只改表格里的这一行；没有改到任何行说明表格里的数据已经过期，重新加载当前页
+            if cnt == 0:
+                self.reload_page()
+            elif is_join:
+                if row is not None:
+                    self.res_model.put_row(loc_idx, tuple(row) + ((rv,) if self.versioned else ()), only_existing=True)
+            else:
+                if self.versioned:
+                    changes[len(self.res_heads)] = rv
+                self.res_model.patch_row(loc_idx, loc_vals, changes)
+
+        self.run_job(job, done)
+
+    # 删除数据，重要功能
+    def del_data(self):
+        if not self.exe or not self.fld_map:   # 连接校验
+            QMessageBox.warning(self, "提示", "数据库未连接！")
+            return
+        info = self.info
+        key = self.get_loc()  # 定位要删除的记录，患者用药表是联合主键
+        if key is None:
+            return
+        # 确认删除
+        shown = "，".join(f"{info.rev_map[f]}={v}" for f, v in key.items())
+        reply = QMessageBox.question(self, "确认", f"确定删除【{shown}】的数据？",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        params = tuple(key.values())
+        loc_idx = [info.sel_idx[f] for f in key]  # 被删除的行在结果表格中的定位列
+        w_tname = info.name
+
+        # 删除前统计所有引用这条记录的数据（比如科室下的医生和病房），有就禁止删除，和删除在后台一起执行
+        def job(cur):
+            msgs = self.validator.check_delete(cur, w_tname, key)
+            if msgs:
+                raise QueryMsg("无法删除：\n" + "\n".join(msgs))
+            if w_tname == "PD":  # 删除用药记录时用药数量退回药品库存
+                try:
+                    cnt = drop(cur, key["dgno"], key["pno"])
+                except DispenseError as e:
+                    raise QueryMsg(f"无法删除：\n{e}")
+            else:
+                execute(cur, info.delete_stmt, params)  # 执行删除SQL
+                cnt = cur.rowcount
+            cur.connection.commit()  # 提交删除，失败时执行器会回滚
+            self.tables_changed(w_tname, cur)
+            if w_tname == "PD":
+                self.tables_changed("drug", cur)
+            return cnt
+
+        def done(cnt):
+            QMessageBox.information(self, "成功", f"删除成功！影响行数：{cnt}")
+            self.clear_inputs()
+            # 只从表格里移除这一行；没有删到任何行说明表格里的数据已经过期，重新加载当前页
+            if cnt == 0:
+                self.reload_page()
+            else:
+                self.res_model.drop_row(loc_idx, params)
+
+        self.run_job(job, done)
+
+    # 批量导入，选择CSV/Excel文件后在后台导入，表头可以是中文字段名或数据库字段名
+    def import_data(self):
+        if not self.exe or not self.fld_map:  # 连接校验
+            QMessageBox.warning(self, "提示", "数据库未连接！")
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "选择导入文件", "", "数据文件 (*.csv *.xlsx)")
+        if not path:
+            return
+        real_tname = self.info.name
+        before = None
+        if real_tname == "PD":  # 导入用药记录同样扣减药品库存，库存不够的批次逐行重试，不够的那几行拒绝
+            i, j = self.info.db_flds.index("dgno"), self.info.db_flds.index("num")
+
+            def before(cur, rows):
+                need = {}
+                for r in rows:
+                    need[r[i]] = need.get(r[i], 0) + (r[j] or 0)
+                take(cur, need)
+        imp = BulkImporter(real_tname, self.fld_map, self.info.kinds, self.info.pk, before_insert=before)
+
+        def job(cur):
+            try:
+                return imp.run(cur, path)
+            finally:
+                self.tables_changed(real_tname, cur)  # 中途出错前面的批次也已经提交了
+                if real_tname == "PD":
+                    self.tables_changed("drug", cur)
+
+        def done(st):
+            QMessageBox.information(
+                self, "导入完成",
+                f"共{st['total']}行，成功导入{st['inserted']}行，拒绝{st['rejected']}行，"
+                f"用时{st['seconds']:.1f}秒（{st['rows_per_sec']:.0f}行/秒）\n拒绝原因见：{st['report']}")
+            self.reload_page()
+
+        self.run_job(job, done, fail_title="导入失败")
+
+    # 导出当前查询条件下的全部结果（不只是当前页），后台边查边写文件，可以随时取消
+    def export_data(self):
+        if not self.exe or not self.pager:
+            QMessageBox.warning(self, "提示", "数据库未连接！")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "导出到文件", f"{self.t_name}.csv",
+                                              "CSV文件 (*.csv);;Parquet文件 (*.parquet)")
+        if not path:
+            return
+        sql, params = self.pager.export_sql(self.info.select_sql)  # 导出总是用完整的关联查询
+        heads = list(self.res_heads)
+        stop = []  # 点了取消就放一个元素进去，工作线程每写完一批检查一次
+
+        dlg = QProgressDialog("正在导出……", "取消", 0, 0, self)
+        dlg.setWindowTitle("导出")
+        dlg.setMinimumDuration(500)  # 很快导完的就不弹进度框了
+        dlg.canceled.connect(lambda: stop.append(True))
+        prog = JobProgress(self)
+        prog.changed.connect(lambda n: dlg.setLabelText(f"已导出 {n} 行……"))
+
+        def job(cur):
+            try:
+                return export_query(cur, sql, params, heads, path,
+                                    progress=prog.changed.emit, cancelled=lambda: bool(stop))
+            except ExportCancelled as e:
+                raise QueryMsg(f"{e}，文件：{path}")
+
+        def done(n):
+            QMessageBox.information(self, "导出完成", f"共导出{n}行到：{path}")
+
+        self.run_job(job, done, fail_title="导出失败", after_end=dlg.reset)
+
+    # 表格里新增一行空行，填好主键等字段后和其他修改一起保存
+    def add_grid_row(self):
+        self.res_model.append_rows([self.uow.add_row()])
+        idx = self.res_model.index(len(self.res_model.rows) - 1, min(self.uow.own.values()))
+        self.res_table.scrollToBottom()
+        self.res_table.setCurrentIndex(idx)
+        self.res_table.edit(idx)
+        self.upd_pending()
+
+    # 选中的行标记删除（再点一次取消标记），新增还没保存的行直接去掉
+    def mark_delete(self):
+        rows = sorted({ix.row() for ix in self.res_table.selectionModel().selectedIndexes()}, reverse=True)
+        if not rows:
+            QMessageBox.warning(self, "提示", "请先在表格中选中要删除的行！")
+            return
+        for i in rows:  # 从后往前处理，去掉一行不影响前面的行号
+            self.res_model.set_row(i, self.uow.toggle_delete(self.res_model.rows[i]))
+        self.upd_pending()
+
+    # 显示待保存的修改条数，没有修改时保存/撤销按钮不可点
+    def upd_pending(self, *_):
+        if not self.uow:
+            return
+        n = self.uow.count()
+        self.pending_label.setText(f"待保存 {n} 条" if n else "")
+        self.save_btn.setEnabled(n > 0)
+        self.undo_btn.setEnabled(n > 0)
+
+    # 保存表格里的全部修改：冲突检查、约束检查、删除/修改/新增都在后台同一个事务里，全部成功才提交
+    def save_changes(self):
+        if not self.exe or not self.uow or not self.uow.count():
+            return
+        uow = self.uow
+        w_tname = self.info.name
+
+        #患者用药表先按药品改库存（新增的扣、删除的退、改了数量的按差额），和保存在同一个事务里，
+        #和发药一样先改drug再改PD；保存前的检查没通过时连同库存一起回滚
+        def job(cur):
+            if w_tname == "PD":
+                try:
+                    take(cur, uow.deltas("num", "dgno"))
+                except DispenseError as e:
+                    raise QueryMsg(f"无法保存：\n{e}")
+            msgs = uow.check(cur, self.validator)
+            if msgs:
+                raise QueryMsg("无法保存：\n" + "\n".join(msgs))
+            res = uow.flush(cur)
+            cur.connection.commit()
+            self.tables_changed(w_tname, cur)
+            if w_tname == "PD":
+                self.tables_changed("drug", cur)
+            return res
+
+        def done(res):
+            ins, upd, dele = res
+            uow.clear()
+            self.upd_pending()
+            QMessageBox.information(self, "成功", f"保存成功！新增{ins}条，修改{upd}条，删除{dele}条")
+            self.reload_page()
+
+        self.run_job(job, done, fail_title="保存失败")
+
+    # 放弃表格里还没保存的修改，当前页按缓存重新显示
+    def undo_changes(self):
+        if not self.uow or not self.uow.count():
+            return
+        self.uow.clear()
+        self.upd_pending()
+        if self.pager:
+            self.show_page(self.pager.page)
+
+    # 增删改查完成，下面是增删改查用到的通用功能函数
+
+    # 按输入控件类型取一个字段的值：性别男/女转1/0，日期转字符串，数字框取数字，文本去掉首尾空格
+    def wid_val(self, c):
+        w = self.wid_dict[c.name]
+        if c.widget == "sex":
+            return 1 if w.currentText() == "男" else 0
+        if c.widget == "date":
+            return w.date().toString("yyyy-MM-dd")
+        if c.widget == "spin":
+            return w.value()
+        return w.text().strip()
+
+    # 取修改/删除时定位记录的主键值：{数据库字段: 值}，没填时提示并返回None
+    def get_loc(self):
+        key = {}
+        for f in self.info.loc_cols:
+            val = self.wid_val(self.info.by_name[f])
+            if val == "":
+                QMessageBox.warning(self, "提示", f"请输入主键【{self.info.rev_map[f]}】！")
+                return None
+            key[f] = val
+        return key
+
+    # 清空输入框函数
+    def clear_inputs(self):
+        for f, w in self.wid_dict.items():  # 遍历所有输入控件
+            if isinstance(w, QLineEdit):  # 按控件类型清空或恢复默认值
+                w.clear()
+            elif isinstance(w, QDateEdit):
+                w.setDate(QDate.currentDate())
+            elif isinstance(w, QSpinBox):
+                w.setValue(0)
+            elif isinstance(w, QComboBox):
+                w.setCurrentIndex(0)
+        self.val_txt.clear()  # 清空查询值输入框
+
+    # 关闭子窗口时释放结果表格还没读完的游标，取消还在执行的查询
+    # 表格里还有没保存的修改时先确认，放弃的话清掉，下次打开这张表不再显示
+    def closeEvent(self, event):
+        if self.uow and self.uow.count():
+            reply = QMessageBox.question(self, "确认", f"还有{self.uow.count()}条修改没有保存，确定放弃吗？",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                event.ignore()
+                return
+            self.uow.clear()
+            self.upd_pending()
+        self.res_model.close_src()
+        if self.exe:
+            self.exe.cancel((id(self), "page"))
+        event.accept()
+
+# 组合查询对话框，每行一个条件：字段 + 匹配方式 + 值（范围查询再填上限），多个条件用AND/OR组合
+class CondDlg(QDialog):
+    def __init__(self, cn_names, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("组合查询")
+        self.cn_names = cn_names
+        self.rows = []  # 每行的控件：(字段下拉框, 方式下拉框, 值输入框, 上限输入框)
+        layout = QVBoxLayout(self)
+        top = QHBoxLayout()
+        top.addWidget(QLabel("条件组合方式："))
+        self.join_combo = QComboBox()
+        self.join_combo.addItems(["AND", "OR"])
+        top.addWidget(self.join_combo)
+        add_btn = QPushButton("添加条件")
+        add_btn.clicked.connect(self.add_row)
+        top.addWidget(add_btn)
+        layout.addLayout(top)
+        self.rows_layout = QVBoxLayout()
+        layout.addLayout(self.rows_layout)
+        btns = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        btns.accepted.connect(self.accept)
+        btns.rejected.connect(self.reject)
+        layout.addWidget(btns)
+        self.add_row()
+        self.add_row()
+
+    # 添加一行条件
+    def add_row(self):
+        row = QHBoxLayout()
+        fld = QComboBox()
+        fld.addItems(self.cn_names)
+        mode = QComboBox()
+        mode.addItems(modes)
+        val = QLineEdit()
+        val2 = QLineEdit()
+        val2.setPlaceholderText("上限")
+        val2.setEnabled(False)
+        # 只有范围查询才需要填上限
+        mode.currentTextChanged.connect(lambda m, w=val2: w.setEnabled(m == "范围"))
+        for w in (fld, mode, val, val2):
+            row.addWidget(w)
+        self.rows_layout.addLayout(row)
+        self.rows.append((fld, mode, val, val2))
+
+    # 取所有条件：[(中文字段名, 匹配方式, 值, 上限)]
+    def get_conds(self):
+        return [(f.currentText(), m.currentText(), v.text(), v2.text() if m.currentText() == "范围" else "")
+                for f, m, v, v2 in self.rows]
+
+
+# 主窗口搭建，主窗口和子窗口逻辑上是一样的
+class MainWin(QMainWindow):
+    # start为程序启动的时间（perf_counter），不给就从建主窗口开始算
+    def __init__(self, start=None):
+        super().__init__()
+        self.start_t = start if start is not None else time.perf_counter()
+        self.first_frame = False
+        self.bg_src = None  # 背景原图，见set_bg
+        # 窗口大小+居中
+        self.setWindowTitle("医院住院信息管理系统")  # 主菜单标题
+        self.resize(1000, 800)  # 大小
+        win_geo = self.frameGeometry()  # 定位屏幕中心
+        scr_center = QDesktopWidget().availableGeometry().center()
+        win_geo.moveCenter(scr_center)  # 定位视窗中心
+        self.move(win_geo.topLeft())    # 让两中心重合，即放到屏幕中间
+
+        # 设置背景图
+        self.set_bg("hospital_bg.jpg")
+
+        # 中心透明部件，设置透明背景与内间距
+        cen_wid = QWidget()
+        cen_wid.setStyleSheet("background-color: transparent;")
+        self.setCentralWidget(cen_wid)
+        main_layout = QVBoxLayout(cen_wid)
+        main_layout.setSpacing(50)
+        main_layout.setContentsMargins(60, 60, 60, 60)
+
+        # 标题
+        title = QLabel("医院住院信息管理系统")
+        title.setObjectName("title")   # 给标签命名，方便精准设置样式
+        title.setStyleSheet("QLabel#title {font-size: 36px; font-weight: bold; color: #333; padding-bottom: 20px;}")
+        main_layout.addWidget(title, alignment=Qt.AlignCenter)  # 居中
+
+        # 表按钮区，左右两列
+        btn_layout = QHBoxLayout()
+        left_btn = QVBoxLayout()
+        right_btn = QVBoxLayout()
+        left_btn.setSpacing(25)
+        right_btn.setSpacing(25)
+        t_list = ["科室表", "医生表", "患者表", "药品表", "病房表", "患者用药表"]
+        self.t_list = t_list
+        self.tbl_btns = []  # 表按钮和统计按钮，连上数据库之前不能点
+        for i, t in enumerate(t_list):
+            btn = QPushButton(t)
+            # 按钮样式美化：绿色背景、圆角、hover放大，参考AI
+            btn.setStyleSheet("""
+                QPushButton {
+                    font-size: 18px; padding: 20px 30px; min-width: 200px; min-height: 70px;
+                    background-color: #2ecc71; color: white; border: none; border-radius: 10px;
+                }
+                QPushButton:hover {background-color: #27ae60; transform: scale(1.05);}
+            """)
+            # 绑定点击事件
+            btn.clicked.connect(lambda checked, tn=t: self.open_table(tn))
+            self.tbl_btns.append(btn)
+            if i < 3:  # 前3个放左边
+                left_btn.addWidget(btn, alignment=Qt.AlignCenter)
+            else:  # 后3个放右边
+                right_btn.addWidget(btn, alignment=Qt.AlignCenter)
+        btn_layout.addLayout(left_btn)
+        btn_layout.addLayout(right_btn)
+        main_layout.addLayout(btn_layout)
+
+        # 数据统计按钮，放在表按钮下面
+        stats_btn = QPushButton("数据统计")
+        stats_btn.setStyleSheet("""
+            QPushButton {
+                font-size: 18px; padding: 20px 30px; min-width: 200px; min-height: 70px;
+                background-color: #e67e22; color: white; border: none; border-radius: 10px;
+            }
+            QPushButton:hover {background-color: #d35400;}
+        """)
+        stats_btn.clicked.connect(self.open_stats)
+        self.tbl_btns.append(stats_btn)
+        # 运行诊断按钮，查看每个操作的SQL耗时、显示耗时和慢查询
+        diag_btn = QPushButton("运行诊断")
+        diag_btn.setStyleSheet("""
+            QPushButton {
+                font-size: 14px; padding: 8px 20px; background-color: #7f8c8d; color: white;
+                border: none; border-radius: 8px;
+            }
+            QPushButton:hover {background-color: #606c6d;}
+        """)
+        diag_btn.clicked.connect(self.open_diag)
+        # 费用结算按钮，按科室并行结算全部患者的药费和床位费，结果写进bill表
+        self.bill_btn = QPushButton("费用结算")
+        self.bill_btn.setStyleSheet("""
+            QPushButton {
+                font-size: 14px; padding: 8px 20px; background-color: #2980b9; color: white;
+                border: none; border-radius: 8px;
+            }
+            QPushButton:hover {background-color: #1f6391;}
+            QPushButton:disabled {background-color: #95a5a6;}
+        """)
+        self.bill_btn.clicked.connect(self.run_billing)
+        self.tbl_btns.append(self.bill_btn)
+        bottom_btn = QHBoxLayout()
+        bottom_btn.addWidget(stats_btn)
+        bottom_btn.addSpacing(30)
+        bottom_btn.addWidget(self.bill_btn, alignment=Qt.AlignBottom)
+        bottom_btn.addSpacing(10)
+        bottom_btn.addWidget(diag_btn, alignment=Qt.AlignBottom)
+        main_layout.addLayout(bottom_btn)
+        main_layout.setAlignment(bottom_btn, Qt.AlignCenter)
+
+        # 数据库连接池
+        self.table_wins = []  # 打开的统计、诊断窗口，每个窗口都要保留引用，否则会被回收关闭
+        self.win_cache = {}  # 中文表名 -> 表子窗口，关闭只是隐藏，再打开时复用（见TableWin.reuse）
+        self.prebuild = []  # 连上数据库后还没提前建好的表窗口
+        self.ready = False  # 第一个连接建好之后才能打开表
+        self.versioned = set()  # 有rv（rowversion）列的表，表格里改完保存时按版本号检查冲突
+        self.recorder = Recorder()  # 每条SQL、启动和打开窗口的耗时都记在这里，运行诊断窗口查看
+        self.backend, self.pool = get_pool()
+        self.exe = None
+        self.cache = None
+        self.validator = None
+        self.snapshot = None
+        self.feed = None
+        self.search = None
+        for btn in self.tbl_btns:
+            btn.setEnabled(False)
+        if self.pool:
+            # 后台查询执行器，所有子窗口共用，每个任务从连接池借连接，每条SQL的耗时记到recorder里
+            self.exe = QueryExecutor(self.pool, recorder=self.recorder)
+            self.cache = QueryCache()  # 查询结果缓存，所有子窗口共用
+            self.validator = Validator(table_names)
+            if self.backend.name != "sqlserver" or self.backend.read_only:  # 不是平常的SQL Server时在标题上注明
+                self.setWindowTitle(f"医院住院信息管理系统 - {self.backend.describe()}")
+            # 连SQL Server时启用参照表本地快照，嵌入式数据库本来就在本地，不需要快照
+            if self.backend.name == "sqlserver":
+                self.snapshot = Snapshot(self.backend.conn_str)
+            self.feed = ChangeFeed(self.backend.read_only)  # 变更通知，整个程序一个，所有表窗口共用
+            self.search = TextSearch(self.snapshot)  # 姓名、疾病种类、药品名称的本地全文索引，所有表窗口共用
+            # 连接数据库放到后台，菜单先显示出来，连上之后再启用按钮
+            self.statusBar().showMessage("正在连接数据库…")
+            self.exe.submit(self.connect_job, self.connected, self.connect_failed, op="主窗口:连接数据库")
+            # 定期关闭空闲太久的连接
+            self.evict_timer = QTimer(self)
+            self.evict_timer.timeout.connect(self.pool.evict_idle)
+            self.evict_timer.start(60 * 1000)
+
+    # 后台线程里执行：执行器借连接时就建好了第一个连接，顺便读出上次存下的参照表快照文件，查出哪些表有rv列
+    def connect_job(self, cur):
+        if self.snapshot:
+            self.snapshot.load_file()
+        self.versioned = versioned_tables(cur)
+
+    # 连上数据库：启用按钮，后台读一次外键和主键/唯一约束（之后增删改校验都用它），
+    # 同步参照表快照（之后每30秒同步一次），开始轮询变更通知，再趁空闲把各表窗口提前建好
+    def connected(self, _):
+        self.ready = True
+        for btn in self.tbl_btns:
+            btn.setEnabled(True)
+        self.bill_btn.setEnabled(not self.backend.read_only)  # 结算要写bill表，只读模式不能用
+        self.statusBar().clearMessage()
+        self.recorder.startup("主窗口:连接数据库", (time.perf_counter() - self.start_t) * 1000)
+        self.exe.submit(self.validator.load)
+        if self.snapshot:
+            self.sync_snapshot()
+            self.snap_timer = QTimer(self)
+            self.snap_timer.timeout.connect(self.sync_snapshot)
+            self.snap_timer.start(30 * 1000)
+        self.feed_timer = QTimer(self)  # 每3秒取一次别的终端的改动，第一次只记下当前版本
+        self.feed_timer.timeout.connect(self.poll_feed)
+        self.feed_timer.start(3 * 1000)
+        self.poll_feed()
+        self.prebuild = [t for t in self.t_list if t not in self.win_cache]
+        QTimer.singleShot(0, self.prebuild_next)
+
+    def connect_failed(self, e):
+        self.statusBar().showMessage("数据库连接失败")
+        QMessageBox.critical(self, "数据库连接失败", f"错误：{str(e)}\n无法操作！")
+
+    # 提前建一个表窗口（建好界面、不查数据），一次只建一个，建完回到事件循环再建下一个，不卡住界面
+    def prebuild_next(self):
+        if not self.prebuild:
+            return
+        t_name = self.prebuild.pop(0)
+        if t_name not in self.win_cache:
+            self.win_cache[t_name] = TableWin(t_name, self.exe, self.cache, self.validator,
+                                              self.backend.read_only, self.snapshot, load=False,
+                                              versioned=tables[t_name].name.lower() in self.versioned, search=self.search)
+        if self.prebuild:
+            QTimer.singleShot(0, self.prebuild_next)
+
+    # 第一次画出主窗口时记下启动耗时
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.first_frame:
+            self.first_frame = True
+            self.recorder.startup("主窗口:首帧", (time.perf_counter() - self.start_t) * 1000)
+
+    # 设置背景图：图片只解码一次，缩放好的图留着，窗口大小变了才重新缩放
+    def set_bg(self, img_path):
+        self.bg_size = None  # 当前背景图是按哪个窗口大小缩放的
+        self.bg_timer = QTimer(self)  # 拖动改变大小时等停下来再缩放，不是每一步都缩放一次
+        self.bg_timer.setSingleShot(True)
+        self.bg_timer.setInterval(100)
+        self.bg_timer.timeout.connect(self.apply_bg)
+        #  加载背景图片文件，hospital_bg.jpg其实是PNG，按文件内容判断格式，不先按扩展名当JPEG解一遍
+        reader = QImageReader(img_path)
+        reader.setDecideFormatFromContent(True)
+        img = reader.read()
+        if img.isNull():  # 加载失败兜底用浅灰色背景，避免窗口背景空白
+            self.setStyleSheet("background-color: #f0f2f5;")
+            self.statusBar().showMessage(f"背景图加载失败：{reader.errorString()}")
+            return
+        self.bg_src = QPixmap.fromImage(img)
+        self.apply_bg()
+
+    # 缩放背景图适配窗口大小，保持宽高比，放大到覆盖窗口，平滑缩放；大小没变就不用重新缩放
+    def apply_bg(self):
+        if self.bg_src is None or self.bg_size == self.size():
+            return
+        self.bg_size = self.size()
+        pix = self.bg_src.scaled(self.bg_size, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
+        pal = QPalette()
+        pal.setBrush(QPalette.Background, QBrush(pix))  # 创建调色板，把图片设为窗口背景
+        self.setPalette(pal)  # 应用调色板到主窗口
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.bg_src is not None:
+            self.bg_timer.start()
+
+    # 打开子窗口，主窗口点击按钮时，调用这个函数打开对应的TableWin子窗口
+    # 每张表只有一个窗口：开着的提到最前面，关过的（或提前建好的）直接复用，不再重新建界面、重新加载
+    def open_table(self, t_name):
+        if not self.ready:
+            QMessageBox.warning(self, "提示", "数据库未连接！")
+            return
+        t0 = time.perf_counter()
+        try:
+            table_win = self.win_cache.get(t_name)
+            if table_win is not None and table_win.isVisible():
+                if table_win.isMinimized():
+                    table_win.showNormal()
+                table_win.raise_()
+                table_win.activateWindow()
+                return
+            if table_win is None:
+                table_win = TableWin(t_name, self.exe, self.cache, self.validator, self.backend.read_only,
+                                     self.snapshot, versioned=tables[t_name].name.lower() in self.versioned, search=self.search)
+                self.win_cache[t_name] = table_win
+            else:
+                table_win.reuse()
+            table_win.open_t0 = t0
+            table_win.show()
+        except Exception as e:  # 失败保底
+            QMessageBox.warning(self, "错误", f"打开失败：{str(e)}")
+
+    # 打开数据统计窗口，和表窗口一样保留引用
+    def open_stats(self):
+        if not self.ready:
+            QMessageBox.warning(self, "提示", "数据库未连接！")
+            return
+        try:
+            self.table_wins = [w for w in self.table_wins if w.isVisible()]
+            stats_win = StatsWin(self.exe, self.cache)
+            stats_win.show()
+            self.table_wins.append(stats_win)
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"打开失败：{str(e)}")
+
+    # 住院费用结算：在后台按科室分区并行计算（见billing.py），连SQL Server时只重算上次结算之后有变化的患者
+    # 执行器的工作线程占一个连接，各科室再从连接池借，所以只用2个线程，不把连接池借空
+    def run_billing(self):
+        if not self.ready:
+            QMessageBox.warning(self, "提示", "数据库未连接！")
+            return
+        self.bill_btn.setEnabled(False)
+        self.statusBar().showMessage("正在结算住院费用…")
+
+        def end():
+            self.bill_btn.setEnabled(True)
+            self.statusBar().clearMessage()
+
+        self.exe.submit(lambda cur: billing.settle(cur, self.pool, workers=2),
+                        lambda res: QMessageBox.information(self, "结算完成", billing.describe(res)),
+                        lambda e: QMessageBox.warning(self, "结算失败", f"错误：{str(e)}"),
+                        channel="billing", on_end=end, op="主窗口:费用结算")
+
+    # 后台同步参照表快照，上一次还没同步完就跳过这次；数据库没加rv列等原因失败时只在状态栏提示
+    def sync_snapshot(self):
+        if self.exe.latest.get("snapshot") in self.exe.running:
+            return
+        self.exe.submit(self.snapshot.sync, on_fail=lambda e: self.statusBar().showMessage(f"参照表同步失败：{e}"),
+                        channel="snapshot")
+
+    # 后台取一次变更通知，上一次还没取完就跳过这次；数据库里没有change_log（DuckDB等）时停止轮询
+    # 参照表有改动时用同一个连接同步本地快照，窗口补出来的科室名、医生姓名就是新的
+    # 取之前记下全文索引的本机写入次数，这些写入已经提交，这次一定能取到
+    def poll_feed(self):
+        if not self.feed.ok:
+            self.feed_timer.stop()
+            return
+        if self.exe.latest.get("feed") in self.exe.running:
+            return
+
+        def job(cur):
+            started = self.feed.mark is not None
+            seen = self.search.marks()
+            changes = self.feed.poll(cur)
+            if not started or not self.feed.ok:  # 第一次只记下版本号，之前建的索引不知道漏了哪些改动
+                self.search.reset()
+                return None
+            refs = [t for t in self.snapshot.tables if t in changes] if self.snapshot else []
+            if refs:
+                try:
+                    self.snapshot.sync(cur, refs)
+                except Exception:
+                    cur.connection.rollback()  # 等下次定时同步
+            return changes, seen
+
+        self.exe.submit(job, self.feed_changed, lambda e: self.statusBar().showMessage(f"变更通知失败：{e}"),
+                        channel="feed", op="主窗口:变更通知")
+
+    # 有改动时作废读过这些表的缓存，再交给各表窗口更新自己显示的行
+    def feed_changed(self, res):
+        if res is None:
+            return
+        changes, seen = res
+        self.refresh_index(changes, seen)
+        if not changes:
+            return
+        for t in changes:
+            self.cache.invalidate(t)
+        for win in self.win_cache.values():
+            win.apply_changes(changes)
+
+    # 全文索引跟上改动：有改动的表在后台只重读改过的行，没有改动的表确认索引还是新的
+    def refresh_index(self, changes, seen):
+        for t in self.search.built():
+            if t in changes:
+                self.search.queue(t)
+                self.exe.submit(lambda cur, t=t: self.search.refresh(cur, t, changes[t], seen[t]),
+                                op="主窗口:更新全文索引")
+            else:
+                self.search.confirm(t, seen[t])
+
+    # 打开运行诊断窗口
+    def open_diag(self):
+        if not self.recorder:
+            QMessageBox.warning(self, "提示", "数据库未连接！")
+            return
+        self.table_wins = [w for w in self.table_wins if w.isVisible()]
+        diag_win = DiagWin(self.recorder)
+        diag_win.show()
+        self.table_wins.append(diag_win)
+
+    # 关闭时断开连接
+    def closeEvent(self, event):
+        if self.exe:  # 等后台任务结束
+            self.exe.close()
+        if self.pool:  # 若正常打开则关闭连接池里的所有连接
+            self.pool.close()
+        event.accept()
+
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)  # 初始化Qt应用程序
+    win = MainWin(launch_t)  # 创建主窗口实例
+    win.show()  # 显示主窗口
     sys.exit(app.exec_())  # 启动应用事件循环，等待用户操作
\ No newline at end of file
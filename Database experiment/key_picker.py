@@ -0,0 +1,166 @@
+import time
+from bisect import bisect_left, insort
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+from PyQt5.QtWidgets import QLineEdit, QCompleter
+
+# 外键输入框：主治医师编号、所属病房号、部门编号、用药表的药品编号/患者编号
+# 原来是普通输入框，只能靠记忆输编号，输错了要提交到数据库才知道外键不存在
+# 现在输入时弹出候选（编号或名称开头匹配的“编号  名称”），选中后只填编号；
+# 候选来自被参照表的(编号, 名称)列表，按编号、名称各排一次序，输入前缀用二分查找定位，几万条也是瞬间出结果
+# 列表在打开窗口时加载一次：参照表快照里有的直接从快照取，没有的（患者表）后台查一次；
+# 之后主窗口的变更通知说被参照表哪几行改了，就只重查这几行放进列表（见TableWin.refresh_pickers），
+# 快照同步到新数据时重建，超过有效期后只补查编号比列表里最大的还大的行，不再重查整张表
+# 填了列表里没有的编号标成橙色；列表可能还没跟上别的终端刚加的数据，所以不直接拦下，新增/修改时由后台的Validator到数据库确认
+
+
+def fold(v):
+    return str(v).rstrip().casefold() if v is not None else ""
+
+
+# 前缀索引：keys/names都是排好序的折叠后文本，二分找到第一个不小于前缀的位置，往后取到不再匹配为止
+# 变更通知改了几行时用put/remove在原来的列表里二分插入、删除，不用整个重新排序
+class PrefixIndex:
+    def __init__(self, items=()):
+        self.items = {}  # 折叠后的编号 -> (编号, 名称)
+        for k, n in items:
+            k, n = str(k).rstrip(), str(n).rstrip() if n is not None else ""
+            self.items[fold(k)] = (k, n)
+        self.keys = sorted(self.items)
+        self.names = sorted((fold(n), k) for k, (_, n) in self.items.items() if n)  # (折叠后的名称, 折叠后的编号)
+
+    def __len__(self):
+        return len(self.items)
+
+    def has(self, key):
+        return fold(key) in self.items
+
+    # 列表里最大的编号，过期后只补查比它大的
+    def last(self):
+        return self.items[self.keys[-1]][0] if self.keys else None
+
+    # 新增或者修改一项
+    def put(self, key, name):
+        self.remove(key)
+        key, name = str(key).rstrip(), str(name).rstrip() if name is not None else ""
+        k = fold(key)
+        self.items[k] = (key, name)
+        insort(self.keys, k)
+        if name:
+            insort(self.names, (fold(name), k))
+
+    def remove(self, key):
+        k = fold(key)
+        it = self.items.pop(k, None)
+        if it is None:
+            return
+        del self.keys[bisect_left(self.keys, k)]
+        if it[1]:
+            del self.names[bisect_left(self.names, (fold(it[1]), k))]
+
+    # 编号以text开头的排在前面，其次是名称以text开头的，最多limit条
+    def match(self, text, limit=50):
+        t = fold(text)
+        out = []
+        i = bisect_left(self.keys, t)
+        while i < len(self.keys) and len(out) < limit and self.keys[i].startswith(t):
+            out.append(self.items[self.keys[i]])
+            i += 1
+        if not t:
+            return out
+        seen = {k for k, _ in out}
+        i = bisect_left(self.names, (t,))
+        while i < len(self.names) and len(out) < limit and self.names[i][0].startswith(t):
+            it = self.items[self.names[i][1]]
+            if it[0] not in seen:
+                out.append(it)
+            i += 1
+        return out
+
+
+# 候选列表的数据模型：弹出框里显示“编号  名称”，选中后填进输入框的是编号（EditRole）
+class KeyModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.items = []
+
+    def set_items(self, items):
+        self.beginResetModel()
+        self.items = items
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        k, n = self.items[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{k}  {n}" if n else k
+        if role == Qt.EditRole:
+            return k
+        return None
+
+
+class KeyPicker(QLineEdit):
+    ttl = 120  # 从数据库查来的列表多少秒后过期，过期后补查新加的行
+
+    # ref为被参照表名；loader()在需要(重新)加载列表时调用，由窗口决定从快照取还是查数据库
+    def __init__(self, ref, loader=None, parent=None):
+        super().__init__(parent)
+        self.ref = ref
+        self.loader = loader
+        self.index = None  # 还没加载好时为None，不做存在性检查
+        self.loaded_at = 0.0
+        self.gen = None  # 从快照建的列表对应的快照版本
+        self.loading = False  # 后台正在查列表，不重复提交
+        self.model = KeyModel(self)
+        self.comp = QCompleter(self.model, self)
+        self.comp.setCompletionMode(QCompleter.UnfilteredPopupCompletion)  # 筛选由PrefixIndex做
+        self.comp.setMaxVisibleItems(12)
+        self.setCompleter(self.comp)
+        self.textEdited.connect(self.on_edited)
+        self.editingFinished.connect(self.check)
+        self.setPlaceholderText("输入编号或名称查找")
+
+    def set_index(self, index, gen=None):
+        self.index = index
+        self.gen = gen
+        self.loaded_at = time.monotonic()
+        self.check()
+
+    # 变更通知改了几行：rows为重查到的[(编号, 名称)]，gone为查不到（被删了）的编号
+    def apply(self, rows, gone=()):
+        if self.index is None:
+            return
+        for k in gone:
+            self.index.remove(k)
+        for k, n in rows:
+            self.index.put(k, n)
+        self.check()
+
+    def stale(self):
+        return self.index is None or (self.gen is None and time.monotonic() - self.loaded_at > self.ttl)
+
+    def focusInEvent(self, event):
+        if self.loader:
+            self.loader(self)
+        super().focusInEvent(event)
+
+    def on_edited(self, text):
+        if self.index is None:
+            return
+        self.model.set_items(self.index.match(text))
+        if self.model.items:
+            self.comp.complete()
+
+    # 填的值在不在列表里；列表没加载好或者没填时算作在，不在的不一定不存在，要到数据库确认
+    def valid(self):
+        v = self.text().strip()
+        return not v or self.index is None or self.index.has(v)
+
+    def check(self):
+        ok = self.valid()
+        self.setStyleSheet("" if ok else "QLineEdit {border: 2px solid #e67e22;}")
+        self.setToolTip("" if ok else f"候选列表里没有{self.text().strip()}，保存时到数据库确认")
+        return ok
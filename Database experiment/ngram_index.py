@@ -0,0 +1,241 @@
+import time
+import threading
+from array import array
+from table_registry import by_tname
+from snapshot import key_of
+
+# 本地全文索引：患者姓名、疾病种类、医生姓名、药品名称的“包含”查询在本机回答
+# 原来“包含”是LIKE '%值%'，开头是通配符用不上索引，每次都全表扫描，char(n)列尾部补的空格也要一起比较
+# 现在给这几列建二元组（相邻两个字）倒排索引：每个二元组对应一个array('I')，按顺序存包含它的行号，
+# 查“肺炎”先取二元组最少的那个列表，再逐行确认确实包含整个词；单个字也建了列表，查一个字（比如姓“王”）直接取它的列表，
+# 多个词用空格分开时每个词都要包含；查出主键后窗口只按主键到数据库取当前页（见Pager.set_keys）
+# 行号只增不减：新增的行接在后面，修改过的行作废旧行号、换个新行号，所以每个列表一直是有序的，
+# 作废的行号过多时整个重建一次（compact）
+# 索引的数据：没有关联的参照表（药品）从参照表快照取，患者表、医生表后台查一次，查的时候带上关联查询的INNER JOIN
+# （TableInfo.inner_from），关联不上的行（比如主治医师编号为空的患者）窗口里查不出来，也不放进索引，
+# 否则按索引分页时这些主键占了位置，一页显示不满；
+# 之后本机的增删改（tables_changed）先把索引标成过期，主窗口的变更通知（change_feed.py）取到改动后只重读改过的行，
+# 重读完才算是新的；变更通知停了（DuckDB等）或者超过有效期，窗口的查询照常走数据库，同时在后台重建索引
+
+
+def fold(v):
+    return str(v).rstrip().casefold() if v is not None else ""
+
+
+def grams(text):
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+# 建索引用：二元组加上单个字
+def index_grams(text):
+    return grams(text) | set(text)
+
+
+# 一张表的索引：cols为要索引的字段，rows为[(主键, 各字段的值)]
+class NgramIndex:
+    def __init__(self, cols, rows=()):
+        self.cols = tuple(cols)
+        self.col_pos = {c: i for i, c in enumerate(self.cols)}
+        self.keys = []  # 行号 -> 主键，作废的行为None
+        self.ids = {}  # 主键 -> 行号
+        self.texts = [[] for _ in self.cols]  # 每个字段：行号 -> 折叠后的文本，作废的行为空串
+        self.post = [{} for _ in self.cols]  # 每个字段：二元组（和单个字） -> array('I')行号列表
+        self.dead = 0
+        for key, vals in rows:
+            self.put(key, vals)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # 新增或者修改一行；文本没变就不动
+    def put(self, key, vals):
+        vals = [fold(v) for v in vals]
+        old = self.ids.get(key)
+        if old is not None:
+            if all(t[old] == v for t, v in zip(self.texts, vals)):
+                return
+            self.remove(key)
+        i = len(self.keys)
+        self.keys.append(key)
+        self.ids[key] = i
+        for texts, post, v in zip(self.texts, self.post, vals):
+            texts.append(v)
+            for g in index_grams(v):
+                arr = post.get(g)
+                if arr is None:
+                    post[g] = array("I", (i,))
+                else:
+                    arr.append(i)
+
+    def remove(self, key):
+        i = self.ids.pop(key, None)
+        if i is None:
+            return
+        self.keys[i] = None
+        for texts in self.texts:
+            texts[i] = ""
+        self.dead += 1
+        if self.dead > 1000 and self.dead * 2 > len(self.keys):
+            self.compact()
+
+    # 去掉作废的行号，重新编号
+    def compact(self):
+        rows = [(k, [t[i] for t in self.texts]) for i, k in enumerate(self.keys) if k is not None]
+        self.__init__(self.cols, rows)
+
+    # 某个字段包含term的行号集合
+    def find(self, col, term):
+        c = self.col_pos[col]
+        term = fold(term)
+        texts = self.texts[c]
+        if len(term) < 2:  # 单个字的列表就是结果，只要去掉作废的行
+            return {i for i in self.post[c].get(term, ()) if texts[i]}
+        lists = [self.post[c].get(g) for g in grams(term)]
+        if any(a is None for a in lists):
+            return set()
+        return {i for i in min(lists, key=len) if term in texts[i]}
+
+    # conds为[(字段, [词, ...])]，每个条件要求字段包含全部的词，条件之间按join（AND/OR）组合，
+    # 返回排好序的主键列表
+    def match(self, conds, join="AND"):
+        found = None
+        for col, terms in conds:
+            ids = None
+            for term in terms:
+                ids = self.find(col, term) if ids is None else ids & self.find(col, term)
+                if not ids:
+                    break
+            ids = ids or set()
+            if found is None:
+                found = ids
+            else:
+                found = found & ids if join == "AND" else found | ids
+        return sorted(self.keys[i] for i in found or ())
+
+
+# 所有表的索引，主窗口建一个，所有表窗口共用
+class TextSearch:
+    ttl = 120  # 多少秒没有确认过是新的就算过期（变更通知正常时每次轮询都会确认）
+
+    def __init__(self, snapshot=None):
+        self.snapshot = snapshot
+        self.infos = {t: info for t, info in by_tname.items() if info.search}
+        self.indexes = {}  # 表名 -> NgramIndex
+        self.dirty = {t: 0 for t in self.infos}  # 本机写过几次这张表
+        self.clean = {t: 0 for t in self.infos}  # 索引已经包含了前几次写入
+        self.synced_at = {t: 0.0 for t in self.infos}  # 最后一次确认索引是新的的时间
+        self.pending = {t: 0 for t in self.infos}  # 已经提交、还没执行完的重读任务数
+        self.epoch = 0  # 变更通知重新开始时加一，之前开始建的索引作废
+        self.lock = threading.Lock()  # 改索引和查索引
+        self.work = threading.Lock()  # 同一时间只有一个建索引/重读任务，先提交的先写进索引
+
+    def has(self, tname):
+        return tname.lower() in self.infos
+
+    # 本机写了这张表（工作线程里调用），变更通知取到这次改动之前索引算过期
+    def touch(self, tname):
+        t = tname.lower()
+        if t in self.infos:
+            with self.lock:
+                self.dirty[t] += 1
+
+    # 当前各表的写入次数，变更通知开始取改动前记下
+    def marks(self):
+        with self.lock:
+            return dict(self.dirty)
+
+    # 变更通知从头开始了，之前的索引不知道漏了哪些改动，全部作废
+    def reset(self):
+        with self.lock:
+            self.epoch += 1
+            self.indexes = {}
+
+    def built(self):
+        return list(self.indexes)
+
+    def fresh(self, t):
+        with self.lock:
+            return self.is_fresh(t)
+
+    def is_fresh(self, t):
+        return (t in self.indexes and self.dirty[t] == self.clean[t] and not self.pending[t]
+                and time.monotonic() - self.synced_at[t] < self.ttl)
+
+    # 提交重读任务前调用，任务执行完之前索引算过期
+    def queue(self, t):
+        with self.lock:
+            self.pending[t] += 1
+
+    # 变更通知这次没有这张表的改动：seen之前的本机写入都已经包含在索引里
+    def confirm(self, t, seen):
+        with self.lock:
+            if t in self.indexes:
+                self.clean[t] = max(self.clean[t], seen)
+                self.synced_at[t] = time.monotonic()
+
+    # 按主键取索引字段的值：参照表快照里有、而且本表没有INNER JOIN的从快照取，否则查数据库，keys为None时取整张表
+    def load_rows(self, cur, t, keys=None):
+        info = self.infos[t]
+        snap = self.snapshot
+        if snap and snap.ready and t in snap.rows and info.inner_from == info.name:
+            idx = [snap.col_idx[t][c] for c in (info.pk[0],) + info.search]
+            recs = snap.table(t) if keys is None else [r for r in (snap.get(t, k[0]) for k in keys) if r]
+            return [((key_of(r[idx[0]]),), [r[i] for i in idx[1:]]) for r in recs]
+        a = f"{info.alias}." if info.alias else ""
+        sql = f"SELECT {', '.join(a + c for c in info.pk + info.search)} FROM {info.inner_from}"
+        n = len(info.pk)
+        if keys is None:
+            cur.execute(sql)
+            out = [(tuple(key_of(v) for v in r[:n]), r[n:]) for r in cur.fetchall()]
+        else:
+            out = []
+            keys = list(keys)
+            for i in range(0, len(keys), 1000):
+                part = keys[i:i + 1000]
+                cur.execute(f"{sql} WHERE {info.page_keys[0]} IN ({', '.join(['?'] * len(part))})", [k[0] for k in part])
+                out += [(tuple(key_of(v) for v in r[:n]), r[n:]) for r in cur.fetchall()]
+        cur.connection.rollback()  # 只读，结束事务
+        return out
+
+    # 建一张表的索引（工作线程里执行）
+    def build(self, cur, t):
+        with self.work:
+            with self.lock:
+                seen, epoch = self.dirty[t], self.epoch
+            idx = NgramIndex(self.infos[t].search, self.load_rows(cur, t))
+            with self.lock:
+                if epoch == self.epoch:
+                    self.indexes[t] = idx
+                    self.clean[t] = max(self.clean[t], seen)
+                    self.synced_at[t] = time.monotonic()
+            return len(idx)
+
+    # 变更通知说这几行改过了（工作线程里执行）：重读这几行更新索引，keys为None时整个重建
+    def refresh(self, cur, t, keys, seen):
+        try:
+            return self.build(cur, t) if keys is None else self.reread(cur, t, keys, seen)
+        finally:
+            with self.lock:
+                self.pending[t] -= 1
+
+    def reread(self, cur, t, keys, seen):
+        with self.work:
+            rows = self.load_rows(cur, t, keys)
+            with self.lock:
+                idx = self.indexes.get(t)
+                if idx is None:
+                    return 0
+                for k in set(keys) - {k for k, _ in rows}:
+                    idx.remove(k)
+                for k, vals in rows:
+                    idx.put(k, vals)
+                self.clean[t] = max(self.clean[t], seen)
+                self.synced_at[t] = time.monotonic()
+            return len(rows)
+
+    # 查询：conds和join同NgramIndex.match，索引没建好或者过期了返回None
+    def match(self, t, conds, join="AND"):
+        with self.lock:
+            if not self.is_fresh(t):
+                return None
+            return self.indexes[t].match(conds, join)
@@ -0,0 +1,96 @@
+# 分页查询，打开表时只取一页数据，而不是SELECT *把整张表读回来
+# 顺序翻页用键集分页：记住上一页最后一行的主键，下一页用 WHERE 主键 > ? 接着取，
+# 走主键索引直接定位，不管翻到第几页代价都一样；
+# 跳到没有经过的页时才用 OFFSET 跳过前面的行
+# 本地全文索引已经查出了全部符合条件的主键时（set_keys），每页直接按这一页的主键取，总数也不用再统计
+class Pager:
+    def __init__(self, base_sql, key_cols, key_idx, page_size=200):
+        self.base_sql = base_sql  # 不带WHERE和ORDER BY的查询语句
+        self.key_cols = list(key_cols)  # 排序和键集比较用的主键列（关联查询要带表别名）
+        self.key_idx = list(key_idx)  # 主键列在结果行中的下标，用来取每页最后一行的主键
+        self.page_size = page_size
+        self.set_filter()
+
+    # 设置查询条件（不带WHERE），条件变了就回到第一页，总数也要重新统计
+    def set_filter(self, cond="", params=()):
+        self.cond = cond
+        self.params = list(params)
+        self.page = 1
+        self.after = {1: None}  # 页号 -> 该页起点（上一页最后一行的主键），第一页没有起点
+        self.total = None  # 总行数，只有用户点了统计才查询
+        self.keys = None  # 本地索引查出的主键列表（排好序），None表示按条件查询
+
+    # 按本地索引查出的主键列表分页，条件照样带上（先调用set_filter），数据库按主键只取这一页的行
+    def set_keys(self, keys):
+        self.keys = list(keys)
+        self.total = len(self.keys)
+
+    # 生成取第page页的SQL和参数，多取一行用来判断后面还有没有下一页
+    def page_sql(self, page):
+        if self.keys is not None:
+            sql, params = self.rows_sql(self.keys[(page - 1) * self.page_size:page * self.page_size + 1])
+            return f"{sql} ORDER BY {', '.join(self.key_cols)}", params
+        conds = []
+        params = []
+        if self.cond:
+            conds.append(f"({self.cond})")
+            params += self.params
+        offset = 0
+        if page in self.after:  # 知道起点就用键集分页
+            key = self.after[page]
+            if key is not None:
+                key_cond, key_params = self.key_cond(key)
+                conds.append(key_cond)
+                params += key_params
+        else:  # 直接跳页，只能用OFFSET
+            offset = (page - 1) * self.page_size
+        where = f" WHERE {' AND '.join(conds)}" if conds else ""
+        order = ", ".join(self.key_cols)
+        sql = (f"{self.base_sql}{where} ORDER BY {order} "
+               f"OFFSET {offset} ROWS FETCH NEXT {self.page_size + 1} ROWS ONLY")
+        return sql, params
+
+    # 主键大于起点的条件，联合主键按字典序比较：(a > ?) OR (a = ? AND b > ?)
+    def key_cond(self, key):
+        parts = []
+        params = []
+        for i, col in enumerate(self.key_cols):
+            eqs = [f"{c} = ?" for c in self.key_cols[:i]]
+            parts.append("(" + " AND ".join(eqs + [f"{col} > ?"]) + ")")
+            params += list(key[:i]) + [key[i]]
+        return "(" + " OR ".join(parts) + ")", params
+
+    # 一页加载完后记下当前页号，并把最后一行的主键作为下一页的起点
+    def page_loaded(self, page, rows):
+        self.page = page
+        if rows:
+            self.after[page + 1] = tuple(rows[-1][i] for i in self.key_idx)
+
+    # 当前条件下按主键取几行，keys为主键值的元组列表，变更通知只重查改过的行时用
+    def rows_sql(self, keys):
+        if not keys:
+            key_cond = "1 = 0"
+        elif len(self.key_cols) == 1:
+            key_cond = f"{self.key_cols[0]} IN ({', '.join(['?'] * len(keys))})"
+        else:
+            one = "(" + " AND ".join(f"{c} = ?" for c in self.key_cols) + ")"
+            key_cond = " OR ".join([one] * len(keys))
+        conds = ([f"({self.cond})"] if self.cond else []) + [f"({key_cond})"]
+        return f"{self.base_sql} WHERE {' AND '.join(conds)}", list(self.params) + [v for k in keys for v in k]
+
+    # 当前条件下的全部数据（不分页），导出用，按主键排序保证导出顺序和翻页一致
+    # base_sql可以换成别的查询（比如翻页只查本表、导出要完整的关联查询），条件和排序不变
+    def export_sql(self, base_sql=None):
+        where = f" WHERE {self.cond}" if self.cond else ""
+        return f"{base_sql or self.base_sql}{where} ORDER BY {', '.join(self.key_cols)}", list(self.params)
+
+    # 统计当前条件下的总行数，只在需要时执行
+    def count_sql(self):
+        where = f" WHERE {self.cond}" if self.cond else ""
+        return f"SELECT COUNT(*) FROM ({self.base_sql}{where}) cnt", list(self.params)
+
+    # 总页数，没统计过总数时返回None
+    def page_count(self):
+        if self.total is None:
+            return None
+        return max(1, (self.total + self.page_size - 1) // self.page_size)
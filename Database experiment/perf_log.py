@@ -0,0 +1,208 @@
+import re
+import json
+import time
+import datetime
+import threading
+from collections import deque
+
+# 运行耗时记录：每条SQL的执行时间、取数时间、行数，每次刷新表格的耗时
+# 原来加载慢、增删改慢都看不出慢在哪，出错也只弹一个窗口，关掉就没了
+# 执行器给每个任务的游标套一层TracedCursor，execute/fetch自动计时，界面把结果放进表格时再记一次显示耗时，
+# 同一个操作（比如“患者表:show_page”）的SQL和显示记录排在一起，一看就知道是四表关联慢还是表格显示慢
+# 参数只记类型和长度（脱敏），不记患者姓名之类的具体值
+# 超过慢查询阈值的记录追加写到慢查询日志（一行一个JSON），诊断窗口可以查看和导出全部记录
+
+# SQL指纹：字符串、数字换成?，连续空白合成一个，同一类语句不同取值算同一个指纹
+str_re = re.compile(r"'(?:[^']|'')*'")
+num_re = re.compile(r"\b\d+(?:\.\d+)?\b")
+in_re = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+space_re = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    sql = str_re.sub("?", sql)
+    sql = num_re.sub("?", sql)
+    sql = in_re.sub("(?...)", sql)
+    return space_re.sub(" ", sql).strip()
+
+
+# 参数脱敏：只保留类型和字符串长度，比如['张三', 20, None] -> ['str(2)', 'int', 'NULL']
+def redact(params):
+    if params is None:
+        return []
+    if not isinstance(params, (list, tuple)):
+        params = [params]
+    out = []
+    for p in params:
+        if p is None:
+            out.append("NULL")
+        elif isinstance(p, str):
+            out.append(f"str({len(p)})")
+        else:
+            out.append(type(p).__name__)
+    return out
+
+
+# 从任务函数推出操作名，比如TableWin.show_page.<locals>.job -> show_page
+def job_name(job):
+    name = getattr(job, "__qualname__", "") or getattr(job, "__name__", "")
+    return name.split(".<locals>")[0].split(".")[-1] or "job"
+
+
+class Recorder:
+    # keep：内存里保留最近多少条记录，slow_ms：慢查询阈值（毫秒），slow_path：慢查询日志文件，None不写文件
+    def __init__(self, keep=2000, slow_ms=500, slow_path="slow_query.log"):
+        self.recs = deque(maxlen=keep)
+        self.slow_ms = slow_ms
+        self.slow_path = slow_path
+        self.slow_count = 0
+        self.lock = threading.Lock()
+
+    # 记下一条记录，工作线程和界面线程都会调用
+    def add(self, rec):
+        rec["time"] = datetime.datetime.now().isoformat(timespec="milliseconds")
+        rec["total_ms"] = round(rec.get("exec_ms", 0) + rec.get("fetch_ms", 0) + rec.get("render_ms", 0)
+                                + rec.get("wait_ms", 0), 2)
+        rec["slow"] = rec["total_ms"] >= self.slow_ms
+        with self.lock:
+            self.recs.append(rec)
+            if rec["slow"]:
+                self.slow_count += 1
+                if self.slow_path:
+                    try:
+                        with open(self.slow_path, "a", encoding="utf-8") as f:
+                            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                    except OSError:
+                        pass  # 日志写不进去不影响正常使用
+
+    # 表格显示的耗时，op和对应查询的操作名一致
+    def render(self, op, rows, ms):
+        self.add({"kind": "render", "op": op, "sql": "", "params": [], "rows": rows, "render_ms": round(ms, 2)})
+
+    # 启动、打开窗口这类界面上的等待时间（从开始到第一次画出来）
+    def startup(self, op, ms):
+        self.add({"kind": "startup", "op": op, "sql": "", "params": [], "rows": 0, "wait_ms": round(ms, 2)})
+
+    def records(self):
+        with self.lock:
+            return list(self.recs)
+
+    def clear(self):
+        with self.lock:
+            self.recs.clear()
+            self.slow_count = 0
+
+    # 按指纹汇总：[(操作, 类型, 指纹, 次数, 总耗时, 平均耗时, 最大耗时, 总行数)]，总耗时从大到小
+    def summary(self):
+        groups = {}
+        for r in self.records():
+            g = groups.setdefault((r["op"], r["kind"], r["sql"]), [0, 0.0, 0.0, 0])
+            g[0] += 1
+            g[1] += r["total_ms"]
+            g[2] = max(g[2], r["total_ms"])
+            g[3] += r.get("rows") or 0
+        out = [(op, kind, sql, n, total, total / n, mx, rows)
+               for (op, kind, sql), (n, total, mx, rows) in groups.items()]
+        out.sort(key=lambda g: g[4], reverse=True)
+        return out
+
+    # 导出全部记录，一行一个JSON，返回导出条数
+    def export(self, path):
+        recs = self.records()
+        with open(path, "w", encoding="utf-8") as f:
+            for r in recs:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        return len(recs)
+
+
+# 给游标计时的包装，其他属性和方法原样转给真正的游标
+# 一条语句从execute开始，之后的fetch都算到它头上，到下一次execute或关闭游标时记下来
+class TracedCursor:
+    def __init__(self, cur, recorder, op=""):
+        object.__setattr__(self, "_cur", cur)
+        object.__setattr__(self, "_rec", recorder)
+        object.__setattr__(self, "_op", op)
+        object.__setattr__(self, "_cur_rec", None)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    # fast_executemany之类的设置要设到真正的游标上
+    def __setattr__(self, name, value):
+        setattr(self._cur, name, value)
+
+    def _start(self, kind, sql, params, rows=0):
+        self._end()
+        rec = {"kind": kind, "op": self._op, "sql": fingerprint(sql), "params": params,
+               "rows": rows, "exec_ms": 0.0, "fetch_ms": 0.0}
+        object.__setattr__(self, "_cur_rec", rec)
+        return rec
+
+    # 记下当前语句；写操作没有取数，行数用rowcount
+    def _end(self):
+        rec = self._cur_rec
+        if rec is None:
+            return
+        object.__setattr__(self, "_cur_rec", None)
+        if rec["kind"] == "execute" and not rec["rows"]:
+            try:
+                rc = self._cur.rowcount
+                rec["rows"] = rc if rc and rc > 0 else 0
+            except Exception:
+                pass
+        rec["exec_ms"] = round(rec["exec_ms"], 2)
+        rec["fetch_ms"] = round(rec["fetch_ms"], 2)
+        self._rec.add(rec)
+
+    def execute(self, sql, *params):
+        ps = params[0] if len(params) == 1 and isinstance(params[0], (list, tuple)) else list(params)
+        rec = self._start("execute", sql, redact(ps))
+        t0 = time.perf_counter()
+        try:
+            self._cur.execute(sql, *params)
+        except Exception as e:
+            rec["error"] = str(e)
+            raise
+        finally:
+            rec["exec_ms"] += (time.perf_counter() - t0) * 1000
+        return self
+
+    def executemany(self, sql, seq):
+        seq = list(seq)
+        rec = self._start("executemany", sql, redact(seq[0]) if seq else [], len(seq))
+        t0 = time.perf_counter()
+        try:
+            self._cur.executemany(sql, seq)
+        except Exception as e:
+            rec["error"] = str(e)
+            raise
+        finally:
+            rec["exec_ms"] += (time.perf_counter() - t0) * 1000
+
+    def _fetch(self, fn, *args):
+        t0 = time.perf_counter()
+        res = fn(*args)
+        rec = self._cur_rec
+        if rec is not None:
+            rec["fetch_ms"] += (time.perf_counter() - t0) * 1000
+            if isinstance(res, list):
+                rec["rows"] += len(res)
+            elif res is not None:
+                rec["rows"] += 1
+        return res
+
+    def fetchone(self):
+        return self._fetch(self._cur.fetchone)
+
+    def fetchmany(self, *args):
+        return self._fetch(self._cur.fetchmany, *args)
+
+    def fetchall(self):
+        return self._fetch(self._cur.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._end()
+        self._cur.close()
@@ -0,0 +1,95 @@
+# 组合查询条件生成，替换原来只能 WHERE 字段 LIKE '%值%' 的单字段模糊查询
+# LIKE '%值%' 开头是通配符，用不上索引，每次都是全表扫描；
+# 这里按匹配方式生成能走索引的条件：
+#   精确：字段 = ?
+#   前缀：字段 LIKE '值%'（通配符只在末尾，可以走索引）
+#   范围：字段 >= ? AND 字段 <= ?（日期、年龄、价格等）
+#   包含：字段 LIKE '%值%'（保留原来的模糊查询，走不了索引），值里用空格分开的多个词每个都要包含；
+#         建了本地全文索引的字段在本机回答，见ngram_index.py
+# 多个条件可以用AND或者OR组合，生成的都是参数化SQL
+
+# 界面上显示的匹配方式
+modes = ["包含", "精确", "前缀", "范围"]
+
+
+# 查询值不合法时抛出，界面弹窗提示
+class CondError(Exception):
+    pass
+
+
+# 一个查询条件：col是SQL里的字段（关联表要带别名），kind是字段类型：text/int/date/sex
+class Cond:
+    def __init__(self, col, cn, kind, mode, val, val2=""):
+        self.col = col
+        self.cn = cn  # 中文字段名，提示信息用
+        self.kind = kind
+        self.mode = mode
+        self.val = val.strip()
+        self.val2 = val2.strip()
+
+    # 描述这个条件，查不到数据时提示用
+    def desc(self):
+        if self.mode == "范围":
+            return f"{self.cn}在{self.val or '…'}~{self.val2 or '…'}之间"
+        if self.mode == "精确":
+            return f"{self.cn}等于{self.val}"
+        if self.mode == "前缀":
+            return f"{self.cn}以{self.val}开头"
+        return f"{self.cn}包含{self.val}"
+
+
+# 按字段类型转换输入值，数字列按数字比较，性别男/女转1/0
+def conv(cond, val):
+    if cond.kind == "int":
+        try:
+            return int(val)
+        except ValueError:
+            raise CondError(f"【{cond.cn}】请输入整数！")
+    if cond.kind == "sex":
+        if val not in ("男", "女"):
+            raise CondError("性别查询请输入“男”或“女”！")
+        return 1 if val == "男" else 0
+    return val
+
+
+# LIKE参数里的通配符要转义，否则输入的%和_会被当成通配符
+def like_escape(val):
+    return val.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("[", "\\[")
+
+
+# 生成单个条件的SQL和参数，值为空的条件跳过返回None
+def cond_sql(cond):
+    col = cond.col
+    if cond.mode == "范围":
+        if not cond.val and not cond.val2:
+            return None
+        parts, params = [], []
+        if cond.val:
+            parts.append(f"{col} >= ?")
+            params.append(conv(cond, cond.val))
+        if cond.val2:
+            parts.append(f"{col} <= ?")
+            params.append(conv(cond, cond.val2))
+        return " AND ".join(parts), params
+    if not cond.val:
+        return None
+    # 数字、性别只能精确匹配或者范围匹配，LIKE没有意义
+    if cond.mode == "精确" or cond.kind in ("int", "sex"):
+        return f"{col} = ?", [conv(cond, cond.val)]
+    if cond.mode == "前缀":
+        return f"{col} LIKE ? ESCAPE '\\'", [like_escape(cond.val) + "%"]
+    terms = cond.val.split()
+    return " AND ".join([f"{col} LIKE ? ESCAPE '\\'"] * len(terms)), [f"%{like_escape(t)}%" for t in terms]
+
+
+# 把多个条件用AND/OR拼起来，返回(不带WHERE的条件SQL, 参数)，没有有效条件时返回("", [])
+def build_where(conds, join="AND"):
+    parts, params = [], []
+    for c in conds:
+        res = cond_sql(c)
+        if res is None:
+            continue
+        sql, ps = res
+        parts.append(f"({sql})")
+        params += ps
+    return f" {join} ".join(parts), params
@@ -0,0 +1,119 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+
+# 查询结果缓存，键是(SQL语句, 参数)，值是查询回来的行
+# 科室、病房、药品这类基本不变的表，重新打开窗口或者清空查询条件时直接用缓存，不用再查SQL Server
+# 每条缓存记下它读了哪些表（从FROM/JOIN里解析），哪张表被增删改了，
+# 所有读过这张表的缓存都作废，医生表/患者表的关联查询也会因为读了doctor、department等表一起作废
+# 缓存条数有上限，超出时淘汰最久没用过的（LRU），每张表可以设置不同的有效期（TTL）
+
+# 各表缓存有效期（秒），不在这里的表用默认有效期
+table_ttl = {
+    "department": 600,
+    "room": 600,
+    "drug": 300,
+    "doctor": 300,
+    "patient": 30,
+    "pd": 30,
+}
+
+# 匹配FROM/JOIN后面的表名
+tname_re = re.compile(r"\b(?:FROM|JOIN)\s+(?:dbo\.)?(\w+)", re.IGNORECASE)
+
+
+# 统计用的索引视图 -> 它汇总的基本表，读视图的缓存在这些表被修改时也要作废
+view_deps = {
+    "v_room_load": {"patient"},
+    "v_doctor_load": {"patient"},
+    "v_daily_adm": {"patient"},
+    "v_drug_usage": {"pd", "drug"},
+}
+
+
+# 解析SQL读了哪些表，统一转小写，读了视图的话换成视图依赖的基本表
+def tables_of(sql):
+    tables = set()
+    for t in tname_re.findall(sql):
+        t = t.lower()
+        tables |= view_deps.get(t, {t})
+    return tables
+
+
+class QueryCache:
+    def __init__(self, max_entries=200, default_ttl=30, ttl_map=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttl_map = dict(table_ttl if ttl_map is None else ttl_map)
+        self.data = OrderedDict()  # (sql, 参数) -> (结果, 过期时间, 涉及的表)，越靠后越是最近用过的
+        self.lock = threading.Lock()
+        self.version = 0  # 每次有写操作加1，查询开始前记下，结果回来时版本变了就不放进缓存
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # 因为超出上限被淘汰的条数
+        self.expired = 0  # 因为过期被丢弃的条数
+        self.invalidated = 0  # 因为写操作作废的条数
+
+    # 查缓存，没有或已过期返回None
+    def get(self, sql, params=()):
+        key = (sql, tuple(params))
+        with self.lock:
+            item = self.data.get(key)
+            if item is not None and item[1] < time.monotonic():
+                del self.data[key]
+                self.expired += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    # 放入缓存，version是查询开始时的版本号，期间有写操作就丢弃这次结果
+    def put(self, sql, params, res, version=None):
+        tables = tables_of(sql)
+        ttl = min((self.ttl_map.get(t, self.default_ttl) for t in tables), default=self.default_ttl)
+        if ttl <= 0:
+            return
+        if isinstance(res, list):
+            res = [tuple(r) for r in res]
+        key = (sql, tuple(params))
+        with self.lock:
+            if version is not None and version != self.version:
+                return
+            self.data[key] = (res, time.monotonic() + ttl, tables)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    # 某张表被修改后调用，作废所有读过这张表的缓存
+    def invalidate(self, tname):
+        tname = tname.lower()
+        with self.lock:
+            self.version += 1
+            stale = [k for k, v in self.data.items() if tname in v[2]]
+            for k in stale:
+                del self.data[k]
+            self.invalidated += len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.version += 1
+            self.data.clear()
+
+    # 命中统计，用来调整缓存大小和有效期
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "invalidated": self.invalidated,
+            }
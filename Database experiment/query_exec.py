@@ -0,0 +1,134 @@
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from perf_log import TracedCursor, job_name
+
+# 后台查询执行器，把cur.execute放到线程池里执行，界面线程不再被SQL Server卡住
+# pyodbc的连接不能跨线程共用，所以每个任务执行时从连接池借一个连接，执行完再还回去
+# 同一个“通道”（比如某个窗口的翻页/查询）里新任务提交时，旧任务会被取消，旧结果直接丢弃
+# 给了耗时记录器时，每个任务的游标都会计时（见perf_log.py）
+
+
+# 任务里主动抛出的提示信息（比如主键不存在），界面按“提示”弹窗，而不是按数据库错误处理
+class QueryMsg(Exception):
+    pass
+
+
+# 工作线程通过信号把结果送回界面线程，信号对象要在界面线程里创建
+class TaskSignals(QObject):
+    finished = pyqtSignal(int, bool, object)  # 任务号，是否成功，结果或异常
+
+
+# 长任务（导出、导入）在工作线程里报告进度，信号对象同样在界面线程里创建
+class JobProgress(QObject):
+    changed = pyqtSignal(int)
+
+
+# 一次后台任务：从连接池借连接，开游标执行job(cur)，成功返回结果，失败回滚
+class QueryTask(QRunnable):
+    def __init__(self, exe, tid, job, op=None):
+        super().__init__()
+        self.exe = exe
+        self.tid = tid
+        self.job = job
+        self.op = op or job_name(job)  # 操作名，耗时记录里用
+        self.cur = None
+        self.cancelled = False
+        self.signals = TaskSignals()
+
+    def run(self):
+        if self.cancelled:  # 还没开始就被新任务取代了
+            self.signals.finished.emit(self.tid, False, None)
+            return
+        conn = None
+        ok = False
+        try:
+            conn = self.exe.pool.borrow()
+            self.cur = conn.cursor()
+            if self.exe.recorder is not None:
+                self.cur = TracedCursor(self.cur, self.exe.recorder, self.op)
+            res = self.job(self.cur)
+            ok = True
+        except Exception as e:
+            res = e
+        finally:
+            try:
+                if self.cur is not None:
+                    self.cur.close()
+            except Exception:
+                pass
+            self.cur = None
+            # 归还时连接池会回滚没提交的事务，出过错的连接先检查是否还能用
+            self.exe.pool.release(conn, broken=not ok)
+        self.signals.finished.emit(self.tid, ok, res)
+
+    # 取消任务：正在执行的语句通知服务器中止，结果回来后也不会再交给界面
+    def cancel(self):
+        self.cancelled = True
+        cur = self.cur
+        if cur is not None and hasattr(cur, "cancel"):
+            try:
+                cur.cancel()
+            except Exception:
+                pass
+
+
+class QueryExecutor(QObject):
+    def __init__(self, pool, max_threads=4, parent=None, recorder=None):
+        super().__init__(parent)
+        self.pool = pool  # 数据库连接池，每个任务借一个连接
+        self.recorder = recorder  # 耗时记录器，None时不计时
+        self.threads = QThreadPool()
+        self.threads.setMaxThreadCount(max_threads)
+        self.seq = 0  # 任务编号
+        self.running = {}  # 任务号 -> (任务, 通道, 成功回调, 失败回调, 结束回调)
+        self.latest = {}  # 通道 -> 最新的任务号
+
+    # 提交任务，job(cur)在工作线程里执行，on_done(结果)/on_fail(异常)在界面线程里回调
+    # on_end不管成功、失败还是被取消都会调用，用来关闭忙碌提示；op是耗时记录里的操作名，默认取job的函数名
+    def submit(self, job, on_done=None, on_fail=None, channel=None, on_end=None, op=None):
+        self.seq += 1
+        tid = self.seq
+        if channel is not None:  # 同一通道只保留最新的任务，之前的全部取消
+            old = self.latest.get(channel)
+            if old in self.running:
+                self.running[old][0].cancel()
+            self.latest[channel] = tid
+        task = QueryTask(self, tid, job, op)
+        task.signals.finished.connect(self.finish)
+        self.running[tid] = (task, channel, on_done, on_fail, on_end)
+        self.threads.start(task)
+        return tid
+
+    # 任务结束（界面线程），过期任务的结果直接丢掉
+    def finish(self, tid, ok, res):
+        item = self.running.pop(tid, None)
+        if item is None:
+            return
+        task, channel, on_done, on_fail, on_end = item
+        stale = task.cancelled or (channel is not None and self.latest.get(channel) != tid)
+        if channel is not None and self.latest.get(channel) == tid:
+            del self.latest[channel]
+        if on_end:
+            on_end()
+        if stale:
+            return
+        if ok:
+            if on_done:
+                on_done(res)
+        elif on_fail:
+            on_fail(res)
+
+    # 取消某个通道上正在执行的任务
+    def cancel(self, channel):
+        tid = self.latest.get(channel)
+        if tid in self.running:
+            self.running[tid][0].cancel()
+
+    # 是否有任务没执行完
+    def busy(self):
+        return bool(self.running)
+
+    # 程序退出时取消未完成的任务并等待线程结束，连接由连接池统一关闭
+    def close(self):
+        for task, *_ in list(self.running.values()):
+            task.cancel()
+        self.threads.waitForDone(3000)
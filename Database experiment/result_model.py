@@ -0,0 +1,230 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+from PyQt5.QtGui import QColor, QFont
+
+# 结果表格的数据模型，替换原来QTableWidget逐个单元格setItem的做法
+# 原做法：fetchall()一次取全表，再给每个单元格new一个QTableWidgetItem，数据在内存里存两份
+# 现做法：模型只保存游标取回的原始元组，表格需要显示哪一格才去格式化哪一格，
+# 滚动到底部时Qt会自动调用canFetchMore/fetchMore，再用fetchmany分批从游标取下一批数据
+# 表格里直接修改时（见unit_of_work.py），editor决定哪些格子能改、改完的值和格子的颜色
+state_colors = {"new": QColor("#d4edda"), "upd": QColor("#fff3cd"), "del": QColor("#e0e0e0")}
+
+
+class ResultModel(QAbstractTableModel):
+    edit_error = pyqtSignal(str)  # 改的值格式不对，界面弹窗提示
+
+    def __init__(self, parent=None, batch_size=200, max_rows=5000):
+        super().__init__(parent)
+        self.batch_size = batch_size  # 每批从游标取多少行
+        self.max_rows = max_rows  # 内存中最多保留多少行，超过就不再继续取
+        self.headers = []  # 表头（中文字段名）
+        self.rows = []  # 已取回的原始数据行，只存元组不存显示文本
+        self.src = None  # 数据来源游标，取完或达到上限后置空
+        self.sex_cols = set()  # 需要把1/0显示成男/女的列下标
+        self.truncated = False  # 是否因为达到上限而没有取完
+        self.editor = None  # 可以直接修改时为UnitOfWork，None时表格只读
+
+    # 换一批数据：设置新表头和新游标，清空旧数据后先取第一批
+    def reset(self, headers, cur):
+        self.beginResetModel()
+        self.close_src()
+        self.headers = list(headers)
+        self.rows = []
+        self.src = cur
+        self.truncated = False
+        self.sex_cols = {i for i, cn in enumerate(self.headers) if "性别" in cn}
+        self.endResetModel()
+        self.fetchMore(QModelIndex())  # 先取第一批，打开窗口就能看到数据
+
+    # 关闭还没读完的游标，释放服务器端的结果集
+    def close_src(self):
+        if self.src is not None:
+            try:
+                self.src.close()
+            except Exception:
+                pass
+            self.src = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    # 只有表格真正要显示某个单元格时才会调用这里，格式化在这里做
+    # 改过的格子、新增和标记删除的行按editor给的状态上色，标记删除的行加删除线
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        col = index.column()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.fmt(col, row[col]) if col < len(row) else ""
+        if self.editor is not None and role in (Qt.BackgroundRole, Qt.FontRole):
+            st = self.editor.state(row, col)
+            if st and role == Qt.BackgroundRole:
+                return state_colors[st]
+            if st == "del" and role == Qt.FontRole:
+                font = QFont()
+                font.setStrikeOut(True)
+                return font
+        return None
+
+    def flags(self, index):
+        fl = super().flags(index)
+        if self.editor is not None and index.isValid() and self.editor.can_edit(self.rows[index.row()], index.column()):
+            fl |= Qt.ItemIsEditable
+        return fl
+
+    # 双击改完一格，由editor记下修改并换成改完的行
+    def setData(self, index, value, role=Qt.EditRole):
+        if self.editor is None or not index.isValid() or role != Qt.EditRole:
+            return False
+        i = index.row()
+        try:
+            row = self.editor.edit(self.rows[i], index.column(), value)
+        except ValueError as e:
+            self.edit_error.emit(str(e))
+            return False
+        self.rows[i] = row
+        self.dataChanged.emit(self.index(i, 0), self.index(i, self.columnCount() - 1))
+        return True
+
+    # 单元格显示格式：性别1/0转男/女，None显示为空
+    def fmt(self, col, val):
+        if col in self.sex_cols and val is not None:
+            return "男" if val == 1 else "女"
+        return str(val) if val is not None else ""
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section] if section < len(self.headers) else None
+        return str(section + 1)
+
+    # 游标还没读完且没到内存上限，就告诉表格还能继续取
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.src is not None
+
+    # 从游标再取一批追加到末尾
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.src is None:
+            return
+        n = min(self.batch_size, self.max_rows - len(self.rows))
+        try:
+            batch = self.src.fetchmany(n) if n > 0 else []
+        except Exception:
+            batch = []
+            self.close_src()
+        if batch:
+            start = len(self.rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(batch) - 1)
+            self.rows.extend(tuple(r) for r in batch)
+            self.endInsertRows()
+        if len(batch) < n:  # 取到的比要的少，说明游标已读完
+            self.close_src()
+        elif len(self.rows) >= self.max_rows:  # 到达内存上限，剩余数据不再读取
+            try:  # 多读一行看看后面是否还有数据，用来判断是否有下一页
+                self.truncated = self.src.fetchone() is not None
+            except Exception:
+                self.truncated = False
+            self.close_src()
+
+    # 新增/修改/删除成功后只改动受影响的那一行，不再重新加载整页
+    # idx是用来定位行的列下标（一般是主键），vals是这些列的值
+
+    # 按若干列的值找行号，找不到返回-1
+    def find_row(self, idx, vals):
+        want = [norm(v) for v in vals]
+        for i, r in enumerate(self.rows):
+            if [norm(r[j]) for j in idx] == want:
+                return i
+        return -1
+
+    # 整行写入：已存在就替换，不存在就按主键顺序插入；only_existing=True时不插入新行
+    def put_row(self, idx, row, only_existing=False):
+        row = tuple(row)
+        i = self.find_row(idx, [row[j] for j in idx])
+        if i >= 0:
+            self.rows[i] = row
+            self.dataChanged.emit(self.index(i, 0), self.index(i, self.columnCount() - 1))
+            return True
+        if only_existing:
+            return False
+        key = [norm(row[j]) for j in idx]
+        pos = len(self.rows)
+        for j, r in enumerate(self.rows):  # 结果是按主键排序的，插到第一个比它大的行前面
+            if [norm(r[k]) for k in idx] > key:
+                pos = j
+                break
+        self.beginInsertRows(QModelIndex(), pos, pos)
+        self.rows.insert(pos, row)
+        self.endInsertRows()
+        return True
+
+    # 只修改一行里的部分列，changes为{列下标: 新值}，行不在当前页时返回False
+    def patch_row(self, idx, vals, changes):
+        i = self.find_row(idx, vals)
+        if i < 0:
+            return False
+        row = list(self.rows[i])
+        for col, val in changes.items():
+            row[col] = val
+        self.rows[i] = tuple(row)
+        self.dataChanged.emit(self.index(i, 0), self.index(i, self.columnCount() - 1))
+        return True
+
+    # 在末尾追加几行（表格里新增的行），不受max_rows限制
+    def append_rows(self, rows):
+        if not rows:
+            return
+        start = len(self.rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    # 把第i行换成row（标记删除、取消标记时），row为None时去掉这一行
+    def set_row(self, i, row):
+        if row is None:
+            self.beginRemoveRows(QModelIndex(), i, i)
+            del self.rows[i]
+            self.endRemoveRows()
+            return
+        self.rows[i] = row
+        self.dataChanged.emit(self.index(i, 0), self.index(i, self.columnCount() - 1))
+
+    # 删除一行，行不在当前页时返回False
+    def drop_row(self, idx, vals):
+        i = self.find_row(idx, vals)
+        if i < 0:
+            return False
+        self.beginRemoveRows(QModelIndex(), i, i)
+        del self.rows[i]
+        self.endRemoveRows()
+        return True
+
+
+# SQL Server的char(n)列取出来带尾部空格，和输入框里的值比较前统一去掉
+def norm(val):
+    return "" if val is None else str(val).rstrip()
+
+
+# 后台线程已经取回的一页数据，包装成和游标一样的fetchmany接口交给模型，
+# 这样模型不用关心数据是直接来自游标还是来自后台查询
+class RowBuffer:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.pos = 0
+
+    def fetchmany(self, n):
+        batch = self.rows[self.pos:self.pos + n]
+        self.pos += len(batch)
+        return batch
+
+    def fetchone(self):
+        batch = self.fetchmany(1)
+        return batch[0] if batch else None
+
+    def close(self):
+        self.rows = []
+        self.pos = 0
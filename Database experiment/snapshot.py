@@ -0,0 +1,165 @@
+import os
+import json
+import sqlite3
+import threading
+from table_registry import by_tname
+
+# 参照表本地快照：科室、医生、病房、药品这几张表很少改，却在每次打开窗口、每次医生表/患者表关联查询时都要读
+# 程序启动时先从本地快照文件（SQLite）读出上次的数据，再在后台和服务器同步增量；
+# 之后定时同步，本机修改了这几张表时马上同步
+# 增量靠表上的rowversion列（sql文件里新加的rv列）：记下已经同步到的版本号，
+# 每次只取rv比它大、并且小于MIN_ACTIVE_ROWVERSION()的行（还没提交的事务不会被跳过）；
+# rowversion看不到删除，所以再比一下行数，对不上时取一次主键列表找出被删的行
+# 快照准备好之后，医生表/患者表只从服务器查本表，医生姓名、科室名称、病房地址在本地按主键补上（见TableInfo.refs）
+
+ref_tables = ("department", "doctor", "room", "drug")
+snap_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot.db")
+
+
+def key_of(v):
+    return v.rstrip() if isinstance(v, str) else v
+
+
+class Snapshot:
+    # 取增量：rv在(上次版本, 本次上限]之间的行，版本号按bigint处理，和binary(8)的rowversion比较
+    delta_sql = ("SELECT {cols}, CAST(rv AS bigint) FROM {t} "
+                 "WHERE rv > CAST(CAST(? AS bigint) AS binary(8)) AND rv <= CAST(CAST(? AS bigint) AS binary(8))")
+    # 本次同步的上限：比它小的版本号都已经提交了
+    top_sql = "SELECT CAST(MIN_ACTIVE_ROWVERSION() AS bigint) - 1"
+
+    # source：数据库标识（比如连接串），换了数据库时本地快照文件作废
+    def __init__(self, source="", path=snap_path, tables=ref_tables):
+        self.source = source
+        self.path = path
+        self.tables = tuple(tables)
+        self.infos = {t: by_tname[t.lower()] for t in self.tables}
+        self.col_idx = {t: {c: i for i, c in enumerate(info.db_flds)} for t, info in self.infos.items()}
+        self.rows = {t: {} for t in self.tables}  # 表名 -> {主键: 行}，同步时整张表换成新字典，读的时候不用加锁
+        self.marks = {t: 0 for t in self.tables}  # 表名 -> 已经同步到的版本号
+        self.ready = False  # 有完整数据（从文件读到或者同步过一次）之后才能用来补关联字段
+        self.gen = 0  # 数据每变一次加一，界面据此判断下拉列表之类要不要重建
+        self.lock = threading.Lock()  # 同一时间只有一个同步任务
+
+    # 从本地文件读出上次的快照，文件不存在或者是别的数据库的就不读
+    def load_file(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            conn = sqlite3.connect(self.path)
+            try:
+                meta = dict(conn.execute("SELECT k, v FROM meta").fetchall())
+                if meta.get("source") != self.source:
+                    return False
+                marks = dict(conn.execute("SELECT t, mark FROM marks").fetchall())
+                rows = {t: {} for t in self.tables}
+                for t, data in conn.execute("SELECT t, row FROM snap"):
+                    if t in rows:
+                        r = tuple(json.loads(data))
+                        rows[t][key_of(r[self.col_idx[t][self.infos[t].pk[0]]])] = r
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return False
+        if any(t not in marks for t in self.tables):
+            return False
+        self.rows = rows
+        self.marks = {t: marks[t] for t in self.tables}
+        self.ready = True
+        self.gen += 1
+        return True
+
+    # 整个快照写回本地文件，先写临时文件再替换，写到一半断电也不会坏
+    def save_file(self):
+        tmp = self.path + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        conn = sqlite3.connect(tmp)
+        try:
+            conn.execute("CREATE TABLE meta (k TEXT PRIMARY KEY, v TEXT)")
+            conn.execute("CREATE TABLE marks (t TEXT PRIMARY KEY, mark INTEGER)")
+            conn.execute("CREATE TABLE snap (t TEXT, row TEXT)")
+            conn.execute("INSERT INTO meta VALUES ('source', ?)", (self.source,))
+            conn.executemany("INSERT INTO marks VALUES (?, ?)", list(self.marks.items()))
+            conn.executemany("INSERT INTO snap VALUES (?, ?)",
+                             [(t, json.dumps(list(r), ensure_ascii=False, default=str))
+                              for t in self.tables for r in self.rows[t].values()])
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp, self.path)
+
+    # 和服务器同步（在工作线程里执行），tables为None时同步全部参照表，返回有变化的表
+    def sync(self, cur, tables=None):
+        with self.lock:
+            cur.execute(self.top_sql)
+            top = cur.fetchone()[0]
+            changed = []
+            for t in tables or self.tables:
+                if t not in self.rows:
+                    continue
+                if self.sync_table(cur, t, top):
+                    changed.append(t)
+            cur.connection.rollback()  # 只读，结束事务
+            if changed or not self.ready:
+                self.ready = True
+                self.gen += 1
+                try:
+                    self.save_file()
+                except (OSError, sqlite3.Error):
+                    pass  # 本地文件写不了只影响下次启动的速度
+            return changed
+
+    def sync_table(self, cur, t, top):
+        info = self.infos[t]
+        pk_i = self.col_idx[t][info.pk[0]]
+        mark = self.marks[t]
+        changed = False
+        rows = self.rows[t]
+        if top > mark:
+            cur.execute(self.delta_sql.format(cols=", ".join(info.db_flds), t=info.name), [mark, top])
+            delta = cur.fetchall()
+            if delta:
+                rows = dict(rows)
+                for r in delta:
+                    r = tuple(r)
+                    rows[key_of(r[pk_i])] = r[:-1]
+                changed = True
+        # 删除的行rowversion看不到，行数对不上时按主键列表清理
+        cur.execute(f"SELECT COUNT(*) FROM {info.name}")
+        if cur.fetchone()[0] != len(rows):
+            cur.execute(f"SELECT {info.pk[0]} FROM {info.name}")
+            keys = {key_of(r[0]) for r in cur.fetchall()}
+            gone = [k for k in rows if k not in keys]
+            if gone:
+                rows = dict(rows)
+                for k in gone:
+                    del rows[k]
+                changed = True
+        self.rows[t] = rows
+        self.marks[t] = max(mark, top)
+        return changed
+
+    # 按主键取一行，没有返回None
+    def get(self, t, key):
+        return self.rows[t].get(key_of(key))
+
+    # 一张表的全部行
+    def table(self, t):
+        return list(self.rows[t].values())
+
+    # 把只查了本表的结果行按info.expand_plan补成关联查询的列：本表的列直接取，
+    # 其他表的列从本表外键出发按路径逐表查快照，比如患者.dno -> 医生.dpno -> 科室.dpname
+    def expand(self, info, rows):
+        tabs = self.rows
+        col_idx = self.col_idx
+        out = []
+        for r in rows:
+            vals = []
+            for i, path in info.expand_plan:
+                v = r[i]
+                for t, col in path:
+                    rec = tabs[t].get(key_of(v)) if v is not None else None
+                    v = rec[col_idx[t][col]] if rec is not None else None
+                vals.append(v)
+            out.append(tuple(vals))
+        return out
@@ -0,0 +1,214 @@
+import time
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QPainter, QColor, QFont, QFontMetrics
+from PyQt5.QtWidgets import (
+    QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QPushButton, QLabel, QProgressBar
+)
+
+# 数据统计窗口，用柱状图显示各科室/病房患者人数、每日入院人数、药品消耗金额、医生接诊人数
+# 统计全部在数据库里GROUP BY算好，只把汇总后的几十行取回来，不会把整张表读到程序里
+# 建了索引视图（见sql文件最后）时直接读视图，SQL Server在写入时已经增量更新好了汇总结果；
+# 没建视图的数据库自动改用基本表上的GROUP BY
+# 结果和表格查询共用一个缓存，患者、用药等表被修改时读过它们的统计自动作废
+
+# 每个图表：(标题, 读索引视图的SQL, 直接在基本表上汇总的SQL, 最多显示几条)
+# NOEXPAND让非企业版SQL Server也直接使用视图上的索引
+charts = [
+    ("各科室患者人数",
+     "SELECT d.dpname, SUM(v.cnt) FROM department d JOIN room r ON r.dpno = d.dpno "
+     "LEFT JOIN v_room_load v WITH (NOEXPAND) ON v.rno = r.rno GROUP BY d.dpno, d.dpname ORDER BY d.dpno",
+     "SELECT d.dpname, COUNT(p.pno) FROM department d JOIN room r ON r.dpno = d.dpno "
+     "LEFT JOIN patient p ON p.rno = r.rno GROUP BY d.dpno, d.dpname ORDER BY d.dpno",
+     20),
+    ("各病房患者人数",
+     "SELECT r.rno, v.cnt FROM room r LEFT JOIN v_room_load v WITH (NOEXPAND) ON v.rno = r.rno ORDER BY r.rno",
+     "SELECT r.rno, COUNT(p.pno) FROM room r LEFT JOIN patient p ON p.rno = r.rno GROUP BY r.rno ORDER BY r.rno",
+     30),
+    ("每日入院人数（最近30个入院日）",
+     "SELECT startdate, cnt FROM v_daily_adm WITH (NOEXPAND) ORDER BY startdate DESC",
+     "SELECT startdate, COUNT(*) FROM patient WHERE startdate IS NOT NULL GROUP BY startdate ORDER BY startdate DESC",
+     30),
+    ("药品消耗金额（用药数量×价格）",
+     "SELECT g.dgname, v.amount FROM v_drug_usage v WITH (NOEXPAND) JOIN drug g ON g.dgno = v.dgno "
+     "ORDER BY v.amount DESC",
+     "SELECT g.dgname, SUM(pd.num * g.dgprice) FROM PD pd JOIN drug g ON g.dgno = pd.dgno "
+     "GROUP BY g.dgno, g.dgname ORDER BY 2 DESC",
+     15),
+    ("医生接诊人数",
+     "SELECT d.dname, v.cnt FROM v_doctor_load v WITH (NOEXPAND) JOIN doctor d ON d.dno = v.dno "
+     "ORDER BY v.cnt DESC",
+     "SELECT d.dname, COUNT(*) FROM patient p JOIN doctor d ON d.dno = p.dno "
+     "GROUP BY d.dno, d.dname ORDER BY 2 DESC",
+     15),
+]
+
+
+# 横向柱状图，左边是名称，右边是柱子和数值
+class BarChart(QWidget):
+    def __init__(self, title, parent=None):
+        super().__init__(parent)
+        self.title = title
+        self.items = []  # [(名称, 数值)]
+        self.setMinimumSize(420, 280)
+
+    def set_data(self, rows):
+        self.items = [(str(k).rstrip() if k is not None else "", float(v or 0)) for k, v in rows]
+        self.update()
+
+    def paintEvent(self, event):
+        p = QPainter(self)
+        p.setRenderHint(QPainter.Antialiasing)
+        w, h = self.width(), self.height()
+        p.setPen(Qt.NoPen)
+        p.setBrush(QColor(255, 255, 255, 230))
+        p.drawRoundedRect(QRectF(0, 0, w, h), 8, 8)
+
+        p.setPen(QColor("#2c3e50"))
+        p.setFont(QFont("", 12, QFont.Bold))
+        p.drawText(QRectF(10, 6, w - 20, 26), Qt.AlignLeft | Qt.AlignVCenter, self.title)
+        p.setFont(QFont("", 9))
+        if not self.items:
+            p.drawText(QRectF(0, 0, w, h), Qt.AlignCenter, "暂无数据")
+            return
+
+        # 名称占左边一列，剩下的宽度按最大值等比例画柱子，右边留出写数值的位置
+        top, left, val_w = 38, 110, 60
+        row_h = (h - top - 8) / len(self.items)
+        bar_w = max(w - left - val_w - 10, 10)
+        max_v = max(v for _, v in self.items) or 1
+        fm = QFontMetrics(p.font())
+        for i, (name, v) in enumerate(self.items):
+            y = top + i * row_h
+            p.setPen(QColor("#34495e"))
+            name = fm.elidedText(name, Qt.ElideRight, left - 12)  # 名称太长显示省略号
+            p.drawText(QRectF(6, y, left - 12, row_h), Qt.AlignRight | Qt.AlignVCenter, name)
+            bw = bar_w * v / max_v
+            p.setPen(Qt.NoPen)
+            p.setBrush(QColor("#3498db"))
+            p.drawRect(QRectF(left, y + row_h * 0.15, bw, row_h * 0.7))
+            p.setPen(QColor("#34495e"))
+            txt = f"{v:.0f}" if v == int(v) else f"{v:.2f}"
+            p.drawText(QRectF(left + bw + 4, y, val_w, row_h), Qt.AlignLeft | Qt.AlignVCenter, txt)
+
+
+class StatsWin(QMainWindow):
+    use_views = True  # 第一次读视图失败（数据库没建视图）后，之后都直接在基本表上汇总
+
+    def __init__(self, executor, cache=None):
+        super().__init__()
+        self.exe = executor
+        self.cache = cache
+        self.setWindowTitle("数据统计")
+        self.resize(1100, 950)
+        self.setStyleSheet("""
+            QMainWindow {background-color: #f8f9fa;}
+            QPushButton {
+                font-size: 16px; padding: 10px 24px; background-color: #3498db; color: white;
+                border: none; border-radius: 8px;
+            }
+            QPushButton:hover {background-color: #2980b9;}
+            QLabel {font-size: 14px; color: #34495e;}
+        """)
+
+        cen_wid = QWidget()
+        self.setCentralWidget(cen_wid)
+        main_layout = QVBoxLayout(cen_wid)
+        main_layout.setContentsMargins(30, 30, 30, 30)
+        main_layout.setSpacing(20)
+
+        top_layout = QHBoxLayout()
+        self.info_label = QLabel("")
+        self.refresh_btn = QPushButton("刷新")
+        self.refresh_btn.clicked.connect(lambda: self.load(use_cache=False))
+        top_layout.addWidget(self.info_label)
+        top_layout.addStretch()
+        top_layout.addWidget(self.refresh_btn)
+        main_layout.addLayout(top_layout)
+
+        # 两列排布图表
+        grid = QGridLayout()
+        grid.setSpacing(20)
+        self.chart_wids = []
+        for i, c in enumerate(charts):
+            chart = BarChart(c[0])
+            grid.addWidget(chart, i // 2, i % 2)
+            self.chart_wids.append(chart)
+        main_layout.addLayout(grid)
+
+        self.busy_bar = QProgressBar()
+        self.busy_bar.setRange(0, 0)
+        self.busy_bar.setMaximumWidth(150)
+        self.busy_bar.hide()
+        self.statusBar().addPermanentWidget(self.busy_bar)
+
+        self.load()
+
+    # 加载全部图表，每个图表一个后台任务并行执行，缓存里有的直接显示
+    def load(self, use_cache=True):
+        if not self.exe:
+            return
+        self.t0 = time.perf_counter()
+        self.left = len(charts)
+        self.from_db = 0
+        self.busy_bar.show()
+        for i, (title, view_sql, base_sql, limit) in enumerate(charts):
+            sql = view_sql if StatsWin.use_views else base_sql
+            rows = self.cache.get(sql, ()) if self.cache and use_cache else None
+            if rows is not None:
+                self.show_chart(i, rows)
+                continue
+            self.submit(i, view_sql, base_sql, limit)
+
+    def submit(self, i, view_sql, base_sql, limit):
+        use_views = StatsWin.use_views
+        version = self.cache.version if self.cache else None
+
+        # 先读视图，读不了再退回基本表，返回实际执行的SQL，缓存用它做键
+        def job(cur):
+            if use_views:
+                try:
+                    cur.execute(view_sql)
+                    return view_sql, cur.fetchmany(limit)
+                except Exception:
+                    cur.connection.rollback()
+            cur.execute(base_sql)
+            return base_sql, cur.fetchmany(limit)
+
+        def done(res):
+            sql, rows = res
+            if sql == base_sql and use_views:
+                StatsWin.use_views = False
+            if self.cache:
+                self.cache.put(sql, (), rows, version)
+            self.from_db += 1
+            self.show_chart(i, rows)
+
+        def fail(e):
+            self.left -= 1
+            self.statusBar().showMessage(f"统计【{charts[i][0]}】失败：{e}")
+            self.check_done()
+
+        self.exe.submit(job, done, fail, (id(self), i))
+
+    def show_chart(self, i, rows):
+        rows = list(rows)
+        if i == 2:  # 入院日期按时间倒序取的最近几天，显示时改回从早到晚
+            rows.reverse()
+        self.chart_wids[i].set_data(rows)
+        self.left -= 1
+        self.check_done()
+
+    def check_done(self):
+        if self.left > 0:
+            return
+        self.busy_bar.hide()
+        ms = (time.perf_counter() - self.t0) * 1000
+        src = "汇总视图" if StatsWin.use_views else "基本表汇总"
+        self.info_label.setText(
+            f"统计用时{ms:.0f}毫秒，{self.from_db}项查询数据库（{src}），{len(charts) - self.from_db}项来自缓存")
+
+    def closeEvent(self, event):
+        if self.exe:
+            for i in range(len(charts)):
+                self.exe.cancel((id(self), i))
+        event.accept()
@@ -0,0 +1,129 @@
+import sys
+import time
+from collections import namedtuple
+
+# 增删改语句层：每张表的每种操作（新增/按字段组合修改/删除/按主键取一行）只生成一条固定的SQL，
+# 并按建表时的字段类型用cursor.setinputsizes显式声明参数类型
+# 不声明类型时pyodbc按值推断，字符串参数会按实际长度声明成nvarchar(3)、nvarchar(5)……，
+# 同一条UPDATE因为输入长度不同在SQL Server里编译出好几份执行计划，还会和char列发生隐式转换；
+# 声明成和字段一致的char(n)/bit/int/date之后，同一条语句只有一份计划，反复录入时直接复用
+
+# ODBC的SQL类型码，和pyodbc.SQL_CHAR等常量的值相同
+SQL_CHAR = 1
+SQL_INTEGER = 4
+SQL_BIT = -7
+SQL_TYPE_DATE = 91
+
+# sql：语句，sizes：每个参数的(类型码, 长度, 小数位)，kinds：每个参数的字段类型，绑定前按它转换值
+Stmt = namedtuple("Stmt", "sql sizes kinds")
+
+
+# 建表类型 -> setinputsizes用的(类型码, 长度, 小数位)，如char(20) -> (SQL_CHAR, 20, 0)
+def input_size(sqltype):
+    name, _, rest = sqltype.partition("(")
+    if name == "char":
+        return SQL_CHAR, int(rest.rstrip(")")), 0
+    if name == "bit":
+        return SQL_BIT, 1, 0
+    if name == "int":
+        return SQL_INTEGER, 10, 0
+    if name == "date":
+        return SQL_TYPE_DATE, 10, 0
+    raise ValueError(f"不支持的字段类型：{sqltype}")
+
+
+# 按参数对应的字段（table_registry里的字段描述）生成语句
+def make_stmt(sql, cols):
+    return Stmt(sql, [input_size(c.sql) for c in cols], [c.kind for c in cols])
+
+
+# 按字段类型整理参数：数字列的空串转NULL、数字字符串转int，声明了类型之后不再依赖SQL Server的隐式转换
+def bind(stmt, params):
+    out = []
+    for kind, v in zip(stmt.kinds, params):
+        if kind in ("int", "sex") and isinstance(v, str):
+            v = v.strip()
+            if not v:
+                v = None
+            else:
+                try:
+                    v = int(v)
+                except ValueError:
+                    raise ValueError(f"“{v}”不是整数")
+        out.append(v)
+    return out
+
+
+# 声明参数类型后执行，执行完清掉类型声明，不影响这个游标上的其他语句
+def execute(cur, stmt, params):
+    typed = hasattr(cur, "setinputsizes")
+    if typed:
+        cur.setinputsizes(stmt.sizes)
+    try:
+        return cur.execute(stmt.sql, bind(stmt, params))
+    finally:
+        if typed:
+            cur.setinputsizes(None)
+
+
+# 同一条语句批量执行（表格里改完一起保存时用），参数类型只声明一次；
+# pyodbc开启fast_executemany，整批参数一次发给服务器，不再逐行往返
+def executemany(cur, stmt, seq):
+    typed = hasattr(cur, "setinputsizes")
+    if hasattr(cur, "fast_executemany"):
+        cur.fast_executemany = True
+    if typed:
+        cur.setinputsizes(stmt.sizes)
+    try:
+        return cur.executemany(stmt.sql, [bind(stmt, p) for p in seq])
+    finally:
+        if typed:
+            cur.setinputsizes(None)
+
+
+# 对比不声明类型和声明类型时，同一条UPDATE在计划缓存里有几份计划、被复用了多少次
+# 用不同长度的疾病名称反复修改已有患者，最后回滚不留数据；需要VIEW SERVER STATE权限
+def bench(connect, n=200):
+    from table_registry import tables
+    info = tables["患者表"]
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("SELECT TOP 1 pno FROM patient")
+    row = cur.fetchone()
+    if row is None:
+        raise RuntimeError("测试需要patient表里至少有一条数据")
+    pno = row[0]
+    plan_sql = ("SELECT COUNT(*), SUM(cp.usecounts) FROM sys.dm_exec_cached_plans cp "
+                "CROSS APPLY sys.dm_exec_sql_text(cp.plan_handle) st "
+                "WHERE st.text LIKE ? AND st.text NOT LIKE '%dm_exec_cached_plans%'")
+    res = {}
+    try:
+        for mode in ("plain", "typed"):
+            tag = f"/*stmt_bench_{mode}_{time.time_ns()}*/"  # 每次测试的语句文本不同，不受之前缓存的计划影响
+            st = info.update_stmt(["illness"])
+            st = st._replace(sql=tag + " " + st.sql)
+            t0 = time.perf_counter()
+            for i in range(n):
+                params = ["病" * (i % 10 + 1), pno]
+                if mode == "typed":
+                    execute(cur, st, params)
+                else:
+                    cur.execute(st.sql, params)
+            secs = time.perf_counter() - t0
+            cur.execute(plan_sql, (f"%{tag}%",))
+            plans, uses = cur.fetchone()
+            res[mode] = {"plans": plans, "uses": uses or 0, "ms_per_stmt": secs * 1000 / n}
+    finally:
+        conn.rollback()
+        conn.close()
+    return res
+
+
+if __name__ == "__main__":
+    # python stmt.py [次数]  对配置好的SQL Server测一次计划缓存复用情况
+    from db_pool import connect_db
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    r = bench(connect_db, n)
+    for mode, name in (("plain", "不声明参数类型"), ("typed", "声明参数类型")):
+        m = r[mode]
+        print(f"{name}：{m['plans']}份执行计划，共复用{m['uses']}次，平均每条{m['ms_per_stmt']:.2f}毫秒")
@@ -0,0 +1,176 @@
+from collections import namedtuple
+from types import MappingProxyType
+from stmt import make_stmt
+
+# 表结构登记，程序启动时建好一次，之后只读
+# 原来每次增删改都要重新生成字段映射字典、表名字典，按数据库字段找中文名还要遍历整个映射；
+# 现在每张表的字段描述、正反向映射、增删改查用的语句都在这里提前算好，子窗口直接取用
+# 字段和约束与sql文件里的建表语句一致，改表结构时同步修改这里
+
+# 一个字段：name数据库字段，cn中文字段名，kind字段类型(text/int/date/sex)，决定查询值、导入值怎么转换，
+# widget输入控件(line/spin/date/sex)，pk是否主键，unique是否有唯一约束，fk为(被参照表, 被参照字段)或None，
+# sql为建表时的字段类型，绑定参数类型用
+Column = namedtuple("Column", "name cn kind widget pk unique fk sql")
+
+
+def col(name, cn, kind="text", widget=None, pk=False, unique=False, fk=None, sql=None):
+    if widget is None:
+        widget = {"sex": "sex", "date": "date", "int": "spin"}.get(kind, "line")
+    if sql is None:
+        sql = {"sex": "bit", "date": "date", "int": "int"}[kind]
+    return Column(name, cn, kind, widget, pk, unique, fk, sql)
+
+
+class TableInfo:
+    # cn中文表名，name数据库表名，cols字段描述；loc修改/删除时用来定位记录的字段，默认第一个字段；
+    # join为(关联查询SQL, 表头)，alias为关联查询里本表的别名；
+    # refs为关联查询里其他表的列 -> 从本表外键出发的查找路径(本表外键, 表, 列, 表, 列...)，参照表快照补列用；
+    # label为名称字段，别的表填外键时候选列表里显示“编号  名称”；
+    # search为建本地全文索引的文本字段，这些字段的“包含”查询在本机回答（见ngram_index.py）
+    def __init__(self, cn, name, cols, loc=None, join=None, alias="", refs=None, label=None, search=()):
+        self.cn = cn
+        self.name = name
+        self.cols = tuple(cols)
+        self.db_flds = tuple(c.name for c in self.cols)
+        self.cn_names = tuple(c.cn for c in self.cols)
+        self.fld_map = MappingProxyType(dict(zip(self.cn_names, self.db_flds)))  # 中文字段名 -> 数据库字段
+        self.rev_map = MappingProxyType(dict(zip(self.db_flds, self.cn_names)))  # 数据库字段 -> 中文字段名
+        self.by_cn = MappingProxyType({c.cn: c for c in self.cols})  # 中文字段名 -> 字段描述
+        self.by_name = MappingProxyType({c.name: c for c in self.cols})  # 数据库字段 -> 字段描述
+        self.kinds = MappingProxyType({c.name: c.kind for c in self.cols})
+        self.pk = tuple(c.name for c in self.cols if c.pk)
+        self.uniques = tuple(c.name for c in self.cols if c.unique)
+        self.fks = tuple((c.name,) + c.fk for c in self.cols if c.fk)  # (本表字段, 被参照表, 被参照字段)
+        self.loc_cols = tuple(loc or self.db_flds[:1])
+        self.alias = alias
+        self.label = label
+        self.search = tuple(search)
+
+        # 查询：单表按字段顺序查，关联表用关联SQL
+        if join:
+            self.select_sql, heads = join
+        else:
+            self.select_sql, heads = f"SELECT {', '.join(self.db_flds)} FROM {name}", self.cn_names
+        self.heads = tuple(heads)
+        sel = [c.strip() for c in self.select_sql.split(" FROM ")[0][len("SELECT "):].split(",")]
+        self.sel_cols = tuple(c.split(".")[-1] for c in sel)  # 结果列对应的字段名（去掉表别名）
+        self.sel_idx = MappingProxyType({c: i for i, c in enumerate(self.sel_cols)})
+        # 结果列里属于本表的字段 -> 下标，表格里只能直接修改这些列（关联出来的科室名等不能改）
+        self.own_idx = MappingProxyType({c.split(".")[-1]: i for i, c in enumerate(sel)
+                                         if (c.startswith(f"{alias}.") if alias else "." not in c)})
+        # 分页按主键排序，关联查询的主键要带表别名
+        self.page_keys = tuple(f"{alias}.{k}" if alias else k for k in self.pk)
+        self.key_idx = tuple(sel.index(k) for k in self.page_keys)
+
+        # 关联查询去掉LEFT JOIN之后的FROM部分：INNER JOIN关联不上的行（比如主治医师编号为空的患者）关联查询查不出来，
+        # 只查本表的列时也要带上这些INNER JOIN，翻页、全文索引和导出看到的才是同一批行；单表就是表名
+        self.inner_from = self.select_sql.split(" FROM ", 1)[1].split(" LEFT JOIN ")[0] if join else name
+
+        # 只查本表的SQL（本表要显示的列加上查找路径的起点），其他表的列由snapshot.expand按expand_plan补上
+        # expand_plan每项是(本表结果里的下标, ((表, 列), ...))，本表的列路径为空
+        self.local_sql = None
+        self.expand_plan = ()
+        if refs:
+            own = [c.split(".")[-1] for c in sel if c not in refs]
+            local = tuple(dict.fromkeys(own + [p[0] for p in refs.values()]))
+            self.local_sql = f"SELECT {', '.join(f'{alias}.{c}' for c in local)} FROM {self.inner_from}"
+            self.expand_plan = tuple(
+                (local.index(refs[c][0]), tuple(zip(refs[c][1::2], refs[c][2::2]))) if c in refs
+                else (local.index(c.split(".")[-1]), ()) for c in sel)
+
+        # 增删改和按主键取一行的语句，带上参数类型（见stmt.py）
+        loc = [self.by_name[c] for c in self.loc_cols]
+        self.insert_stmt = make_stmt(f"INSERT INTO {name} ({', '.join(self.db_flds)}) "
+                                     f"VALUES ({', '.join(['?'] * len(self.db_flds))})", self.cols)
+        self.loc_where = " AND ".join(f"{c} = ?" for c in self.loc_cols)
+        self.delete_stmt = make_stmt(f"DELETE FROM {name} WHERE {self.loc_where}", loc)
+        key_where = " AND ".join(f"{k} = ?" for k in self.page_keys)
+        self.row_stmt = make_stmt(f"{self.select_sql} WHERE {key_where}", [self.by_name[k] for k in self.pk])
+        self.update_stmts = {}  # 修改的字段组合 -> UPDATE语句，用到一种生成一种，之后一直复用
+
+    # 只修改flds这些字段的UPDATE语句，参数顺序为修改值在前、定位字段值在后
+    def update_stmt(self, flds):
+        flds = tuple(flds)
+        st = self.update_stmts.get(flds)
+        if st is None:
+            sets = ", ".join(f"{f} = ?" for f in flds)
+            st = make_stmt(f"UPDATE {self.name} SET {sets} WHERE {self.loc_where}",
+                           [self.by_name[f] for f in flds] + [self.by_name[c] for c in self.loc_cols])
+            self.update_stmts[flds] = st
+        return st
+
+
+table_list = [
+    TableInfo("科室表", "department", [
+        col("dpname", "部门名称", unique=True, sql="char(10)"),
+        col("dpno", "部门编号", pk=True, sql="char(2)"),
+        col("dpadr", "部门地址", sql="char(20)"),
+        col("dptel", "部门电话", sql="char(20)"),
+    ], label="dpname"),
+    # 查doctor表+department表，通过部门编号dpno关联
+    TableInfo("医生表", "doctor", [
+        col("dno", "医生工号", pk=True, sql="char(3)"),
+        col("dname", "医生姓名", sql="char(20)"),
+        col("duty", "职务", sql="char(20)"),
+        col("dsex", "性别", "sex"),
+        col("dage", "年龄", "int"),
+        col("dpno", "部门编号", fk=("department", "dpno"), sql="char(2)"),
+    ], join=(
+        "SELECT d.dno, d.dname, d.duty, d.dsex, d.dage, d.dpno, de.dpname, de.dpadr FROM doctor d "
+        "INNER JOIN department de ON d.dpno = de.dpno",
+        ["医生工号", "医生姓名", "职务", "性别", "年龄", "部门编号", "所属科室", "科室地址"]
+    ), alias="d", label="dname", search=("dname",), refs={
+        "de.dpname": ("dpno", "department", "dpname"),
+        "de.dpadr": ("dpno", "department", "dpadr"),
+    }),
+    # 查patient表+doctor表+department表+room表，多表关联
+    TableInfo("患者表", "patient", [
+        col("pno", "患者编号", pk=True, sql="char(20)"),
+        col("pname", "患者姓名", sql="char(20)"),
+        col("psex", "性别", "sex"),
+        col("page", "年龄", "int"),
+        col("dno", "主治医师编号", fk=("doctor", "dno"), sql="char(3)"),
+        col("rno", "所属病房号", fk=("room", "rno"), sql="char(10)"),
+        col("illness", "疾病种类", sql="char(20)"),
+        col("startdate", "入院日期", "date"),
+        col("predictenddate", "预计出院日期", "date"),
+    ], join=(
+        "SELECT p.pno, p.pname, p.psex, p.page, p.dno, d.dname, d.dpno, de.dpname, p.rno, r.radr, p.illness "
+        "FROM patient p INNER JOIN doctor d ON p.dno = d.dno INNER JOIN department de ON d.dpno = de.dpno "
+        "LEFT JOIN room r ON p.rno = r.rno",
+        ["患者编号", "患者姓名", "性别", "年龄", "主治医师编号", "主治医师", "部门编号", "所属科室",
+         "所属病房号", "房间地址", "疾病种类"]
+    ), alias="p", label="pname", search=("pname", "illness"), refs={
+        "d.dname": ("dno", "doctor", "dname"),
+        "d.dpno": ("dno", "doctor", "dpno"),
+        "de.dpname": ("dno", "doctor", "dpno", "department", "dpname"),
+        "r.radr": ("rno", "room", "radr"),
+    }),
+    TableInfo("药品表", "drug", [
+        col("dgno", "药品编号", pk=True, sql="char(4)"),
+        col("dgname", "药品名称", sql="char(50)"),
+        col("dgpro", "生产厂家", sql="char(20)"),
+        col("dgnum", "库存量", "int", "line"),
+        col("dgprice", "价格", "int"),
+    ], label="dgname", search=("dgname",)),
+    TableInfo("病房表", "room", [
+        col("rno", "病房编号", pk=True, sql="char(10)"),
+        col("radr", "病房地址", unique=True, sql="char(20)"),
+        col("dpno", "所属部门编号", fk=("department", "dpno"), sql="char(2)"),
+    ], label="radr"),
+    TableInfo("患者用药表", "PD", [
+        col("dgno", "药品编号", pk=True, fk=("drug", "dgno"), sql="char(4)"),
+        col("pno", "患者编号", pk=True, fk=("patient", "pno"), sql="char(20)"),
+        col("num", "用药数量", "int"),
+    ], loc=["dgno", "pno"]),
+]
+
+tables = MappingProxyType({t.cn: t for t in table_list})  # 中文表名 -> 表信息
+by_tname = MappingProxyType({t.name.lower(): t for t in table_list})  # 数据库表名（小写） -> 表信息
+table_names = MappingProxyType({t.name: t.cn for t in table_list})  # 数据库表名 -> 中文表名
+
+
+# 按数据库表名取外键：[(本表字段, 被参照表, 被参照字段)]
+def fks_of(tname):
+    t = by_tname.get(tname.lower())
+    return t.fks if t else ()
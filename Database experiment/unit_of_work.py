@@ -0,0 +1,298 @@
+import datetime
+from result_model import norm
+from stmt import make_stmt, executemany
+
+# 表格里直接修改，改完一起保存
+# 原来改一条数据要在输入区重新填主键、填要改的字段、点修改，每次都是一次校验查询+一条UPDATE+一次提交，
+# 病房护士一次核对几十条数据就是几十个来回
+# 现在双击单元格直接改、选中行标记删除、在表格末尾新增行，这些修改先记在这里（不连数据库），
+# 点“保存修改”时在一个事务里：
+#   1. 一条SELECT（按主键，WITH (UPDLOCK)）取回被改/被删的行的当前版本，和载入时的比较，
+#      被别人改过或删掉了就整批不保存，提示哪些行冲突（乐观并发：编辑期间不锁任何数据）
+#   2. 外键、唯一约束的检查照样拼成一条SELECT（见Validator.check_batch）
+#   3. 删除、按修改的字段组合分组的UPDATE、INSERT各用一次executemany执行，最后提交一次
+# 版本：连SQL Server时翻页查询多带一列rv（rowversion，每次修改自动变化），直接比较版本号；
+# 嵌入式数据库没有rowversion，或者这一行是新增/修改后重新取回的（不带rv），就比较本表各列载入时的值
+
+
+# 新增的行：普通元组加上编号tag，改了内容会换成新元组但编号不变，用来找到待保存列表里对应的那条
+class NewRow(tuple):
+    tag = 0
+
+
+def new_row(vals, tag):
+    row = NewRow(vals)
+    row.tag = tag
+    return row
+
+
+# 查询语句的结果列后面加上rv列：SELECT a, b FROM t x ... -> SELECT a, b, x.rv FROM t x ...
+def with_version(sql, alias=""):
+    i = sql.index(" FROM ")
+    return f"{sql[:i]}, {alias + '.' if alias else ''}rv{sql[i:]}"
+
+
+# 哪些表有rowversion类型的rv列（sql文件最后的语句加的），返回小写表名集合；
+# 嵌入式数据库查不到（或者没有），这些表保存时按载入时的值检查冲突
+def versioned_tables(cur):
+    try:
+        cur.execute("SELECT TABLE_NAME FROM INFORMATION_SCHEMA.COLUMNS "
+                    "WHERE COLUMN_NAME = 'rv' AND DATA_TYPE = 'timestamp'")
+        names = {r[0].lower() for r in cur.fetchall()}
+    except Exception:
+        names = set()
+    cur.connection.rollback()
+    return names
+
+
+class UnitOfWork:
+    max_params = 2000  # SQL Server一条语句最多2100个参数
+
+    # info：表结构登记；versioned：结果行在显示的列后面多带一列rv
+    def __init__(self, info, versioned=False):
+        self.info = info
+        self.versioned = versioned
+        self.ncols = len(info.heads)
+        self.own = dict(info.own_idx)  # 本表字段 -> 结果列下标
+        self.col_fld = {i: f for f, i in self.own.items()}
+        self.stmts = {}  # 按主键增删改的语句，用到一种生成一种
+        self.clear()
+
+    def clear(self):
+        self.updates = {}  # 主键 -> (载入时的行, {字段: 新值})
+        self.deletes = {}  # 主键 -> 载入时的行
+        self.inserts = {}  # 新行编号 -> {字段: 值}
+        self.seq = 0
+
+    # 待保存的修改条数
+    def count(self):
+        return len(self.updates) + len(self.deletes) + len(self.inserts)
+
+    def key(self, row):
+        return tuple(norm(row[i]) for i in self.info.key_idx)
+
+    # 行的主键{字段: 值}，执行语句用，char列的尾部空格去掉
+    def key_vals(self, row):
+        return {k: (row[i].rstrip() if isinstance(row[i], str) else row[i])
+                for k, i in zip(self.info.pk, self.info.key_idx)}
+
+    # 能不能改这一格：只能改本表的列；已有的行不能改主键（要改主键请删除后新增），标记删除的行不能改
+    def can_edit(self, row, col):
+        if col not in self.col_fld:
+            return False
+        if isinstance(row, NewRow):
+            return True
+        return col not in self.info.key_idx and self.key(row) not in self.deletes
+
+    # 输入的文本按字段类型转换，格式不对抛ValueError；留空为NULL
+    def conv(self, f, text):
+        c = self.info.by_name[f]
+        t = str(text).strip() if text is not None else ""
+        if c.kind == "sex":
+            if t in ("男", "1"):
+                return 1
+            if t in ("女", "0"):
+                return 0
+            raise ValueError(f"【{c.cn}】请填男或女！")
+        if not t:
+            return None
+        if c.kind == "int":
+            try:
+                return int(t)
+            except ValueError:
+                raise ValueError(f"【{c.cn}】请输入整数！")
+        if c.kind == "date":
+            try:
+                datetime.date.fromisoformat(t)
+            except ValueError:
+                raise ValueError(f"【{c.cn}】日期格式为yyyy-MM-dd！")
+        return t
+
+    # 改了一格，记下修改并返回改完的行；改回载入时的值就不算修改
+    def edit(self, row, col, text):
+        f = self.col_fld[col]
+        v = self.conv(f, text)
+        vals = list(row)
+        vals[col] = v
+        if isinstance(row, NewRow):
+            self.inserts[row.tag][f] = v
+            return new_row(vals, row.tag)
+        k = self.key(row)
+        orig, changes = self.updates.get(k, (row, {}))
+        if norm(orig[col]) == norm(v):
+            changes.pop(f, None)
+        else:
+            changes[f] = v
+        if changes:
+            self.updates[k] = (orig, changes)
+        else:
+            self.updates.pop(k, None)
+        return tuple(vals)
+
+    # 在表格末尾加一行空行
+    def add_row(self):
+        self.seq += 1
+        self.inserts[self.seq] = {}
+        return new_row([None] * self.ncols, self.seq)
+
+    # 标记/取消标记删除，返回表格里这一行要换成的行，None表示从表格里去掉（新增还没保存的行）
+    def toggle_delete(self, row):
+        if isinstance(row, NewRow):
+            self.inserts.pop(row.tag, None)
+            return None
+        k = self.key(row)
+        if k in self.deletes:
+            return self.deletes.pop(k)
+        orig = self.updates.pop(k, (row, None))[0]  # 这一行之前的修改作废
+        self.deletes[k] = orig
+        return orig
+
+    # 单元格的状态，表格按它上色："new"新增的行，"del"标记删除的行，"upd"改过的格子
+    def state(self, row, col):
+        if isinstance(row, NewRow):
+            return "new"
+        if not self.updates and not self.deletes:
+            return None
+        k = self.key(row)
+        if k in self.deletes:
+            return "del"
+        u = self.updates.get(k)
+        if u and self.col_fld.get(col) in u[1]:
+            return "upd"
+        return None
+
+    # 翻页、刷新后新取回的行：把还没保存的修改重新套上去
+    def overlay(self, rows):
+        if not self.updates:
+            return rows
+        out = []
+        for r in rows:
+            u = self.updates.get(self.key(r))
+            if u:
+                vals = list(r)
+                for f, v in u[1].items():
+                    vals[self.own[f]] = v
+                r = tuple(vals)
+            out.append(r)
+        return out
+
+    # 还没保存的新增行，每页都显示在末尾
+    def new_rows(self):
+        out = []
+        for tag, vals in self.inserts.items():
+            row = [None] * self.ncols
+            for f, v in vals.items():
+                row[self.own[f]] = v
+            out.append(new_row(row, tag))
+        return out
+
+    # 保存前的检查（工作线程里执行），返回问题列表，没问题返回空列表
+    def check(self, cur, validator):
+        info = self.info
+        msgs = []
+        for vals in self.inserts.values():
+            missing = [info.rev_map[k] for k in info.pk if vals.get(k) is None]
+            if missing:
+                msgs.append(f"新增的行没有填主键【{'，'.join(missing)}】")
+        if msgs:
+            return msgs
+        msgs = self.conflicts(cur)
+        if msgs:
+            return msgs
+        return validator.check_batch(
+            cur, info.name, list(self.inserts.values()),
+            [(self.key_vals(orig), ch) for orig, ch in self.updates.values()],
+            [self.key_vals(orig) for orig in self.deletes.values()], info.rev_map)
+
+    # 数字字段f保存后的净变化，按字段by的值合计：新增的行加上填的数，删除的行减去载入时的数，改过f的行加上差额；
+    # 患者用药表保存时按药品改库存用（见dispense.take），by没填的新增行跳过（保存前的检查会提示没填主键）
+    def deltas(self, f, by):
+        i, j = self.own[f], self.own[by]
+        out = {}
+
+        def add(k, n):
+            if k is not None and n:
+                out[norm(k)] = out.get(norm(k), 0) + n
+        for vals in self.inserts.values():
+            add(vals.get(by), vals.get(f) or 0)
+        for orig, ch in self.updates.values():
+            if f in ch:
+                add(orig[j], (ch[f] or 0) - (orig[i] or 0))
+        for orig in self.deletes.values():
+            add(orig[j], -(orig[i] or 0))
+        return out
+
+    # 乐观并发检查：被改/被删的行按主键取当前值并加更新锁（到提交为止），和载入时比较
+    def conflicts(self, cur):
+        info = self.info
+        origs = {k: u[0] for k, u in self.updates.items()}
+        origs.update(self.deletes)
+        if not origs:
+            return []
+        pk = list(info.pk)
+        flds = list(self.own)
+        cols = pk + flds + (["rv"] if self.versioned else [])
+        items = list(origs.values())
+        per = max(1, self.max_params // len(pk))
+        found = {}
+        for i in range(0, len(items), per):
+            part = items[i:i + per]
+            if len(pk) == 1:
+                cond = f"{pk[0]} IN ({', '.join(['?'] * len(part))})"
+            else:
+                one = "(" + " AND ".join(f"{k} = ?" for k in pk) + ")"
+                cond = " OR ".join([one] * len(part))
+            params = [v for r in part for v in self.key_vals(r).values()]
+            cur.execute(f"SELECT {', '.join(cols)} FROM {info.name} WITH (UPDLOCK) WHERE {cond}", params)
+            for r in cur.fetchall():
+                found[tuple(norm(v) for v in r[:len(pk)])] = r[len(pk):]
+        msgs = []
+        for k, orig in origs.items():
+            shown = "，".join(f"{info.rev_map[f]}【{v}】" for f, v in self.key_vals(orig).items())
+            now = found.get(k)
+            if now is None:
+                msgs.append(f"{shown}已被其他人删除")
+            elif self.versioned and len(orig) > self.ncols:
+                if now[-1] != orig[self.ncols]:
+                    msgs.append(f"{shown}已被其他人修改")
+            elif any(norm(v) != norm(orig[self.own[f]]) for f, v in zip(flds, now)):
+                msgs.append(f"{shown}已被其他人修改")
+        if msgs:
+            msgs.append("这些行载入之后被改过，请点“撤销修改”或刷新后重新修改")
+        return msgs
+
+    def key_stmt(self, kind, flds=()):
+        st = self.stmts.get((kind, flds))
+        if st is None:
+            info = self.info
+            where = " AND ".join(f"{k} = ?" for k in info.pk)
+            keys = [info.by_name[k] for k in info.pk]
+            cols = [info.by_name[f] for f in flds]
+            if kind == "delete":
+                st = make_stmt(f"DELETE FROM {info.name} WHERE {where}", keys)
+            elif kind == "update":
+                st = make_stmt(f"UPDATE {info.name} SET {', '.join(f'{f} = ?' for f in flds)} WHERE {where}",
+                               cols + keys)
+            else:
+                st = make_stmt(f"INSERT INTO {info.name} ({', '.join(flds)}) "
+                               f"VALUES ({', '.join(['?'] * len(flds))})", cols)
+            self.stmts[(kind, flds)] = st
+        return st
+
+    # 执行全部修改（工作线程里，check之后、提交之前），先删除再修改再新增，返回(新增, 修改, 删除)条数
+    def flush(self, cur):
+        if self.deletes:
+            executemany(cur, self.key_stmt("delete"),
+                        [list(self.key_vals(r).values()) for r in self.deletes.values()])
+        groups = {}
+        for orig, ch in self.updates.values():
+            groups.setdefault(tuple(ch), []).append(list(ch.values()) + list(self.key_vals(orig).values()))
+        for flds, seq in groups.items():
+            executemany(cur, self.key_stmt("update", flds), seq)
+        groups = {}
+        for vals in self.inserts.values():
+            flds = tuple(f for f in self.own if vals.get(f) is not None)  # 没填的字段不写，用数据库的默认值
+            groups.setdefault(flds, []).append([vals[f] for f in flds])
+        for flds, seq in groups.items():
+            executemany(cur, self.key_stmt("insert", flds), seq)
+        return len(self.inserts), len(self.updates), len(self.deletes)
@@ -0,0 +1,210 @@
+import threading
+from table_registry import table_list
+
+# 增删改之前的完整性预校验
+# 原来新增患者要先查一次医生是否存在、新增用药要先查一次是否重复、删除科室要分别数一次医生和病房，
+# 每项检查一次往返；病房号、药品编号这些外键根本没检查，要到提交时才被数据库拒绝，而且一次只报一个错
+# 这里启动时从数据库元数据（sys.foreign_keys、INFORMATION_SCHEMA）读一次外键关系和主键/唯一约束，
+# 每次增删改把涉及的所有检查拼成一条SELECT，每项是一个EXISTS或COUNT子查询，一次往返拿到全部结果，
+# 所有问题一起提示；删除时顺带统计有多少行数据引用了要删除的行
+
+# 外键：(约束名, 子表, [子表字段], 父表, [父表字段])
+fk_sql = """
+SELECT fk.name, tp.name, cp.name, tr.name, cr.name
+FROM sys.foreign_keys fk
+JOIN sys.foreign_key_columns fkc ON fkc.constraint_object_id = fk.object_id
+JOIN sys.tables tp ON tp.object_id = fkc.parent_object_id
+JOIN sys.columns cp ON cp.object_id = fkc.parent_object_id AND cp.column_id = fkc.parent_column_id
+JOIN sys.tables tr ON tr.object_id = fkc.referenced_object_id
+JOIN sys.columns cr ON cr.object_id = fkc.referenced_object_id AND cr.column_id = fkc.referenced_column_id
+ORDER BY fk.name, fkc.constraint_column_id
+"""
+
+# 主键和唯一约束：(约束名, 表名, 约束类型, 字段)
+key_sql = """
+SELECT tc.CONSTRAINT_NAME, tc.TABLE_NAME, tc.CONSTRAINT_TYPE, kcu.COLUMN_NAME
+FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS tc
+JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE kcu
+  ON kcu.CONSTRAINT_NAME = tc.CONSTRAINT_NAME AND kcu.TABLE_NAME = tc.TABLE_NAME
+WHERE tc.CONSTRAINT_TYPE IN ('PRIMARY KEY', 'UNIQUE')
+ORDER BY tc.CONSTRAINT_NAME, kcu.ORDINAL_POSITION
+"""
+
+# 读不到元数据时（比如用sqlite测试）用表结构登记里的约束，和sql文件里的建表语句一致
+default_fks = [(f"fk_{t.name}_{c}", t.name, [c], rt, [rc]) for t in table_list for c, rt, rc in t.fks]
+default_keys = ([(f"pk_{t.name}", t.name, "PRIMARY KEY", list(t.pk)) for t in table_list] +
+                [(f"uq_{t.name}_{c}", t.name, "UNIQUE", [c]) for t in table_list for c in t.uniques])
+
+
+class Validator:
+    # table_names：英文表名->中文表名，拼提示信息用
+    def __init__(self, table_names=None):
+        self.table_names = {t.lower(): cn for t, cn in (table_names or {}).items()}
+        self.fks = None
+        self.keys = None
+        self.lock = threading.Lock()
+
+    # 读取约束信息，只在启动时执行一次；读取失败就用默认约束
+    def load(self, cur):
+        with self.lock:
+            if self.fks is not None:
+                return
+            try:
+                cur.execute(fk_sql)
+                fk_rows = cur.fetchall()
+                cur.execute(key_sql)
+                key_rows = cur.fetchall()
+            except Exception:
+                cur.connection.rollback()
+                fks, keys = default_fks, default_keys
+            else:
+                # 元数据是一个字段一行，联合外键/联合主键合并成一条
+                fks = {}
+                for name, child, col, parent, pcol in fk_rows:
+                    fk = fks.setdefault(name, (name, child, [], parent, []))
+                    fk[2].append(col)
+                    fk[4].append(pcol)
+                keys = {}
+                for name, t, kind, col in key_rows:
+                    keys.setdefault(name, (name, t, kind, []))[3].append(col)
+                fks, keys = list(fks.values()), list(keys.values())
+            self.fks = fks
+            self.keys = keys
+
+    def tn(self, tname):
+        return self.table_names.get(tname.lower(), tname)
+
+    # 执行拼好的检查：checks是[(子查询SQL, 参数, 结果->提示信息或None)]，一条SELECT全部查完
+    def run(self, cur, checks):
+        if not checks:
+            return []
+        cur.execute("SELECT " + ", ".join(sql for sql, _, _ in checks), [p for _, ps, _ in checks for p in ps])
+        row = cur.fetchone()
+        msgs = [judge(v) for (_, _, judge), v in zip(checks, row)]
+        return [m for m in msgs if m]
+
+    # 外键检查：vals里填了外键字段的，被参照表里必须有这个值
+    def fk_checks(self, tname, vals, names):
+        checks = []
+        for _, child, cols, parent, pcols in self.fks:
+            if child.lower() != tname.lower() or any(c not in vals for c in cols):
+                continue
+            fk_vals = [vals[c] for c in cols]
+            if any(v is None for v in fk_vals):
+                continue
+            cond = " AND ".join(f"{p} = ?" for p in pcols)
+            shown = "，".join(f"{names.get(c, c)}【{v}】" for c, v in zip(cols, fk_vals))
+
+            def judge(v, shown=shown, parent=parent):
+                return None if v else f"{shown}在{self.tn(parent)}中不存在"
+            checks.append((f"CASE WHEN EXISTS (SELECT 1 FROM {parent} WHERE {cond}) THEN 1 ELSE 0 END",
+                           fk_vals, judge))
+        return checks
+
+    # 主键/唯一约束检查：vals里的值不能和其他行重复，修改时用key排除被修改的这一行
+    def unique_checks(self, tname, vals, names, key=None):
+        checks = []
+        for _, t, kind, cols in self.keys:
+            if t.lower() != tname.lower() or any(c not in vals or vals[c] is None for c in cols):
+                continue
+            u_vals = [vals[c] for c in cols]
+            cond = " AND ".join(f"{c} = ?" for c in cols)
+            params = list(u_vals)
+            if key:
+                cond += " AND NOT (" + " AND ".join(f"{c} = ?" for c in key) + ")"
+                params += list(key.values())
+            shown = "，".join(f"{names.get(c, c)}【{v}】" for c, v in zip(cols, u_vals))
+            what = "主键" if kind == "PRIMARY KEY" else "唯一字段"
+
+            def judge(v, shown=shown, what=what):
+                return f"{what}{shown}已存在" if v else None
+            checks.append((f"CASE WHEN EXISTS (SELECT 1 FROM {tname} WHERE {cond}) THEN 1 ELSE 0 END",
+                           params, judge))
+        return checks
+
+    # 按主键检查记录是否存在
+    def exists_check(self, tname, key):
+        cond = " AND ".join(f"{c} = ?" for c in key)
+
+        def judge(v):
+            return None if v else "主键对应的记录不存在"
+        return (f"CASE WHEN EXISTS (SELECT 1 FROM {tname} WHERE {cond}) THEN 1 ELSE 0 END",
+                list(key.values()), judge)
+
+    # 新增前检查：主键和唯一字段不重复，外键都存在，返回全部问题
+    # vals：{数据库字段: 值}，names：{数据库字段: 中文字段名}
+    def check_insert(self, cur, tname, vals, names=None):
+        names = names or {}
+        self.load(cur)
+        return self.run(cur, self.unique_checks(tname, vals, names) + self.fk_checks(tname, vals, names))
+
+    # 只检查外键，发药时用到（已有的用药记录数量累加，主键重复不算问题）
+    def check_fks(self, cur, tname, vals, names=None):
+        names = names or {}
+        self.load(cur)
+        return self.run(cur, self.fk_checks(tname, vals, names))
+
+    # 修改前检查：记录存在，改到的唯一字段不和别的行重复，改到的外键都存在
+    # key：{主键字段: 值}，vals：只包含要修改的字段
+    def check_update(self, cur, tname, key, vals, names=None):
+        names = names or {}
+        self.load(cur)
+        checks = [self.exists_check(tname, key)]
+        checks += self.unique_checks(tname, vals, names, key) + self.fk_checks(tname, vals, names)
+        return self.run(cur, checks)
+
+    # 删除前检查：统计每个引用了这张表的外键上有多少行引用了这条记录
+    # key是删除条件{字段: 值}，不一定是外键参照的字段（比如科室表按部门名称删除），所以用EXISTS关联
+    def check_delete(self, cur, tname, key):
+        self.load(cur)
+        msgs = self.run(cur, self.delete_checks(tname, key))
+        if msgs:
+            msgs.append("请先删除或修改这些数据")
+        return msgs
+
+    def delete_checks(self, tname, key):
+        checks = []
+        key_cond = " AND ".join(f"p.{c} = ?" for c in key)
+        for _, child, cols, parent, pcols in self.fks:
+            if parent.lower() != tname.lower():
+                continue
+            on = " AND ".join(f"p.{pc} = c.{cc}" for cc, pc in zip(cols, pcols))
+            cond = f"EXISTS (SELECT 1 FROM {parent} p WHERE {on} AND {key_cond})"
+
+            def judge(v, child=child):
+                return f"{self.tn(child)}中有{v}行数据引用了这条记录" if v else None
+            checks.append((f"(SELECT COUNT(*) FROM {child} c WHERE {cond})", list(key.values()), judge))
+        return checks
+
+    # 表格里改完一起保存前的检查（见unit_of_work.py）：所有新增、修改的检查照样拼成一条SELECT，删除的另拼一条
+    # inserts：[{字段: 值}]，updates：[(主键{字段: 值}, 修改的{字段: 值})]，deletes：[主键{字段: 值}]
+    def check_batch(self, cur, tname, inserts=(), updates=(), deletes=(), names=None):
+        names = names or {}
+        self.load(cur)
+        checks = []
+        for vals in inserts:
+            checks += self.unique_checks(tname, vals, names) + self.fk_checks(tname, vals, names)
+        for key, vals in updates:
+            checks += self.unique_checks(tname, vals, names, key) + self.fk_checks(tname, vals, names)
+        msgs = self.run_many(cur, checks)
+        del_checks = []
+        for key in deletes:  # 一次删好几行，提示里带上是哪一行
+            shown = "，".join(f"{names.get(c, c)}【{v}】" for c, v in key.items())
+            for sql, params, judge in self.delete_checks(tname, key):
+                del_checks.append((sql, params, lambda v, judge=judge, shown=shown: judge(v) and f"{shown}：{judge(v)}"))
+        del_msgs = self.run_many(cur, del_checks)
+        if del_msgs:
+            del_msgs.append("请先删除或修改这些数据")
+        return msgs + del_msgs
+
+    # 检查项太多时分成几条SELECT执行，一条语句的参数不超过max_params个（SQL Server上限2100）
+    def run_many(self, cur, checks, max_params=2000, max_cols=1000):
+        msgs = []
+        part, n = [], 0
+        for c in checks:
+            if part and (n + len(c[1]) > max_params or len(part) >= max_cols):
+                msgs += self.run(cur, part)
+                part, n = [], 0
+            part.append(c)
+            n += len(c[1])
+        return msgs + self.run(cur, part)